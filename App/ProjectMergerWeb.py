@@ -7,7 +7,7 @@ import time
 import os
 
 # --- Конфигурация ---
-REQUIREMENTS = ["Flask", "pathspec", "WeasyPrint", "Pygments"]
+REQUIREMENTS = ["Flask", "pathspec", "WeasyPrint", "Pygments", "pypdf"]
 APP_FILE = "app.py"
 URL = "http://127.0.0.1:5000"
 VENV_DIR = "venv"
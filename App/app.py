@@ -1,202 +1,139 @@
+import sys
+
+if __name__ == '__main__' and len(sys.argv) > 1:
+    # CLI не поднимает Flask: движок и run_cli живут в merger.py
+    from merger import run_cli
+    run_cli()
+    sys.exit(0)
+
 import os
-import re
 import json
-import argparse
+import bisect
+import shutil
+import threading
+import time
+import uuid
 from pathlib import Path
-import sys
-from flask import Flask, render_template, request, jsonify
-import pathspec
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify
+from merger import (
+    build_file_tree, build_git_file_tree, build_manifest, cached_scan, compile_selection, CONTENT_CACHE_MB,
+    ContentCache, drop_binary_files, encode_tree_columnar, expand_lazy_dirs, flatten_file_tree,
+    get_exclusion_matcher, get_exclusions, git_delta, gitignore_for_directory, group_paths_by_directory,
+    iter_file_listings, list_git_files, literal_pattern, load_gitignore_rules, load_manifest, manifest_delta,
+    MAX_SCAN_WORKERS, MergeStats, normalize_rel_dir, perform_merge_logic, project_manifest_path,
+    remember_scan, save_manifest, scan_file_list, ScanIndex, SECRET_RULES, select_files, set_exclusions,
+    shards_manifest_path, size_limits, sniff_paths, sniff_tree,
+)
 app = Flask(__name__, static_folder='static', template_folder='templates')
+# Время по этапам меряется на горячем пути скана и склейки, поэтому сервер собирает его только по флагу:
+# PMT_METRICS=1 или app.config['METRICS'] = True. Без него /metrics отдаёт одни счётчики задач
+app.config.setdefault('METRICS', os.environ.get('PMT_METRICS', '') not in ('', '0'))
+
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0, 600.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRICS_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name: str, help_text: str):
+        yield f"# HELP {name} {help_text}"
+        yield f"# TYPE {name} histogram"
+        cumulative = 0
+        for bound, count in zip(METRICS_BUCKETS, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{le="+Inf"}} {self.count}'
+        yield f"{name}_sum {self.total}"
+        yield f"{name}_count {self.count}"
+
+
+# Счётчики за всё время жизни процесса: этапы сканов и склеек, итоги задач и распределения длительностей
+metrics_stages = MergeStats()
+metrics_lock = threading.Lock()
+metrics_jobs = {}
+metrics_histograms = {"scan": Histogram(), "merge": Histogram(), "file": Histogram()}
+
+
+def _new_stats():
+    return MergeStats() if app.config['METRICS'] else None
+
+
+def _observe(kind: str, stats: MergeStats | None, seconds: float):
+    if stats is None:
+        return
+    metrics_stages.merge(stats)
+    with metrics_lock:
+        metrics_histograms[kind].observe(seconds)
+        if kind == "merge":
+            for file_seconds in stats.files.values():
+                metrics_histograms["file"].observe(file_seconds)
+
+
+def _render_metrics():
+    stage_metrics = (
+        ("items_total", 0, "Directory entries, files or calls handled by the stage"),
+        ("seconds_total", 1, "Wall time spent in the stage, summed over threads and processes"),
+        ("cpu_seconds_total", 2, "CPU time spent in the stage"),
+        ("bytes_in_total", 3, "Input volume of the stage (characters for text transforms)"),
+        ("bytes_out_total", 4, "Output volume of the stage (characters for text transforms)"),
+    )
+    lines = []
+    if app.config['METRICS']:
+        with metrics_stages.lock:
+            stages = {stage: tuple(row) for stage, row in metrics_stages.stages.items()}
+        for suffix, column, help_text in stage_metrics:
+            name = f"project_merger_stage_{suffix}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f'{name}{{stage="{stage}"}} {row[column]}' for stage, row in stages.items())
+    with metrics_lock:
+        lines.append("# HELP project_merger_merge_jobs_total Finished merge jobs by status")
+        lines.append("# TYPE project_merger_merge_jobs_total counter")
+        lines.extend(f'project_merger_merge_jobs_total{{status="{status}"}} {count}'
+                     for status, count in metrics_jobs.items())
+        if app.config['METRICS']:
+            lines.extend(metrics_histograms["scan"].lines("project_merger_scan_duration_seconds", "Scan duration"))
+            lines.extend(metrics_histograms["merge"].lines("project_merger_merge_duration_seconds",
+                                                           "Merge job duration"))
+            lines.extend(metrics_histograms["file"].lines("project_merger_file_duration_seconds",
+                                                          "Time spent on one file over all merge stages"))
+    running = sum(1 for job in list(merge_jobs.values()) if job.status == "running")
+    lines.append("# HELP project_merger_merge_jobs_running Merge jobs in progress")
+    lines.append("# TYPE project_merger_merge_jobs_running gauge")
+    lines.append(f"project_merger_merge_jobs_running {running}")
+    return "\n".join(lines) + "\n"
 
-exclusions = {}
-exclusions_file = Path("merger_exclusions.json")
-
-def load_exclusions():
-    global exclusions
-    if exclusions_file.exists():
-        exclusions = json.loads(exclusions_file.read_text(encoding="utf-8"))
-    else:
-        exclusions = {
-            "dirs": [
-                "__pycache__", ".git", ".idea", ".vscode", "venv", ".venv", "env",
-                "node_modules", "dist", "build", "target", ".pytest_cache",
-                ".mypy_cache", "site", "*.egg-info", "static", "templates"
-            ],
-            "files": ["poetry.lock", "Pipfile.lock", "merged_project.txt", "merger_exclusions.json"],
-            "exts": [
-                ".pyc", ".pyo", ".pyd", ".so", ".log", ".db", ".sqlite3",
-                ".DS_Store", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico",
-                ".mp4", ".mov", ".avi", ".zip", ".tar", ".gz", ".rar", ".env"
-            ]
-        }
-
-
-load_exclusions()
-
-def save_exclusions():
-    exclusions_file.write_text(json.dumps(exclusions, indent=4, ensure_ascii=False), encoding="utf-8")
-
-def build_file_tree(dir_path: Path, project_root: Path, gitignore_spec: pathspec.PathSpec | None):
-    tree = []
-    ignore_dirs_set = set(exclusions["dirs"])
-    ignore_files_set = set(exclusions["files"])
-    ignore_exts_set = set(exclusions["exts"])
-
-    try:
-        items = sorted(dir_path.iterdir(), key=lambda x: (x.is_file(), x.name.lower()))
-        for item in items:
-
-            relative_path = item.relative_to(project_root)
-
-            if gitignore_spec and gitignore_spec.match_file(str(relative_path)):
-                continue
-
-            if item.name in ignore_dirs_set:
-                continue
-            if item.is_file() and (item.name in ignore_files_set or item.suffix in ignore_exts_set):
-                continue
 
-            if item.resolve() == Path(__file__).resolve() or item.name == exclusions_file.name:
-                continue
-
-            entry = {"name": item.name, "path": str(relative_path)}
-            if item.is_dir():
-                entry["type"] = "dir"
-                children = build_file_tree(item, project_root, gitignore_spec)
-                if children:
-                    entry["children"] = children
-                    tree.append(entry)
-            else:
-                entry["type"] = "file"
-                tree.append(entry)
-    except (FileNotFoundError, PermissionError):
-        return []
-    return tree
-
-def flatten_file_tree(tree_nodes):
-    paths = []
-    for node in tree_nodes:
-        if node['type'] == 'file':
-            paths.append(node['path'])
-        elif node['type'] == 'dir' and 'children' in node:
-            paths.extend(flatten_file_tree(node['children']))
-    return paths
-
-LANG_MAP = {
-    '.py': 'python',
-    '.js': 'javascript',
-    '.mjs': 'javascript',
-    '.ts': 'typescript',
-    '.tsx': 'tsx',
-    '.jsx': 'jsx',
-    '.rb': 'ruby',
-    '.java': 'java',
-    '.cs': 'csharp',
-    '.php': 'php',
-    '.c': 'c',
-    '.cpp': 'cpp',
-    '.h': 'c',
-    '.hpp': 'cpp',
-    '.go': 'go',
-    '.rs': 'rust',
-    '.kt': 'kotlin',
-    '.kts': 'kotlin',
-    '.swift': 'swift',
-    '.html': 'html',
-    '.css': 'css',
-    '.scss': 'scss',
-    '.sass': 'sass',
-    '.xml': 'xml',
-    '.json': 'json',
-    '.yaml': 'yaml',
-    '.yml': 'yaml',
-    '.md': 'markdown',
-    '.sh': 'shell',
-    '.bat': 'batch',
-    '.ps1': 'powershell',
-    '.sql': 'sql',
-    'Dockerfile': 'dockerfile',
-}
-
-FILE_CONTENT_TRANSLATIONS = {
-    "ru": {
-        "project_build": "Сборка проекта",
-        "project_structure": "СТРУКТУРА ПРОЕКТА (ВКЛЮЧЕННЫЕ ФАЙЛЫ)",
-        "file_contents": "СОДЕРЖИМОЕ ФАЙЛОВ",
-        "file_header": "Файл",
-        "read_error": "Ошибка чтения файла"
-    },
-    "en": {
-        "project_build": "Project Build",
-        "project_structure": "PROJECT STRUCTURE (INCLUDED FILES)",
-        "file_contents": "FILE CONTENTS",
-        "file_header": "File",
-        "read_error": "Error reading file"
-    }
-}
-
-def sanitize_content(content: str) -> str:
-    patterns = [
-        (r"""(['"]?((?:api|access|secret|private)_?(?:key|token)|token|password)['"]?\s*[:=]\s*)['"][^'"]*['"]""",
-         r'\1"[SECRET REMOVED]"'),
-        (r"""(^((?:API|ACCESS|SECRET|PRIVATE)_?(?:KEY|TOKEN)|TOKEN|PASSWORD)=)[^\n]*""", r'\1[SECRET REMOVED]'),
-    ]
-
-    sanitized_content = content
-    for pattern, replacement in patterns:
-        sanitized_content = re.sub(pattern, replacement, sanitized_content, flags=re.IGNORECASE | re.MULTILINE)
-
-    return sanitized_content
-
-def clear_for_ai(content: str, file_extension: str) -> str:
-
-    line_comment_patterns = {
-        '.py': r'#.*',
-        '.js': r'//.*',
-        '.ts': r'//.*',
-        '.jsx': r'//.*',
-        '.tsx': r'//.*',
-        '.go': r'//.*',
-        '.rs': r'//.*',
-        '.java': r'//.*',
-        '.cs': r'//.*',
-        '.c': r'//.*',
-        '.cpp': r'//.*',
-        '.h': r'//.*',
-        '.hpp': r'//.*',
-        '.swift': r'//.*',
-        '.kt': r'//.*',
-        '.kts': r'//.*',
-        '.rb': r'#.*',
-        '.php': r'//.*|#.*',
-        '.sh': r'#.*',
-    }
-    block_comment_patterns = {
-        'common_c_style': (r'/\*.*?\*/',),
-        'python': (r'"""(.*?)"""', r"'''(.*?)'''"),
-        'html': (r'<!--.*?-->',),
-    }
-
-    if file_extension in ['.py']:
-        for pattern in block_comment_patterns['python']:
-            content = re.sub(pattern, '', content, flags=re.DOTALL)
-    elif file_extension in ['.js', '.ts', '.css', '.c', '.cpp', '.java', '.cs', '.go', '.rs', '.swift', '.kt']:
-        for pattern in block_comment_patterns['common_c_style']:
-            content = re.sub(pattern, '', content, flags=re.DOTALL)
-    elif file_extension in ['.html', '.xml']:
-        for pattern in block_comment_patterns['html']:
-            content = re.sub(pattern, '', content, flags=re.DOTALL)
+@app.route('/')
+def index():
+    return render_template('index.html')
 
-    if file_extension in line_comment_patterns:
-        content = re.sub(line_comment_patterns[file_extension], '', content)
 
-    content = re.sub(r'\n\s*\n', '\n', content)
+@app.route('/metrics', methods=['GET'])
+def metrics_view():
+    return Response(_render_metrics(), mimetype='text/plain; version=0.0.4')
 
-    return content.strip()
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+def _scan_depth(data: dict):
+    # depth не задан -> полный обход; 1 -> только сама папка, вложенные подгружаются через /tree/children
+    depth = data.get('depth')
+    if depth is None:
+        return None
+    depth = int(depth)
+    if depth < 1:
+        raise ValueError(depth)
+    return depth
 
 
 @app.route('/scan', methods=['POST'])
@@ -204,251 +141,440 @@ def scan_directory():
     data = request.json
     path_str = data.get('path', '.')
     use_gitignore = data.get('use_gitignore', True)
+    try:
+        scan_workers = max(1, min(int(data.get('scan_workers', 1)), MAX_SCAN_WORKERS))
+        depth = _scan_depth(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Неверное значение scan_workers или depth"}), 400
 
     project_path = Path(path_str).expanduser().resolve()
 
     if not project_path.is_dir():
         return jsonify({"error": "Указанный путь не является директорией"}), 400
 
-    gitignore_spec = None
-    if use_gitignore:
-        gitignore_file = project_path / '.gitignore'
-        if gitignore_file.is_file():
-            try:
-                with open(gitignore_file, 'r', encoding='utf-8') as f:
-                    gitignore_spec = pathspec.PathSpec.from_lines('gitwildmatch', f)
-            except Exception:
-                pass
-    tree = build_file_tree(project_path, project_path, gitignore_spec)
-    return jsonify({"tree": tree, "project_name": project_path.name, "project_path": str(project_path)})
-
-def perform_merge_logic(project_path, files_to_merge, output_filepath, export_format, lang, remove_secrets, clear_for_ai_flag):
-    project_name = project_path.name
-    T = FILE_CONTENT_TRANSLATIONS.get(lang, FILE_CONTENT_TRANSLATIONS['ru'])
-    file_tree_str = generate_text_tree(files_to_merge)
+    matcher = get_exclusion_matcher()
+    stats = _new_stats()
+    started = time.perf_counter()
+    tree = build_git_file_tree(project_path, matcher) if data.get('source') == 'git' else None
+    source = 'git'
+    index = None
+    if tree is None:
+        source = 'fs'
+        gitignore = load_gitignore_rules(project_path) if use_gitignore else None
+        # Индекс рассчитан на полный обход: частичный оставил бы в нём только посещённые папки
+        use_index = data.get('use_index', False) and depth is None
+        index = ScanIndex.open(project_path, gitignore, matcher) if use_index else None
+        tree = build_file_tree(project_path, project_path, gitignore, workers=scan_workers, matcher=matcher, index=index,
+                               depth=depth, stats=stats)
+    remember_scan(project_path, source, use_gitignore, matcher, flatten_file_tree(tree) if depth is None else None)
+    # Двоичные файлы и кодировку не-UTF-8 текста страница показывает сразу, по первым байтам файла
+    if data.get('sniff', True):
+        sniff_tree(project_path, tree, scan_workers)
+    _observe("scan", stats, time.perf_counter() - started)
+    if data.get('encoding') == 'columnar':
+        tree = encode_tree_columnar(tree)
+    response_data = {"tree": tree, "project_name": project_path.name, "project_path": str(project_path),
+                     "source": source}
+    if index is not None:
+        response_data["index"] = {"cached_dirs": index.hits, "listed_dirs": index.misses}
+    return jsonify(response_data)
+
+
+@app.route('/scan/stream', methods=['POST'])
+def scan_directory_stream():
+    # NDJSON: строка start, затем по строке на каждую папку с файлами по ходу обхода, в конце end
+    data = request.json
+    path_str = data.get('path', '.')
+    use_gitignore = data.get('use_gitignore', True)
+    try:
+        scan_workers = max(1, min(int(data.get('scan_workers', 1)), MAX_SCAN_WORKERS))
+        depth = _scan_depth(data)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Неверное значение scan_workers или depth"}), 400
 
-    if export_format == 'pdf':
-        print("[INFO] PDF export selected. Importing WeasyPrint and Pygments...")
+    project_path = Path(path_str).expanduser().resolve()
+
+    if not project_path.is_dir():
+        return jsonify({"error": "Указанный путь не является директорией"}), 400
+
+    matcher = get_exclusion_matcher()
+    git_files = list_git_files(project_path, matcher) if data.get('source') == 'git' else None
+    use_index = data.get('use_index', False) and depth is None
+    sniff = data.get('sniff', True)
+
+    def generate():
+        index = None
+        stats = _new_stats()
+        started = time.perf_counter()
+        if git_files is not None:
+            source = 'git'
+            listings = group_paths_by_directory(git_files)
+        else:
+            source = 'fs'
+            gitignore = load_gitignore_rules(project_path) if use_gitignore else None
+            index = ScanIndex.open(project_path, gitignore, matcher) if use_index else None
+            listings = iter_file_listings(project_path, project_path, gitignore, workers=scan_workers,
+                                          matcher=matcher, index=index, depth=depth, stats=stats)
+        yield json.dumps({"type": "start", "project_name": project_path.name, "project_path": str(project_path),
+                          "source": source, "sep": os.sep}, ensure_ascii=False) + "\n"
+        total = lazy_total = 0
+        scanned = []
+        sniff_pool = ThreadPoolExecutor(max_workers=scan_workers) if sniff and scan_workers > 1 else None
         try:
-            from weasyprint import HTML
-            from pygments import highlight
-            from pygments.lexers import get_lexer_for_filename, TextLexer
-            from pygments.formatters import HtmlFormatter
-            print("[SUCCESS] Libraries imported.")
-        except ImportError:
-            raise ImportError("WeasyPrint or Pygments not installed. Run 'pip install WeasyPrint Pygments'.")
-
-        pygments_css = HtmlFormatter(style='default').get_style_defs('.highlight')
-        html_parts = [
-            '<!DOCTYPE html>', '<html lang="en">', '<head><meta charset="UTF-8">',
-            f'<title>{T["project_build"]}: {project_name}</title>',
-            '<style>', 'body { font-family: sans-serif; }', 'h1, h2, h3 { color: #333; }',
-            'pre { white-space: pre-wrap; word-wrap: break-word; background-color: #f8f8f8; border: 1px solid #ddd; padding: 10px; border-radius: 5px; }',
-            'code { font-family: monospace; }', pygments_css, '</style>', '</head><body>',
-            f'<h1>{T["project_build"]}: {project_name}</h1>', f'<h2>{T["project_structure"]}</h2>',
-            f'<pre><code>{file_tree_str}</code></pre>', f'<h2>{T["file_contents"]}</h2>'
-        ]
-        for file_rel_path_str in sorted(files_to_merge):
-            file_abs_path = project_path / file_rel_path_str
-            try:
-                file_content = file_abs_path.read_text(encoding="utf-8")
-                if clear_for_ai_flag:
-                    content_sanitized = sanitize_content(file_content)
-                    file_content = clear_for_ai(content_sanitized, file_abs_path.suffix)
-                elif remove_secrets:
-                    file_content = sanitize_content(file_content)
-                if not file_content: continue
-                try:
-                    lexer = get_lexer_for_filename(file_rel_path_str, stripall=True)
-                except Exception:
-                    lexer = TextLexer()
-                formatter = HtmlFormatter(linenos=True, cssclass="highlight")
-                highlighted_code = highlight(file_content, lexer, formatter)
-                html_parts.append(f'<h3><code>--- {T["file_header"]}: {file_rel_path_str} ---</code></h3>')
-                html_parts.append(highlighted_code)
-            except Exception as e:
-                html_parts.append(f'<h3><code>--- {T["file_header"]}: {file_rel_path_str} ---</code></h3>')
-                html_parts.append(f'<pre>[{T["read_error"]}: {e}]</pre>')
-        html_parts.append('</body></html>')
-        final_html = "".join(html_parts)
-        print("[INFO] HTML generated. Starting PDF conversion...")
-        HTML(string=final_html).write_pdf(output_filepath)
-        print("[SUCCESS] PDF file written successfully.")
-
-    else:
-        print(f"[INFO] {export_format.upper()} export selected. Starting file write...")
-        with open(output_filepath, "w", encoding="utf-8", errors="ignore") as f:
-            if export_format == 'md':
-                f.write(
-                    f"# {T['project_build']}: {project_name}\n\n## {T['project_structure']}\n\n```\n{file_tree_str}\n```\n\n## {T['file_contents']}\n\n")
+            for rel_dir, files, lazy in listings:
+                total += len(files)
+                lazy_total += len(lazy)
+                scanned.extend(rel_path for _, rel_path in files)
+                message = {"type": "files", "dir": rel_dir, "files": [[name, rel_path] for name, rel_path in files]}
+                if sniff:
+                    # Третий элемент - размер в байтах, четвёртый - "binary" или кодировка, у обычного UTF-8 его нет
+                    kinds = sniff_paths(project_path, [rel_path for _, rel_path in files],
+                                        sniff_pool.map if sniff_pool is not None else map)
+                    for item, (kind, size) in zip(message["files"], kinds):
+                        item.append(size)
+                        if kind is not None:
+                            item.append(kind)
+                if lazy:
+                    message["lazy"] = [[name, rel_path] for name, rel_path in lazy]
+                yield json.dumps(message, ensure_ascii=False) + "\n"
+        finally:
+            if sniff_pool is not None:
+                sniff_pool.shutdown(wait=False, cancel_futures=True)
+        _observe("scan", stats, time.perf_counter() - started)
+        # Досмотренный до конца полный скан запоминается для /merge с шаблонами
+        remember_scan(project_path, source, use_gitignore, matcher, scanned if depth is None else None)
+        end = {"type": "end", "files": total, "lazy_dirs": lazy_total}
+        if index is not None:
+            end["index"] = {"cached_dirs": index.hits, "listed_dirs": index.misses}
+        yield json.dumps(end, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/tree/children', methods=['POST'])
+def tree_children():
+    data = request.json
+    project_path = Path(data.get('project_path', '.')).expanduser().resolve()
+    rel_dir = data.get('path', '')
+    use_gitignore = data.get('use_gitignore', True)
+    try:
+        depth = _scan_depth(data) or 1
+    except (TypeError, ValueError):
+        return jsonify({"error": "Неверное значение depth"}), 400
+
+    rel_dir = normalize_rel_dir(rel_dir)
+    if rel_dir is None:
+        return jsonify({"error": "Путь должен быть относительным и лежать внутри проекта"}), 400
+    dir_path = project_path / rel_dir
+    if not dir_path.is_dir():
+        return jsonify({"error": "Указанный путь не является директорией"}), 400
+
+    gitignore = load_gitignore_rules(project_path) if use_gitignore else None
+    gitignore = gitignore_for_directory(project_path, rel_dir, gitignore)
+    children = build_file_tree(dir_path, project_path, gitignore, matcher=get_exclusion_matcher(), depth=depth)
+    if data.get('sniff', True):
+        sniff_tree(project_path, children)
+    if data.get('encoding') == 'columnar':
+        children = encode_tree_columnar(children)
+    return jsonify({"path": rel_dir, "children": children})
+
+MAX_MERGE_JOBS = 2
+MAX_PENDING_MERGES = 16
+MERGE_JOB_TTL = 24 * 3600
+
+
+class MergeCancelled(Exception):
+    pass
+
+
+class MergeJob:
+    __slots__ = ("id", "status", "files_total", "files_done", "bytes_written", "created", "started", "finished",
+                 "error", "result", "future", "cancel_event")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.files_total = 0
+        self.files_done = 0
+        self.bytes_written = 0
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.result = {}
+        self.future = None
+        self.cancel_event = threading.Event()
+
+    # Прогресс: perform_merge_logic зовёт start/step из потока задачи, отмена срабатывает между файлами
+    def start(self, total: int):
+        self.files_total = total
+        self.check()
+
+    def step(self):
+        self.files_done += 1
+        self.check()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise MergeCancelled()
+
+    def finish(self, status: str):
+        # Все переходы в конечный статус идут сюда - и из потока склейки, и при отмене из очереди,
+        # поэтому счётчик задач по статусам сходится с тем, что видят клиенты
+        self.finished = time.time()
+        self.status = status
+        with metrics_lock:
+            metrics_jobs[status] = metrics_jobs.get(status, 0) + 1
+
+    def track(self, items):
+        for item in items:
+            yield item
+            self.step()
+
+    @property
+    def output_dir(self) -> Path:
+        return Path(app.static_folder) / "jobs" / self.id
+
+    def snapshot(self) -> dict:
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        snapshot = {"id": self.id, "status": self.status, "files_done": self.files_done,
+                    "files_total": self.files_total, "bytes_written": self.bytes_written,
+                    "elapsed": round(elapsed, 3)}
+        if self.error is not None:
+            snapshot["error"] = self.error
+        snapshot.update(self.result)
+        return snapshot
+
+
+merge_executor = ThreadPoolExecutor(max_workers=MAX_MERGE_JOBS, thread_name_prefix="merge")
+merge_jobs = {}
+merge_jobs_lock = threading.Lock()
+
+
+def _prune_merge_jobs():
+    now = time.time()
+    with merge_jobs_lock:
+        expired = [job for job in merge_jobs.values() if job.finished and now - job.finished > MERGE_JOB_TTL]
+        for job in expired:
+            del merge_jobs[job.id]
+    for job in expired:
+        shutil.rmtree(job.output_dir, ignore_errors=True)
+
+
+def _run_merge_job(job: MergeJob, options: dict):
+    job.status = "running"
+    job.started = time.time()
+    status = "error"
+    output_filepath = job.output_dir / options["output_filename"]
+    stats = _new_stats()
+    try:
+        project_path = options["project_path"]
+        files_to_merge = options["files_to_merge"]
+        if options["dirs"]:
+            source, use_gitignore, matcher = options["source"], options["use_gitignore"], options["matcher"]
+            scanned = cached_scan(project_path, source, use_gitignore, matcher)
+            if scanned is None and source == 'git':
+                scanned = scan_file_list(project_path, source, use_gitignore, matcher)
+            if scanned is not None:
+                # Папки целиком отбираются из последнего скана одним регулярным выражением
+                dirs = [normalize_rel_dir(rel_dir) for rel_dir in options["dirs"]]
+                if None in dirs:
+                    raise ValueError("Путь должен быть относительным и лежать внутри проекта")
+                if "" in dirs:
+                    expanded = list(scanned)
+                else:
+                    expanded = select_files(scanned, compile_selection([literal_pattern(d, True) for d in dirs]))
             else:
-                f.write(
-                    f"{T['project_build']}: {project_name}\n{'=' * 80}\n{T['project_structure']}\n{'=' * 80}\n\n{file_tree_str}\n\n{'=' * 80}\n{T['file_contents']}\n{'=' * 80}\n\n")
-            for file_rel_path_str in sorted(files_to_merge):
-                file_rel_path = Path(file_rel_path_str)
-                file_abs_path = (project_path / file_rel_path).resolve()
-                try:
-                    file_content = file_abs_path.read_text(encoding="utf-8")
-                    if clear_for_ai_flag:
-                        content_sanitized = sanitize_content(file_content)
-                        file_content = clear_for_ai(content_sanitized, file_rel_path.suffix)
-                    elif remove_secrets:
-                        file_content = sanitize_content(file_content)
-                except Exception as e:
-                    file_content = f"[{T['read_error']}: {e}]"
-                if file_content:
-                    if export_format == 'md':
-                        lang_tag = LANG_MAP.get(file_rel_path.suffix, '')
-                        f.write(
-                            f"### `--- {T['file_header']}: {file_rel_path_str} ---`\n\n```{lang_tag}\n{file_content}\n```\n\n")
-                    else:
-                        f.write(
-                            f"--- {T['file_header']}: {file_rel_path_str} ---\n\n{file_content}\n\n{'=' * 80}\n\n")
-        print(f"[SUCCESS] {export_format.upper()} file written successfully.")
+                gitignore = load_gitignore_rules(project_path) if use_gitignore else None
+                expanded = expand_lazy_dirs(project_path, options["dirs"], gitignore, matcher)
+            expanded = drop_binary_files(project_path, expanded, options["jobs"])
+            files_to_merge = list(dict.fromkeys(files_to_merge + expanded))
+        selection = options["selection"]
+        if selection is not None:
+            # include добирает файлы из последнего полного скана, exclude вычитается и из явного списка;
+            # одни exclude без явного списка применяются ко всему проекту
+            explicit = select_files(files_to_merge, selection._replace(include=None))
+            selected = []
+            if selection.include is not None or not files_to_merge:
+                scanned = scan_file_list(project_path, options["source"], options["use_gitignore"], options["matcher"])
+                selected = select_files(scanned, selection)
+            files_to_merge = list(dict.fromkeys(explicit + selected))
+        delta = None
+        manifest_path = manifest = None
+        # Хэширование для манифеста и соединение с кэшем - тоже работа задачи, а не запроса
+        if options["delta_git"]:
+            delta = git_delta(project_path, options["delta_git"], files_to_merge)
+        elif options["delta_manifest"]:
+            manifest_path = project_manifest_path(project_path)
+            previous = load_manifest(manifest_path)
+            manifest = build_manifest(project_path, files_to_merge, previous)
+            delta = manifest_delta(previous, manifest, f"manifest {manifest_path.name}")
+        content_cache = ContentCache.open(options["content_cache_mb"]) if options["content_cache"] else None
+
+        output_filepath.parent.mkdir(parents=True, exist_ok=True)
+        shards = perform_merge_logic(
+            project_path=project_path,
+            files_to_merge=files_to_merge,
+            output_filepath=output_filepath,
+            export_format=options["export_format"],
+            lang=options["lang"],
+            remove_secrets=options["remove_secrets"],
+            clear_for_ai_flag=options["clear_for_ai_flag"],
+            jobs=options["jobs"],
+            secret_rules=options["secret_rules"],
+            content_cache=content_cache,
+            delta=delta,
+            progress=job,
+            stats=stats,
+            limits=options["limits"]
+        )
+        if manifest is not None:
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            save_manifest(manifest_path, manifest)
+        base_url = f"/static/jobs/{job.id}"
+        if shards is not None:
+            # Вывод разбит на части: основная ссылка ведёт на манифест, части перечислены отдельно
+            result = {"download_url": f"{base_url}/{shards_manifest_path(options['output_filename']).name}",
+                      "shards": [{"url": f"{base_url}/{shard['path']}", "files": len(shard["files"]),
+                                  "bytes": shard["bytes"]} for shard in shards["shards"]]}
+        else:
+            result = {"download_url": f"{base_url}/{options['output_filename']}"}
+        if content_cache is not None:
+            result["cache"] = {"hits": content_cache.hits, "misses": content_cache.misses}
+        if delta is not None:
+            result["delta"] = {"added": delta.added, "changed": delta.changed, "deleted": delta.deleted}
+        job.result = result
+        status = "done"
+    except MergeCancelled:
+        print(f"[INFO] Merge job {job.id} cancelled.", flush=True)
+        shutil.rmtree(job.output_dir, ignore_errors=True)
+        status = "cancelled"
+    except Exception as e:
+        print(f"[ERROR] An error occurred during merge: {e}", flush=True)
+        shutil.rmtree(job.output_dir, ignore_errors=True)
+        job.error = f"Ошибка создания файла: {str(e)}"
+    finally:
+        job.finish(status)
+        _observe("merge", stats, job.finished - job.started)
+
 
 @app.route('/merge', methods=['POST'])
 def merge_files():
     data = request.json
     files_to_merge = data.get('files', [])
     project_path_str = data.get('project_path', '.')
-    project_path = Path(project_path_str)
+    # Корень разрешается один раз, пути файлов дальше просто приклеиваются к нему
+    project_path = Path(project_path_str).expanduser().resolve()
     project_name = project_path.name
     export_format = data.get('format', 'txt')
-    lang = data.get('lang', 'ru')
-    remove_secrets = data.get('remove_secrets', False)
-    clear_for_ai_flag = data.get('clear_for_ai', False)
-
-    output_filename = f"{project_name}.{export_format}"
-    output_filepath = Path(app.static_folder) / output_filename
-
+    secret_rules = data.get('secret_rules') or None
+    if secret_rules is not None:
+        unknown = [name for name in secret_rules if name not in SECRET_RULES]
+        if unknown:
+            return jsonify({"error": f"Неизвестные правила поиска секретов: {', '.join(map(str, unknown))}"}), 400
     try:
-        perform_merge_logic(
-            project_path=project_path,
-            files_to_merge=files_to_merge,
-            output_filepath=output_filepath,
-            export_format=export_format,
-            lang=lang,
-            remove_secrets=remove_secrets,
-            clear_for_ai_flag=clear_for_ai_flag
-        )
-        response_data = {"success": True, "download_url": f"/static/{output_filename}"}
-        return jsonify(response_data)
+        jobs = max(1, min(int(data.get('jobs', 1)), os.cpu_count() or 1))
+        content_cache_mb = int(data.get('content_cache_mb', CONTENT_CACHE_MB))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Неверное значение jobs или content_cache_mb"}), 400
+    include = data.get('include') or []
+    exclude = data.get('exclude') or []
+    if not all(isinstance(p, str) for p in include + exclude):
+        return jsonify({"error": "include и exclude должны быть списками шаблонов"}), 400
+    try:
+        selection = compile_selection(include, exclude)
+    except ValueError as e:
+        return jsonify({"error": f"Неверный шаблон выбора файлов: {e}"}), 400
+    # Лимиты размера из запроса перекрывают "limits" из merger_exclusions.json по ключам
+    overrides = data.get('limits') or {}
+    if not isinstance(overrides, dict):
+        return jsonify({"error": "limits должен быть объектом"}), 400
+    try:
+        limits = size_limits({**get_exclusions().get("limits", {}), **overrides})
+    except ValueError as e:
+        return jsonify({"error": f"Неверные лимиты размера: {e}"}), 400
+    # Манифест дельты хранит сервер, по одному на проект; путь из запроса не принимаем
+    delta_manifest = data.get('delta_manifest', False)
+    if not isinstance(delta_manifest, bool):
+        return jsonify({"error": "delta_manifest - только true или false: манифест хранится на сервере"}), 400
+
+    options = {
+        "project_path": project_path,
+        "files_to_merge": files_to_merge,
+        "output_filename": f"{project_name}.{export_format}",
+        "export_format": export_format,
+        "lang": data.get('lang', 'ru'),
+        "remove_secrets": data.get('remove_secrets', False),
+        "clear_for_ai_flag": data.get('clear_for_ai', False),
+        "jobs": jobs,
+        "secret_rules": secret_rules,
+        "content_cache": data.get('content_cache', False),
+        "content_cache_mb": content_cache_mb,
+        "delta_git": str(data['delta_git']) if data.get('delta_git') else None,
+        "delta_manifest": delta_manifest,
+        "dirs": data.get('dirs', []),
+        "use_gitignore": data.get('use_gitignore', True),
+        "selection": selection,
+        "source": data.get('source', 'fs'),
+        "matcher": get_exclusion_matcher(),
+        "limits": limits,
+    }
 
-    except Exception as e:
-        print(f"[ERROR] An error occurred during merge: {e}", flush=True)
-        return jsonify({"error": f"Ошибка создания файла: {str(e)}"}), 500
-
-def generate_text_tree(selected_files):
-    tree = {}
-    for path_str in selected_files:
-        parts = Path(path_str).parts
-        current_level = tree
-        for part in parts:
-            if part not in current_level:
-                current_level[part] = {}
-            current_level = current_level[part]
-
-    def build_lines(d, prefix=""):
-        lines = []
-        items = sorted(d.keys())
-        for i, name in enumerate(items):
-            connector = "└── " if i == len(items) - 1 else "├── "
-            lines.append(f"{prefix}{connector}{name}")
-            if d[name]:
-                new_prefix = prefix + ("    " if i == len(items) - 1 else "│   ")
-                lines.extend(build_lines(d[name], new_prefix))
-        return lines
-
-    return "\n".join(build_lines(tree))
+    _prune_merge_jobs()
+    job = MergeJob()
+    with merge_jobs_lock:
+        # Очередь ограничена: одновременно идут MAX_MERGE_JOBS склеек, остальные ждут, лишние получают 429
+        pending = sum(1 for other in merge_jobs.values() if other.finished is None)
+        if pending >= MAX_PENDING_MERGES:
+            return jsonify({"error": "Слишком много склеек в очереди, попробуйте позже"}), 429
+        merge_jobs[job.id] = job
+        job.future = merge_executor.submit(_run_merge_job, job, options)
+    return jsonify({"job_id": job.id, "status_url": f"/jobs/{job.id}"}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_merge_job(job_id):
+    job = merge_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Задача не найдена"}), 404
+    return jsonify(job.snapshot())
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_merge_job(job_id):
+    job = merge_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Задача не найдена"}), 404
+    job.cancel_event.set()
+    # Задача ещё в очереди - снимаем её сразу, запущенная остановится на следующем файле
+    if job.future is not None and job.future.cancel():
+        job.finish("cancelled")
+    return jsonify(job.snapshot())
 
 @app.route('/exclusions', methods=['GET'])
-def get_exclusions():
-    return jsonify(exclusions)
+def exclusions_view():
+    return jsonify(get_exclusions())
 
 @app.route('/exclusions', methods=['POST'])
 def update_exclusions():
-    global exclusions
     data = request.json
     if all(isinstance(data.get(key), list) for key in ["dirs", "files", "exts"]):
-        exclusions = data
-        save_exclusions()
+        if "limits" in data:
+            if not isinstance(data["limits"], dict):
+                return jsonify({"success": False, "error": "limits должен быть объектом"}), 400
+            try:
+                size_limits(data["limits"])
+            except ValueError as e:
+                return jsonify({"success": False, "error": f"Неверные лимиты размера: {e}"}), 400
+        # Редактор на странице присылает только списки, остальные ключи файла (limits) сохраняются
+        set_exclusions({**get_exclusions(), **data})
         return jsonify({"success": True, "message": "Исключения сохранены"})
     return jsonify({"success": False, "error": "Неверный формат данных"}), 400
 
-def run_cli():
-    parser = argparse.ArgumentParser(description="Project Merger Tool - CLI Mode")
-    parser.add_argument("--path", "-p", type=str, default=".", help="Путь к папке проекта (по умолчанию текущая)")
-    parser.add_argument("--output", "-o", type=str, help="Путь к выходному файлу (по умолчанию: <имя_папки>.txt)")
-    parser.add_argument("--format", "-f", choices=['txt', 'md', 'pdf'], default="txt", help="Формат вывода (txt, md, pdf)")
-    parser.add_argument("--lang", "-l", choices=['ru', 'en'], default="en", help="Язык заголовков (ru, en)")
-    parser.add_argument("--no-gitignore", action="store_true", help="Не использовать .gitignore")
-    parser.add_argument("--remove-secrets", action="store_true", help="Удалять секреты (ключи, токены)")
-    parser.add_argument("--clear-ai", action="store_true", help="Очистка для ИИ (удалить комментарии и пустые строки)")
-
-    args = parser.parse_args()
-
-    project_path = Path(args.path).resolve()
-    if not project_path.is_dir():
-        print(f"[ERROR] Директория не найдена: {project_path}")
-        sys.exit(1)
-
-    gitignore_spec = None
-    if not args.no_gitignore:
-        gitignore_file = project_path / '.gitignore'
-        if gitignore_file.is_file():
-            try:
-                with open(gitignore_file, 'r', encoding='utf-8') as f:
-                    gitignore_spec = pathspec.PathSpec.from_lines('gitwildmatch', f)
-                print("[INFO] .gitignore найден и будет использован.")
-            except Exception as e:
-                print(f"[WARN] Ошибка чтения .gitignore: {e}")
-
-    print(f"[INFO] Сканирование директории: {project_path}")
-    tree = build_file_tree(project_path, project_path, gitignore_spec)
-    files_to_merge = flatten_file_tree(tree)
-
-    if not files_to_merge:
-        print("[ERROR] Не найдено файлов для склейки (проверьте фильтры и исключения).")
-        sys.exit(1)
-    
-    print(f"[INFO] Найдено файлов: {len(files_to_merge)}")
-    if files_to_merge:
-        print("[INFO] Первые 5 файлов, которые будут обработаны:")
-        for i, f in enumerate(sorted(files_to_merge)):
-            if i >= 5:
-                print(f"  ... и еще {len(files_to_merge) - i} файлов.")
-                break
-            print(f"  - {f}")
-
-    if args.output:
-        output_filepath = Path(args.output).resolve()
-    else:
-        output_filename = f"{project_path.name}.{args.format}"
-        output_filepath = Path.cwd() / output_filename
-
-    try:
-        perform_merge_logic(
-            project_path=project_path,
-            files_to_merge=files_to_merge,
-            output_filepath=output_filepath,
-            export_format=args.format,
-            lang=args.lang,
-            remove_secrets=args.remove_secrets,
-            clear_for_ai_flag=args.clear_ai
-        )
-        print(f"[DONE] Файл успешно сохранен: {output_filepath}")
-    except Exception as e:
-        print(f"[FAIL] Ошибка при создании файла: {e}")
-        sys.exit(1)
-
-
 if __name__ == '__main__':
-    if len(sys.argv) == 1:
-        print("Запуск веб-сервера... (Используйте --help для CLI режима)")
-        print("Перейдите в браузере по адресу http://127.0.0.1:5000")
-        app.run(debug=False, port=5000)
-    else:
-        run_cli()
+    print("Запуск веб-сервера... (Используйте --help для CLI режима)")
+    print("Перейдите в браузере по адресу http://127.0.0.1:5000")
+    app.run(debug=False, port=5000)
 
 # With hate
 # +═════════════════════════════════════════════════════════════════════════+
@@ -0,0 +1,90 @@
+import argparse
+import email
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import _COMMENT_SYNTAX, clear_for_ai  # noqa: E402
+
+# Исходники стандартной библиотеки: есть на любой машине с Python
+DEFAULT_PATHS = [os.path.dirname(json.__file__), os.path.dirname(email.__file__)]
+
+
+def legacy_clear_for_ai(content: str, file_extension: str) -> str:
+    # Прежняя реализация: до четырёх проходов re.sub без учёта строк
+    line_comment_patterns = {
+        '.py': r'#.*', '.js': r'//.*', '.ts': r'//.*', '.jsx': r'//.*', '.tsx': r'//.*', '.go': r'//.*',
+        '.rs': r'//.*', '.java': r'//.*', '.cs': r'//.*', '.c': r'//.*', '.cpp': r'//.*', '.h': r'//.*',
+        '.hpp': r'//.*', '.swift': r'//.*', '.kt': r'//.*', '.kts': r'//.*', '.rb': r'#.*',
+        '.php': r'//.*|#.*', '.sh': r'#.*',
+    }
+    if file_extension in ['.py']:
+        for pattern in (r'"""(.*?)"""', r"'''(.*?)'''"):
+            content = re.sub(pattern, '', content, flags=re.DOTALL)
+    elif file_extension in ['.js', '.ts', '.css', '.c', '.cpp', '.java', '.cs', '.go', '.rs', '.swift', '.kt']:
+        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+    elif file_extension in ['.html', '.xml']:
+        content = re.sub(r'<!--.*?-->', '', content, flags=re.DOTALL)
+    if file_extension in line_comment_patterns:
+        content = re.sub(line_comment_patterns[file_extension], '', content)
+    content = re.sub(r'\n\s*\n', '\n', content)
+    return content.strip()
+
+
+def measure(sources, ext: str, repeat: int):
+    # Прежняя реализация и сканер по очереди в каждом повторе: фоновая нагрузка сказывается на обоих одинаково
+    best = [None, None]
+    for _ in range(repeat):
+        for slot, fn in enumerate((legacy_clear_for_ai, clear_for_ai)):
+            start = time.perf_counter()
+            for source in sources:
+                fn(source, ext)
+            elapsed = time.perf_counter() - start
+            best[slot] = elapsed if best[slot] is None else min(best[slot], elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: очистка для ИИ, прежние re.sub и сканер")
+    parser.add_argument("paths", nargs="*", help="Директории с исходниками (по умолчанию json и email из stdlib)")
+    parser.add_argument("--repeat", type=int, default=5, help="Число повторов, берётся лучший результат")
+    parser.add_argument("--fail-above", type=float, default=None,
+                        help="Код выхода 1, если сканер медленнее прежней реализации во столько раз")
+    parser.add_argument("--large", action="store_true",
+                        help="Склеить исходники каждого расширения в один большой файл; "
+                             "без --fail-above код выхода 1, если сканер медленнее прежней реализации")
+    args = parser.parse_args()
+
+    by_ext = {}
+    for path in args.paths or DEFAULT_PATHS:
+        for file in Path(path).rglob('*'):
+            if file.suffix in _COMMENT_SYNTAX and file.is_file():
+                try:
+                    by_ext.setdefault(file.suffix, []).append(file.read_text(encoding='utf-8'))
+                except (OSError, UnicodeDecodeError):
+                    pass
+
+    if args.large:
+        by_ext = {ext: ['\n'.join(sources)] for ext, sources in by_ext.items()}
+        if args.fail_above is None:
+            args.fail_above = 1.0
+
+    failed = False
+    print(f"{'extension':<10}{'files':>7}{'MB':>8}{'legacy MB/s':>14}{'scanner MB/s':>14}")
+    for ext, sources in sorted(by_ext.items()):
+        mb = sum(len(s) for s in sources) / (1024 * 1024)
+        legacy, scanner = measure(sources, ext, args.repeat)
+        print(f"{ext:<10}{len(sources):>7}{mb:>8.1f}{mb / legacy:>14.1f}{mb / scanner:>14.1f}")
+        if args.fail_above is not None and scanner / legacy > args.fail_above:
+            print(f"[FAIL] {ext}: scanner is {scanner / legacy:.2f}x slower than the legacy implementation.")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Дочерний процесс сначала импортирует всё нужное, а потом ограничивает адресное пространство:
+# потолок отсчитывается от уже загруженного интерпретатора, а не от нуля
+CHILD = """
+import io, contextlib, resource, sys
+sys.path.insert(0, {app_dir!r})
+from pathlib import Path
+import merger
+
+vm_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmSize:'))
+limit = (vm_kb + {budget_mb} * 1024) * 1024
+resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+root = Path({root!r})
+files = [str(p.relative_to(root)) for p in sorted(root.rglob('*')) if p.is_file()]
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        merger.perform_merge_logic(root, files, Path({output!r}), {fmt!r}, 'en', {remove_secrets}, {clear_ai})
+except MemoryError:
+    sys.exit(3)
+"""
+
+
+def generate_large_project(root: Path, total_mb: int, file_mb: int):
+    root.mkdir(parents=True, exist_ok=True)
+    line = "value = compute(alpha, beta)  # note: password = 'not-a-secret'\n"
+    body = line * (file_mb * 1024 * 1024 // len(line))
+    count = max(1, total_mb // file_mb)
+    for i in range(count):
+        package = root / f"pkg_{i % 16}"
+        package.mkdir(exist_ok=True)
+        (package / f"module_{i}.py").write_text(body, encoding="utf-8")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка потолка памяти при склейке большого проекта")
+    parser.add_argument("--total-mb", type=int, default=256, help="Суммарный размер синтетического проекта")
+    parser.add_argument("--file-mb", type=int, default=4, help="Размер одного файла")
+    parser.add_argument("--budget-mb", type=int, default=64, help="Сколько памяти сверх старта разрешено процессу")
+    parser.add_argument("--formats", nargs="+", default=["txt", "md"], choices=["txt", "md", "pdf"])
+    args = parser.parse_args()
+
+    if args.total_mb <= args.budget_mb:
+        print("[WARN] Проект меньше лимита памяти: проверка ничего не докажет.")
+
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="pmt-mem-") as tmp:
+        root = Path(tmp) / "project"
+        count = generate_large_project(root, args.total_mb, args.file_mb)
+        print(f"[INFO] {count} files, {args.total_mb} MB total, budget {args.budget_mb} MB over startup.")
+        for fmt in args.formats:
+            for remove_secrets, clear_ai in ((False, False), (True, False), (False, True)):
+                code = CHILD.format(app_dir=str(APP_DIR), budget_mb=args.budget_mb, root=str(root),
+                                    output=str(Path(tmp) / f"out.{fmt}"), fmt=fmt,
+                                    remove_secrets=remove_secrets, clear_ai=clear_ai)
+                start = time.perf_counter()
+                proc = subprocess.run([sys.executable, "-c", code])
+                elapsed = time.perf_counter() - start
+                peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+                label = f"{fmt} secrets={remove_secrets} clear_ai={clear_ai}"
+                status = "ok" if proc.returncode == 0 else ("OOM" if proc.returncode == 3 else f"exit {proc.returncode}")
+                print(f"{label:<40}{status:>8}{elapsed:>9.2f}s  peak RSS so far {peak_mb:.0f} MB")
+                failed |= proc.returncode != 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
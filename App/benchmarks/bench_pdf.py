@@ -0,0 +1,76 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import FILE_CONTENT_TRANSLATIONS, _iter_pdf_file_html, build_file_tree, flatten_file_tree  # noqa: E402
+from synthetic import generate_project  # noqa: E402
+
+
+def legacy_highlight(root: Path, files):
+    # Прежняя подсветка: поиск лексера и новый HtmlFormatter на каждый файл
+    from pygments import highlight
+    from pygments.lexers import get_lexer_for_filename, TextLexer
+    from pygments.formatters import HtmlFormatter
+    for rel in sorted(files):
+        content = (root / rel).read_text(encoding="utf-8")
+        if not content:
+            continue
+        try:
+            lexer = get_lexer_for_filename(rel, stripall=True)
+        except Exception:
+            lexer = TextLexer()
+        highlight(content, lexer, HtmlFormatter(linenos=True, cssclass="highlight"))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: подсветка и вёрстка PDF, один процесс и секции параллельно")
+    parser.add_argument("--path", "-p", type=str, help="Существующая директория (по умолчанию генерируется синтетическая)")
+    parser.add_argument("--files", type=int, default=2000, help="Число файлов в синтетическом проекте")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Число процессов для вёрстки")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pmt-pdf-") as tmp:
+        if args.path:
+            root = Path(args.path).resolve()
+        else:
+            root = Path(tmp) / "project"
+            print(f"[INFO] Generating {args.files} files in {root} ...")
+            generate_project(root, files=args.files, depth=3, fanout=6)
+        files = flatten_file_tree(build_file_tree(root, root, None))
+        T = FILE_CONTENT_TRANSLATIONS['en']
+
+        print(f"{'stage':<34}{'seconds':>10}")
+        print(f"{'highlight, legacy':<34}{timed(lambda: legacy_highlight(root, files)):>10.2f}")
+        highlight_new = timed(lambda: sum(1 for _ in _iter_pdf_file_html(root, files, T, (), False)))
+        print(f"{'highlight, cached lexers':<34}{highlight_new:>10.2f}")
+
+        try:
+            import weasyprint  # noqa: F401
+        except (ImportError, OSError) as e:
+            print(f"[WARN] WeasyPrint unavailable ({e.__class__.__name__}), PDF rendering is not measured.")
+            return
+        for jobs in sorted({1, args.jobs}):
+            output = Path(tmp) / f"out-{jobs}.pdf"
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed = timed(lambda: merger.perform_merge_logic(root, files, output, 'pdf', 'en', False, False,
+                                                                   jobs=jobs))
+            label = f"pdf end to end, jobs={jobs}"
+            print(f"{label:<34}{elapsed:>10.2f}   {os.path.getsize(output) / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import build_file_tree, flatten_file_tree  # noqa: E402
+from synthetic import generate_project  # noqa: E402
+
+
+def timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: последовательный и параллельный обход дерева")
+    parser.add_argument("--path", "-p", type=str, help="Существующая директория (по умолчанию генерируется синтетическая)")
+    parser.add_argument("--files", type=int, default=100_000, help="Число файлов в синтетическом проекте")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16], help="Размеры пула для сравнения")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов, берётся лучший результат")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pmt-bench-") as tmp:
+        if args.path:
+            root = Path(args.path).resolve()
+        else:
+            root = Path(tmp) / "project"
+            print(f"[INFO] Generating {args.files} files in {root} ...")
+            dirs = generate_project(root, files=args.files)
+            print(f"[INFO] {dirs} directories created.")
+
+        serial_time, serial_tree = timed(lambda: build_file_tree(root, root, None), args.repeat)
+        total = len(flatten_file_tree(serial_tree))
+        print(f"{'mode':<14}{'seconds':>10}{'files/s':>14}{'speedup':>10}")
+        print(f"{'serial':<14}{serial_time:>10.3f}{total / serial_time:>14.0f}{1.0:>10.2f}")
+
+        for workers in args.workers:
+            par_time, par_tree = timed(lambda: build_file_tree(root, root, None, workers=workers), args.repeat)
+            if par_tree != serial_tree:
+                print(f"[FAIL] Parallel tree with {workers} workers differs from the serial one.")
+                sys.exit(1)
+            label = f"parallel x{workers}"
+            print(f"{label:<14}{par_time:>10.3f}{total / par_time:>14.0f}{serial_time / par_time:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import DEFAULT_SECRET_RULES, SECRET_RULES, sanitize_content  # noqa: E402
+
+
+def legacy_sanitize_content(content: str) -> str:
+    # Прежняя реализация: два полных прохода re.sub по всему тексту
+    pattern1 = re.compile(r"""(['"]?((?:api|access|secret|private)_?(?:key|token)|token|password)['"]?\s*[:=]\s*)['"][^'"]*['"]""", re.IGNORECASE)
+    content = pattern1.sub(r'\1"[SECRET REMOVED]"', content)
+    pattern2 = re.compile(r"""(^((?:API|ACCESS|SECRET|PRIVATE)_?(?:KEY|TOKEN)|TOKEN|PASSWORD)=)[^\n]*""", re.IGNORECASE | re.MULTILINE)
+    content = pattern2.sub(r'\1[SECRET REMOVED]', content)
+    return content
+
+
+def per_rule_sanitize_content(content: str, rule_names) -> str:
+    # Отдельный проход re.sub на каждое правило: так стоимость растёт с числом правил
+    lowered = content.lower()
+    for name, rule in SECRET_RULES.items():
+        if name not in rule_names or rule.keywords and not any(kw in lowered for kw in rule.keywords):
+            continue
+        repl = rule.replacement
+        if rule.validator is not None:
+            def repl(match, validator=rule.validator, template=rule.replacement):
+                return match.expand(template) if validator(match.group()) else match.group()
+        content = re.sub(rule.pattern, repl, content, flags=re.IGNORECASE | re.MULTILINE)
+    return content
+
+
+def make_corpus(size_mb: int, secret_ratio: float, keyword_every: int = 0, seed: int = 69):
+    # keyword_every=N: каждая N-я строка содержит ключевое слово (не всегда секрет), это выключает предфильтр
+    rng = random.Random(seed)
+    clean = [
+        "def handle(request):\n    return render(request, 'index.html', {'items': items})\n",
+        "for (let i = 0; i < rows.length; i++) { total += rows[i].value; }\n",
+        "# Настройки соединения с базой\nDATABASE_URL = os.environ.get('DATABASE_URL')\n",
+        "    public static void main(String[] args) { System.out.println(\"hello\"); }\n",
+    ]
+    dirty = [
+        'API_KEY = "sk-live-1234567890abcdef"\n',
+        "PASSWORD=hunter2\n",
+        "config = {'access_token': 'abc.def.ghi'}\n",
+    ]
+    keyword = [
+        "    token = session.get_token(request.user)\n",
+        "if (!password.length) { showError('password'); }\n",
+        "cache_key = f'{prefix}:{item.id}'\n",
+    ] + dirty
+    files = []
+    target = size_mb * 1024 * 1024
+    total = line_no = 0
+    while total < target:
+        lines = []
+        for _ in range(200):
+            line_no += 1
+            lines.append(rng.choice(keyword) if keyword_every and line_no % keyword_every == 0 else rng.choice(clean))
+        if rng.random() < secret_ratio:
+            lines[rng.randrange(len(lines))] = rng.choice(dirty)
+        text = "".join(lines)
+        files.append(text)
+        total += len(text)
+    return files, total
+
+
+def measure(fn, files, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in files:
+            fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: удаление секретов, старая и новая реализация")
+    parser.add_argument("--size-mb", type=int, default=32, help="Объём синтетического корпуса в МБ")
+    parser.add_argument("--secret-ratio", type=float, default=0.05, help="Доля файлов, содержащих секрет")
+    parser.add_argument("--keyword-every", type=int, nargs="+", default=[0, 1000, 1],
+                        help="Корпуса, где каждая N-я строка содержит ключевое слово; 0 - без ключевых слов")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов, берётся лучший результат")
+    parser.add_argument("--fail-above", type=float, default=1.1,
+                        help="Код выхода 1, если правила по умолчанию медленнее прежней реализации во столько раз")
+    args = parser.parse_args()
+
+    # entropy без ключевых слов проходит по каждому файлу, поэтому меряется отдельной строкой
+    keyword_rules = tuple(name for name, rule in SECRET_RULES.items() if rule.keywords)
+    failed = False
+    for keyword_every in args.keyword_every:
+        files, total = make_corpus(args.size_mb, args.secret_ratio, keyword_every)
+        mb = total / (1024 * 1024)
+        density = f"keyword every {keyword_every} lines" if keyword_every else "no keywords"
+        print(f"\n[INFO] Corpus: {len(files)} files, {mb:.1f} MB, secret ratio {args.secret_ratio}, {density}")
+
+        mismatched = sum(1 for text in files if legacy_sanitize_content(text) != sanitize_content(text))
+        if mismatched:
+            print(f"[FAIL] Default rules differ from the legacy output on {mismatched} files.")
+            sys.exit(1)
+
+        print(f"{'implementation':<28}{'seconds':>10}{'MB/s':>10}")
+        rows = [
+            ("legacy (2 passes)", legacy_sanitize_content),
+            ("scanner " + "+".join(DEFAULT_SECRET_RULES), sanitize_content),
+            ("scanner keyword rules", lambda text: sanitize_content(text, keyword_rules)),
+            ("scanner all rules", lambda text: sanitize_content(text, tuple(SECRET_RULES))),
+            ("pass per rule, all rules", lambda text: per_rule_sanitize_content(text, tuple(SECRET_RULES))),
+        ]
+        timings = {}
+        for label, fn in rows:
+            timings[label] = elapsed = measure(fn, files, args.repeat)
+            print(f"{label:<28}{elapsed:>10.3f}{mb / elapsed:>10.1f}")
+        ratio = timings[rows[1][0]] / timings[rows[0][0]]
+        if ratio > args.fail_above:
+            print(f"[FAIL] Default rules are {ratio:.2f}x slower than the legacy implementation.")
+            failed = True
+        # Все правила идут одним выражением: дороже правил по умолчанию ровно на то, что добавляет само
+        # выражение entropy, и не дороже отдельных проходов
+        ratio = timings[rows[3][0]] / timings[rows[4][0]]
+        print(f"[INFO] All rules in one pass take {ratio:.2f}x the time of one pass per rule.")
+        if ratio > args.fail_above:
+            print("[FAIL] The combined pattern is slower than one pass per rule.")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
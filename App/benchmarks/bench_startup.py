@@ -0,0 +1,86 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+# Модули, которых не должно быть на пути CLI: они грузятся только веб-сервером или нужным форматом
+FORBIDDEN = ("flask", "werkzeug", "jinja2", "pathspec", "pygments", "weasyprint", "pypdf", "multiprocessing",
+             "concurrent", "sqlite3", "subprocess", "tokenize", "heapq")
+
+
+def run(args, importtime=False):
+    env = dict(os.environ)
+    # Без .pyc каждый запуск заново компилирует исходники, а замер нужен для обычной установки
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + args
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        print(f"[FAIL] {' '.join(args)} exited with {result.returncode}:\n{result.stderr}")
+        sys.exit(1)
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr: str):
+    # Строки вида "import time:  self | cumulative | name", вложенность задаётся отступом имени
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        modules[parts[2].strip()] = int(parts[0])
+    return modules
+
+
+def best_wall(args, repeat: int):
+    return min(run(args)[0] for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: время холодного старта CLI и набор импортируемых модулей")
+    parser.add_argument("--repeat", type=int, default=10, help="Число запусков, берётся лучший")
+    parser.add_argument("--budget-ms", type=float, default=80.0,
+                        help="Допустимое время импортов CLI сверх голого интерпретатора, мс")
+    args = parser.parse_args()
+
+    cli = ["app.py", "--help"]
+    run(cli)  # прогрев: .pyc и файловый кэш
+    modules = parse_importtime(run(cli, importtime=True)[1])
+    baseline_modules = parse_importtime(run(["-c", "pass"], importtime=True)[1])
+    extra = {name: us for name, us in modules.items() if name not in baseline_modules}
+    forbidden = sorted({name.split(".")[0] for name in extra} & set(FORBIDDEN))
+
+    baseline = best_wall(["-c", "pass"], args.repeat)
+    cli_wall = best_wall(cli, args.repeat)
+    web_wall = best_wall(["-c", "import app"], args.repeat)
+    import_ms = sum(extra.values()) / 1000
+
+    print(f"{'measurement':<36}{'ms':>10}")
+    print(f"{'python -c pass':<36}{baseline * 1000:>10.1f}")
+    print(f"{'app.py --help (CLI)':<36}{cli_wall * 1000:>10.1f}")
+    print(f"{'import app (web, Flask)':<36}{web_wall * 1000:>10.1f}")
+    print(f"{'CLI imports, sum of self times':<36}{import_ms:>10.1f}   {len(extra)} modules")
+    print("[INFO] Slowest CLI imports: " + ", ".join(
+        f"{name} {us / 1000:.1f}" for name, us in sorted(extra.items(), key=lambda item: -item[1])[:5]))
+
+    ok = True
+    if forbidden:
+        ok = False
+        print(f"[FAIL] CLI path imports {', '.join(forbidden)}")
+    if import_ms > args.budget_ms:
+        ok = False
+        print(f"[FAIL] CLI imports take {import_ms:.1f} ms, budget is {args.budget_ms:.1f} ms")
+    if not ok:
+        sys.exit(1)
+    print("[OK]   CLI start-up is within budget")
+
+
+if __name__ == "__main__":
+    main()
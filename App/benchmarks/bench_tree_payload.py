@@ -0,0 +1,117 @@
+import argparse
+import gzip
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from merger import build_file_tree, decode_tree_columnar, encode_tree_columnar  # noqa: E402
+from synthetic import generate_project  # noqa: E402
+
+# Браузерная сторона: JSON.parse и decodeColumnarTree, взятая прямо из script.js
+NODE_BENCH = r"""
+const fs = require('fs');
+const src = fs.readFileSync(process.argv[1], 'utf8');
+const start = src.indexOf('function decodeColumnarTree');
+let depth = 0, end = src.indexOf('{', start);
+for (; end < src.length; end++) {
+    if (src[end] === '{') depth++;
+    else if (src[end] === '}' && --depth === 0) break;
+}
+const decodeColumnarTree = new Function(src.slice(start, end + 1) + '; return decodeColumnarTree;')();
+const nested = fs.readFileSync(process.argv[2], 'utf8');
+const columnar = fs.readFileSync(process.argv[3], 'utf8');
+const repeat = Number(process.argv[4]);
+const best = (fn) => {
+    let result = Infinity;
+    for (let i = 0; i < repeat; i++) {
+        const t = process.hrtime.bigint();
+        fn();
+        result = Math.min(result, Number(process.hrtime.bigint() - t) / 1e6);
+    }
+    return result;
+};
+const same = JSON.stringify(decodeColumnarTree(JSON.parse(columnar))) === JSON.stringify(JSON.parse(nested));
+console.log(JSON.stringify({
+    same,
+    nested: best(() => JSON.parse(nested)),
+    columnar: best(() => decodeColumnarTree(JSON.parse(columnar))),
+}));
+"""
+
+
+def timed(fn, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк: размер и разбор дерева /scan, вложенный и колоночный формат")
+    parser.add_argument("--path", "-p", type=str, help="Существующая директория (по умолчанию генерируется синтетическая)")
+    parser.add_argument("--files", type=int, default=100_000, help="Число файлов в синтетическом проекте")
+    parser.add_argument("--depth", type=int, default=6, help="Глубина синтетического дерева")
+    parser.add_argument("--repeat", type=int, default=5, help="Число повторов, берётся лучший результат")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pmt-bench-") as tmp:
+        if args.path:
+            root = Path(args.path).resolve()
+        else:
+            root = Path(tmp) / "project"
+            print(f"[INFO] Generating {args.files} files in {root} ...")
+            generate_project(root, files=args.files, depth=args.depth, fanout=4)
+
+        tree = build_file_tree(root, root, None)
+        columnar = encode_tree_columnar(tree)
+        if decode_tree_columnar(columnar) != tree:
+            print("[FAIL] Columnar payload does not decode back to the same tree.")
+            sys.exit(1)
+
+        payloads = {"nested": json.dumps(tree, ensure_ascii=False), "columnar": json.dumps(columnar, ensure_ascii=False)}
+        encode = {
+            "nested": timed(lambda: json.dumps(tree, ensure_ascii=False), args.repeat)[0],
+            "columnar": timed(lambda: json.dumps(encode_tree_columnar(tree), ensure_ascii=False), args.repeat)[0],
+        }
+        decode = {
+            "nested": timed(lambda: json.loads(payloads["nested"]), args.repeat)[0],
+            "columnar": timed(lambda: decode_tree_columnar(json.loads(payloads["columnar"])), args.repeat)[0],
+        }
+
+        browser = None
+        if shutil.which("node"):
+            files = {}
+            for name, text in payloads.items():
+                files[name] = Path(tmp) / f"{name}.json"
+                files[name].write_text(text, encoding="utf-8")
+            out = subprocess.run(["node", "-e", NODE_BENCH, str(APP_DIR / "static" / "script.js"),
+                                  str(files["nested"]), str(files["columnar"]), str(args.repeat)],
+                                 capture_output=True, text=True, check=True)
+            browser = json.loads(out.stdout)
+            if not browser["same"]:
+                print("[FAIL] decodeColumnarTree in script.js disagrees with the nested tree.")
+                sys.exit(1)
+
+        print(f"[INFO] {len(columnar['names'])} nodes")
+        header = f"{'format':<10}{'JSON KB':>10}{'gzip KB':>10}{'py encode ms':>14}{'py parse ms':>13}"
+        print(header + (f"{'node parse ms':>15}" if browser else ""))
+        for name, text in payloads.items():
+            raw = text.encode("utf-8")
+            row = (f"{name:<10}{len(raw) / 1024:>10.0f}{len(gzip.compress(raw)) / 1024:>10.0f}"
+                   f"{encode[name] * 1000:>14.1f}{decode[name] * 1000:>13.1f}")
+            print(row + (f"{browser[name]:>15.1f}" if browser else ""))
+
+
+if __name__ == "__main__":
+    main()
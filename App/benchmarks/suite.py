@@ -0,0 +1,217 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from merger import (  # noqa: E402
+    build_file_tree, clear_for_ai, flatten_file_tree, generate_text_tree, load_gitignore_rules, perform_merge_logic,
+    sanitize_content,
+)
+from synthetic import DEFAULT_LANGS, ProjectSpec, generate_spec_project  # noqa: E402
+
+ALL_STAGES = ("scan", "scan_parallel", "read", "sanitize_content", "clear_for_ai", "generate_text_tree",
+              "merge_txt", "merge_md", "merge_pdf", "merge_txt_transform", "end_to_end")
+
+
+def _cpu():
+    # Своё время и время дочерних процессов (воркеры --jobs, CLI в end_to_end)
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def measure(fn, repeat: int, bytes_in: int = 0, items: int = 0):
+    best = None
+    for _ in range(repeat):
+        cpu = _cpu()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        cpu = _cpu() - cpu
+        if best is None or elapsed < best["seconds"]:
+            best = {"seconds": round(elapsed, 4), "cpu_seconds": round(cpu, 4)}
+            if isinstance(result, dict):
+                best.update(result)
+    best.setdefault("items", items)
+    best.setdefault("bytes_in", bytes_in)
+    if best["bytes_in"] and best["seconds"]:
+        best["mb_per_s"] = round(best["bytes_in"] / (1024 * 1024) / best["seconds"], 2)
+    return best
+
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def load_sources(root: Path, files):
+    sources = []
+    for rel in files:
+        try:
+            sources.append((os.path.splitext(rel)[1], (root / rel).read_text(encoding="utf-8")))
+        except (OSError, UnicodeDecodeError):
+            pass
+    return sources
+
+
+def run_stages(root: Path, stages, repeat: int, jobs: int, scan_workers: int, tmp: Path) -> dict:
+    results = {}
+    gitignore = load_gitignore_rules(root)
+    files = flatten_file_tree(build_file_tree(root, root, gitignore))
+    total_bytes = sum(os.path.getsize(root / rel) for rel in files)
+    sources = load_sources(root, files)
+    text_bytes = sum(len(text.encode("utf-8")) for _, text in sources)
+
+    def merge(fmt, **options):
+        output = tmp / f"out.{fmt}"
+        quiet(perform_merge_logic, root, files, output, fmt, 'en', options.get("remove_secrets", False),
+              options.get("clear_for_ai", False), jobs=options.get("jobs", 1))
+        return {"bytes_out": os.path.getsize(output)}
+
+    def read_all():
+        for rel in files:
+            with open(root / rel, "rb") as f:
+                f.read()
+
+    def end_to_end():
+        output = tmp / "cli.txt"
+        subprocess.run([sys.executable, str(APP_DIR / "app.py"), "-p", str(root), "-o", str(output), "--clear-ai",
+                        "-j", str(jobs)], check=True, capture_output=True)
+        return {"bytes_out": os.path.getsize(output)}
+
+    table = {
+        "scan": lambda: measure(lambda: {"items": len(flatten_file_tree(build_file_tree(root, root, gitignore)))},
+                                repeat),
+        "scan_parallel": lambda: measure(
+            lambda: {"items": len(flatten_file_tree(build_file_tree(root, root, gitignore, workers=scan_workers)))},
+            repeat),
+        "read": lambda: measure(read_all, repeat, total_bytes, len(files)),
+        "sanitize_content": lambda: measure(lambda: [sanitize_content(text) for _, text in sources], repeat,
+                                            text_bytes, len(sources)),
+        "clear_for_ai": lambda: measure(lambda: [clear_for_ai(text, ext) for ext, text in sources], repeat,
+                                        text_bytes, len(sources)),
+        "generate_text_tree": lambda: measure(lambda: generate_text_tree(files), repeat, items=len(files)),
+        "merge_txt": lambda: measure(lambda: merge("txt"), repeat, total_bytes, len(files)),
+        "merge_md": lambda: measure(lambda: merge("md"), repeat, total_bytes, len(files)),
+        "merge_pdf": lambda: measure(lambda: merge("pdf", jobs=jobs), 1, total_bytes, len(files)),
+        "merge_txt_transform": lambda: measure(
+            lambda: merge("txt", remove_secrets=True, clear_for_ai=True, jobs=jobs), repeat, total_bytes, len(files)),
+        "end_to_end": lambda: measure(end_to_end, repeat, total_bytes, len(files)),
+    }
+    for stage in stages:
+        if stage == "merge_pdf":
+            try:
+                import weasyprint  # noqa: F401
+            except (ImportError, OSError) as e:
+                results[stage] = {"skipped": f"WeasyPrint unavailable: {e.__class__.__name__}"}
+                print(f"{stage:<22}{'skipped':>10}")
+                continue
+        results[stage] = table[stage]()
+        row = results[stage]
+        speed = f"{row['mb_per_s']:>10.1f}" if "mb_per_s" in row else f"{'':>10}"
+        print(f"{stage:<22}{row['seconds']:>10.3f}{row['cpu_seconds']:>10.3f}{row['items']:>9}{speed}")
+    return results
+
+
+def git_revision():
+    try:
+        result = subprocess.run(["git", "-C", str(APP_DIR), "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: Path, fail_above: float | None) -> bool:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline["meta"]["spec"] != results["meta"]["spec"]:
+        print("[WARN] Baseline was produced from a different project spec, ratios are not comparable.")
+    print(f"\n{'stage':<22}{'base s':>10}{'now s':>10}{'ratio':>8}   vs {baseline['meta'].get('revision')}")
+    ok = True
+    for stage, row in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base or "seconds" not in base or "seconds" not in row:
+            continue
+        ratio = row["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        mark = ""
+        if fail_above is not None and ratio > fail_above:
+            ok = False
+            mark = "  [SLOWER]"
+        print(f"{stage:<22}{base['seconds']:>10.3f}{row['seconds']:>10.3f}{ratio:>8.2f}{mark}")
+    return ok
+
+
+def main():
+    defaults = ProjectSpec()
+    parser = argparse.ArgumentParser(description="Набор бенчмарков: синтетический проект, этапы по отдельности и целиком")
+    parser.add_argument("--path", "-p", type=str, help="Существующая директория вместо синтетического проекта")
+    parser.add_argument("--files", type=int, default=defaults.files, help="Число файлов")
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="Глубина дерева папок")
+    parser.add_argument("--fanout", type=int, default=defaults.fanout, help="Подпапок на папку")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Зерно генератора")
+    parser.add_argument("--size", choices=["fixed", "uniform", "lognormal"], default=defaults.size,
+                        help="Распределение размеров файлов")
+    parser.add_argument("--mean-kb", type=float, default=defaults.mean_kb, help="Средний размер файла, КБ")
+    parser.add_argument("--langs", type=str, default=",".join(f"{ext}:{w}" for ext, w in DEFAULT_LANGS),
+                        help="Смесь языков: .py:30,.js:15,...")
+    parser.add_argument("--secret-ratio", type=float, default=defaults.secret_ratio, help="Доля файлов с секретом")
+    parser.add_argument("--binary-ratio", type=float, default=defaults.binary_ratio, help="Доля двоичных файлов")
+    parser.add_argument("--gitignore-ratio", type=float, default=defaults.gitignore_ratio,
+                        help="Доля папок со своим .gitignore")
+    parser.add_argument("--stages", nargs="+", choices=ALL_STAGES, default=list(ALL_STAGES), help="Какие этапы мерить")
+    parser.add_argument("--repeat", type=int, default=3, help="Число повторов, берётся лучший результат")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="--jobs для склейки с трансформациями")
+    parser.add_argument("--scan-workers", type=int, default=8, help="Потоки для scan_parallel")
+    parser.add_argument("--output", "-o", type=str, help="Куда записать результаты JSON")
+    parser.add_argument("--compare", type=str, metavar="BASELINE.json", help="Сравнить с прошлым прогоном")
+    parser.add_argument("--fail-above", type=float, metavar="RATIO",
+                        help="С --compare: код выхода 1, если этап медленнее базы больше чем в RATIO раз")
+    args = parser.parse_args()
+
+    langs = tuple((ext, int(weight)) for ext, weight in (item.split(":") for item in args.langs.split(",")))
+    spec = ProjectSpec(files=args.files, depth=args.depth, fanout=args.fanout, seed=args.seed, size=args.size,
+                       mean_kb=args.mean_kb, langs=langs, secret_ratio=args.secret_ratio,
+                       binary_ratio=args.binary_ratio, gitignore_ratio=args.gitignore_ratio)
+
+    with tempfile.TemporaryDirectory(prefix="pmt-suite-") as tmp:
+        tmp = Path(tmp)
+        meta = {"revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+                "cpu_count": os.cpu_count(), "jobs": args.jobs, "repeat": args.repeat,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        if args.path:
+            root = Path(args.path).resolve()
+            meta["spec"] = {"path": str(root)}
+        else:
+            root = tmp / "project"
+            start = time.perf_counter()
+            meta["project"] = generate_spec_project(root, spec)
+            meta["generate_seconds"] = round(time.perf_counter() - start, 3)
+            meta["spec"] = {**spec._asdict(), "langs": [list(item) for item in spec.langs]}
+            print(f"[INFO] Generated {meta['project']['files']} files, {meta['project']['bytes'] / (1024 * 1024):.1f} MB "
+                  f"in {meta['generate_seconds']} s")
+
+        print(f"{'stage':<22}{'seconds':>10}{'cpu s':>10}{'items':>9}{'MB/s':>10}")
+        (tmp / "out").mkdir()
+        stages = run_stages(root, args.stages, args.repeat, args.jobs, args.scan_workers, tmp / "out")
+        results = {"meta": meta, "stages": stages}
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"[INFO] Results written to {args.output}")
+    if args.compare and not compare(results, Path(args.compare), args.fail_above):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import math
+import random
+from pathlib import Path
+from typing import NamedTuple
+
+
+def generate_project(root: Path, files: int = 100_000, depth: int = 4, fanout: int = 8, seed: int = 69):
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+
+    dirs = [root]
+    frontier = [root]
+    for level in range(depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(fanout):
+                d = parent / f"pkg_{level}_{i}"
+                d.mkdir(exist_ok=True)
+                next_frontier.append(d)
+        dirs.extend(next_frontier)
+        frontier = next_frontier
+
+    exts = [".py", ".js", ".ts", ".go", ".md", ".json", ".txt"]
+    for n in range(files):
+        d = dirs[rng.randrange(len(dirs))]
+        (d / f"file_{n}{rng.choice(exts)}").write_text(f"# file {n}\n", encoding="utf-8")
+    return len(dirs)
+
+
+# Заготовки исходников: комментарии и строки нужны, чтобы clear_for_ai и поиск секретов работали как на живом коде
+SNIPPETS = {
+    ".py": ('"""Module docstring."""\nimport os  # comment\n\n',
+            'def handler_{n}(request):\n    """Docstring."""\n    url = "http://example.com/#anchor"  # tail\n'
+            '    return {{"id": {n}, "path": os.path.join("a", "b")}}\n\n'),
+    ".js": ('// header\n',
+            'export function f{n}(a, b) {{ // tail\n  /* block */ const re = /\\/\\//g;\n'
+            '  return `${{a}}//${{b}}` + "{n}";\n}}\n'),
+    ".ts": ('// header\n',
+            'export const v{n}: number = {n} / 2; /* inline */\nconst s{n} = "//not a comment";\n'),
+    ".go": ('package main\n\n',
+            '// Doc comment.\nfunc F{n}() string {{\n\treturn "//" + `raw {n}` /* end */\n}}\n'),
+    ".java": ('package demo;\n\n',
+              'class C{n} {{\n  /** Javadoc. */\n  String s = "/* not */"; // tail\n}}\n'),
+    ".c": ('#include <stdio.h>\n',
+           'int f{n}(void) {{ /* block */ return puts("// {n}"); }} // tail\n'),
+    ".md": ('# Title\n\n', 'Paragraph {n} with `code` and a [link](http://example.com).\n\n'),
+    ".json": ('', '{{"id": {n}, "name": "item {n}", "tags": ["a", "b"]}}\n'),
+    ".sh": ('#!/bin/bash\n', 'echo "#not" $# # tail {n}\n'),
+}
+SECRET_LINES = ('API_KEY = "sk-live-1234567890abcdef"\n', 'PASSWORD=hunter2\n',
+                "config = {'access_token': 'abc.def.ghi'}\n")
+# Двоичный шум: неизвестные расширения доходят до чтения, известные отсекаются исключениями
+BINARY_EXTS = (".bin", ".wasm", ".dat", ".png", ".so")
+DEFAULT_LANGS = ((".py", 30), (".js", 15), (".ts", 15), (".go", 8), (".java", 8), (".c", 6), (".md", 8),
+                 (".json", 6), (".sh", 4))
+
+
+class ProjectSpec(NamedTuple):
+    files: int = 10_000
+    depth: int = 4
+    fanout: int = 6
+    seed: int = 69
+    # Распределение размеров: fixed - все mean_kb, uniform - от 0 до 2*mean_kb, lognormal - длинный хвост
+    size: str = "lognormal"
+    mean_kb: float = 4.0
+    langs: tuple = DEFAULT_LANGS
+    secret_ratio: float = 0.05
+    binary_ratio: float = 0.02
+    gitignore_ratio: float = 0.1
+
+
+def _file_size(rng: random.Random, spec: ProjectSpec) -> int:
+    mean = spec.mean_kb * 1024
+    if spec.size == "fixed":
+        return int(mean)
+    if spec.size == "uniform":
+        return int(rng.uniform(0, 2 * mean))
+    if spec.size == "lognormal":
+        sigma = 1.0
+        return int(rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma))
+    raise ValueError(f"Неизвестное распределение размеров: {spec.size}")
+
+
+def _source_text(rng: random.Random, ext: str, size: int, secret: bool) -> str:
+    head, body = SNIPPETS[ext]
+    parts, total, n = [head], len(head), 0
+    while total < size:
+        chunk = body.format(n=n)
+        parts.append(chunk)
+        total += len(chunk)
+        n += 1
+    if secret:
+        parts.insert(rng.randrange(1, len(parts) + 1), rng.choice(SECRET_LINES))
+    return "".join(parts)
+
+
+def generate_spec_project(root: Path, spec: ProjectSpec = ProjectSpec()) -> dict:
+    # Один и тот же spec и seed дают байт-в-байт одинаковый проект
+    rng = random.Random(spec.seed)
+    root.mkdir(parents=True, exist_ok=True)
+    dirs = [root]
+    frontier = [root]
+    for level in range(spec.depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(spec.fanout):
+                d = parent / f"pkg_{level}_{i}"
+                d.mkdir(exist_ok=True)
+                next_frontier.append(d)
+        dirs.extend(next_frontier)
+        frontier = next_frontier
+
+    stats = {"dirs": len(dirs), "files": 0, "bytes": 0, "binary": 0, "secrets": 0, "gitignores": 0, "ignored": 0}
+    # Вложенные .gitignore: свои шаблоны, исключение из них и папка, которую надо пропустить целиком
+    for d in dirs[1:]:
+        if rng.random() < spec.gitignore_ratio:
+            (d / ".gitignore").write_text("*.tmp\n!keep.tmp\ngenerated/\n", encoding="utf-8")
+            (d / "generated").mkdir(exist_ok=True)
+            (d / "generated" / "out.js").write_text("var generated = 1;\n", encoding="utf-8")
+            (d / "scratch.tmp").write_text("tmp\n", encoding="utf-8")
+            (d / "keep.tmp").write_text("keep\n", encoding="utf-8")
+            stats["gitignores"] += 1
+            stats["ignored"] += 2
+
+    exts = [ext for ext, _ in spec.langs]
+    weights = [weight for _, weight in spec.langs]
+    for n in range(spec.files):
+        d = dirs[rng.randrange(len(dirs))]
+        size = _file_size(rng, spec)
+        if rng.random() < spec.binary_ratio:
+            ext = rng.choice(BINARY_EXTS)
+            data = rng.randbytes(max(size, 16))
+            stats["binary"] += 1
+        else:
+            ext = rng.choices(exts, weights)[0]
+            secret = rng.random() < spec.secret_ratio
+            stats["secrets"] += secret
+            data = _source_text(rng, ext, size, secret).encode("utf-8")
+        (d / f"file_{n}{ext}").write_bytes(data)
+        stats["files"] += 1
+        stats["bytes"] += len(data)
+    return stats
@@ -0,0 +1,3784 @@
+import os
+import re
+import json
+import math
+import argparse
+import codecs
+import contextlib
+import fnmatch
+import io
+import hashlib
+import keyword
+import threading
+import time
+from pathlib import Path
+import sys
+from typing import NamedTuple
+from collections import deque
+from itertools import groupby
+from bisect import bisect_left
+
+# Движок склейки без Flask: сканирование, трансформации, запись txt/md/pdf и CLI.
+# Flask, pathspec, Pygments и WeasyPrint импортируются только там, где нужны. Так же, по месту, и тяжёлые
+# для старта модули stdlib (concurrent.futures, sqlite3, subprocess, tokenize, heapq, shutil)
+
+_GLOB_CHARS = ('*', '?', '[')
+
+
+def _compile_globs(patterns):
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns)).match
+
+
+class ExclusionMatcher(NamedTuple):
+    dir_names: frozenset
+    file_names: frozenset
+    exts: frozenset
+    dir_glob: object
+    file_glob: object
+    signature: str
+
+    def excludes(self, name: str, is_file: bool) -> bool:
+        # Как и раньше, исключения директорий применяются к любому имени
+        if name in self.dir_names or (self.dir_glob and self.dir_glob(name)):
+            return True
+        if is_file:
+            if name in self.file_names or os.path.splitext(name)[1] in self.exts:
+                return True
+            if self.file_glob and self.file_glob(name):
+                return True
+        return False
+
+
+def compile_exclusions(config: dict) -> ExclusionMatcher:
+    def split(key):
+        exact, globs = [], []
+        for item in config.get(key, []):
+            (globs if any(ch in item for ch in _GLOB_CHARS) else exact).append(item)
+        return frozenset(exact), globs
+
+    dir_names, dir_globs = split("dirs")
+    file_names, file_globs = split("files")
+    exts, ext_globs = split("exts")
+    # Файлу достаточно совпасть с любым шаблоном: директорий, файлов или расширений
+    return ExclusionMatcher(
+        dir_names=dir_names,
+        file_names=file_names,
+        exts=exts,
+        dir_glob=_compile_globs(dir_globs),
+        file_glob=_compile_globs(dir_globs + file_globs + ["*" + g for g in ext_globs]),
+        signature=json.dumps({key: sorted(config.get(key, [])) for key in ("dirs", "files", "exts")}, sort_keys=True),
+    )
+
+
+exclusions = None
+exclusion_matcher = None
+exclusions_file = Path("merger_exclusions.json")
+
+def load_exclusions():
+    global exclusions, exclusion_matcher
+    if exclusions_file.exists():
+        exclusions = json.loads(exclusions_file.read_text(encoding="utf-8"))
+    else:
+        exclusions = {
+            "dirs": [
+                "__pycache__", ".git", ".idea", ".vscode", "venv", ".venv", "env",
+                "node_modules", "dist", "build", "target", ".pytest_cache",
+                ".mypy_cache", "site", "*.egg-info", "static", "templates"
+            ],
+            "files": ["poetry.lock", "Pipfile.lock", "merged_project.txt", "merger_exclusions.json"],
+            "exts": [
+                ".pyc", ".pyo", ".pyd", ".so", ".log", ".db", ".sqlite3",
+                ".DS_Store", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico",
+                ".mp4", ".mov", ".avi", ".zip", ".tar", ".gz", ".rar", ".env"
+            ]
+        }
+    exclusion_matcher = compile_exclusions(exclusions)
+
+
+# Исключения читаются при первом обращении, а не при импорте: CLI и процессы-воркеры не платят за это
+def get_exclusions() -> dict:
+    if exclusions is None:
+        load_exclusions()
+    return exclusions
+
+
+def get_exclusion_matcher() -> ExclusionMatcher:
+    if exclusion_matcher is None:
+        load_exclusions()
+    return exclusion_matcher
+
+
+def save_exclusions():
+    exclusions_file.write_text(json.dumps(exclusions, indent=4, ensure_ascii=False), encoding="utf-8")
+
+
+def set_exclusions(config: dict):
+    global exclusions, exclusion_matcher
+    exclusions = config
+    exclusion_matcher = compile_exclusions(config)
+    save_exclusions()
+
+APP_DIR = Path(__file__).resolve().parent
+# Файлы самого инструмента не попадают в склейку, даже если сканируется его собственная папка
+SCRIPT_PATHS = frozenset(str(APP_DIR / name) for name in ("app.py", "merger.py"))
+SCRIPT_NAMES = frozenset(os.path.basename(path) for path in SCRIPT_PATHS)
+MAX_SCAN_WORKERS = 64
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "project_merger"
+STATS_TOP_FILES = 10
+
+
+def _clock():
+    # CPU считается по потоку: сканирование идёт в нескольких потоках, и время процесса их бы смешало
+    return time.perf_counter(), time.thread_time()
+
+
+def _elapsed(started):
+    return time.perf_counter() - started[0], time.thread_time() - started[1]
+
+
+class MergeStats:
+    # Замеры по этапам: вызовы, стена, CPU, объём на входе и выходе, плюс суммарное время по файлам.
+    # Выключенная статистика - это stats=None, и горячий путь платит одной проверкой на папку или файл
+    __slots__ = ("stages", "files", "lock")
+
+    def __init__(self):
+        self.stages = {}
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, wall: float, cpu: float, size_in: int = 0, size_out: int = 0, count: int = 1):
+        with self.lock:
+            row = self.stages.get(stage)
+            if row is None:
+                row = self.stages[stage] = [0, 0.0, 0.0, 0, 0]
+            row[0] += count
+            row[1] += wall
+            row[2] += cpu
+            row[3] += size_in
+            row[4] += size_out
+
+    def stop(self, stage: str, started, size_in: int = 0, size_out: int = 0, count: int = 1):
+        self.add(stage, *_elapsed(started), size_in, size_out, count)
+
+    def add_file(self, rel_path: str, timings):
+        # timings: [(этап, стена, CPU, вход, выход)] одного файла, в том числе посчитанные в воркере пула
+        total = 0.0
+        for stage, wall, cpu, size_in, size_out in timings:
+            self.add(stage, wall, cpu, size_in, size_out)
+            total += wall
+        with self.lock:
+            self.files[rel_path] = self.files.get(rel_path, 0.0) + total
+
+    def slowest(self, top: int = STATS_TOP_FILES):
+        import heapq
+
+        with self.lock:
+            return heapq.nlargest(top, self.files.items(), key=lambda item: item[1])
+
+    def merge(self, other: "MergeStats", files: bool = False):
+        for stage, (count, wall, cpu, size_in, size_out) in other.stages.items():
+            self.add(stage, wall, cpu, size_in, size_out, count)
+        if files:
+            with self.lock:
+                for rel_path, seconds in other.files.items():
+                    self.files[rel_path] = self.files.get(rel_path, 0.0) + seconds
+
+    # Статистика воркера пула возвращается в основной процесс, лок там создаётся заново
+    def __getstate__(self):
+        return self.stages, self.files
+
+    def __setstate__(self, state):
+        self.stages, self.files = state
+        self.lock = threading.Lock()
+
+    def as_dict(self, top: int = STATS_TOP_FILES) -> dict:
+        stages = {stage: {"items": count, "wall_seconds": round(wall, 6), "cpu_seconds": round(cpu, 6),
+                          "bytes_in": size_in, "bytes_out": size_out}
+                  for stage, (count, wall, cpu, size_in, size_out) in self.stages.items()}
+        return {"stages": stages,
+                "slowest_files": [{"path": path, "seconds": round(seconds, 6)} for path, seconds in self.slowest(top)]}
+
+    def report(self, top: int = STATS_TOP_FILES) -> str:
+        lines = [f"{'stage':<18}{'items':>9}{'wall s':>10}{'cpu s':>10}{'in MB':>10}{'out MB':>10}"]
+        for stage, (count, wall, cpu, size_in, size_out) in self.stages.items():
+            lines.append(f"{stage:<18}{count:>9}{wall:>10.3f}{cpu:>10.3f}"
+                         f"{size_in / (1024 * 1024):>10.2f}{size_out / (1024 * 1024):>10.2f}")
+        slowest = self.slowest(top)
+        if slowest:
+            lines.append(f"Slowest {len(slowest)} files (all stages):")
+            lines.extend(f"  {seconds:>8.4f}  {path}" for path, seconds in slowest)
+        # Потоки сканирования и процессы --jobs работают одновременно, их время по этапу суммируется
+        lines.append("Wall time is summed over scan threads and --jobs processes.")
+        return "\n".join(lines)
+
+
+_gitignore_cache = {}
+
+
+def _file_stamp(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _ignore_class(pattern: str, start: int):
+    # [abc], [!a-z], []x] -> (класс регулярки, индекс после "]") или None, если класс не закрыт.
+    # Класс в gitignore никогда не совпадает с "/"
+    i = start + 1
+    negate = i < len(pattern) and pattern[i] in '!^'
+    if negate:
+        i += 1
+    body = []
+    if i < len(pattern) and pattern[i] == ']':
+        body.append('\\]')
+        i += 1
+    while i < len(pattern) and pattern[i] != ']':
+        if pattern[i] == '\\' and i + 1 < len(pattern):
+            i += 1
+        body.append('-' if pattern[i] == '-' else re.escape(pattern[i]))
+        i += 1
+    if i >= len(pattern):
+        return None
+    return f"(?!/)[{'^' if negate else ''}{''.join(body)}]", i + 1
+
+
+def _translate_ignore_line(line: str):
+    # Строка .gitignore -> (регулярка, отрицание, только для папок) или None для пустых строк и комментариев.
+    # Регулярка проверяет сам путь, без потомков: содержимое игнорируемой папки отсекает обход, а
+    # отрицание "!dir/" возвращает только саму папку, как в git
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    stripped = line.rstrip(' ')
+    if stripped != line and stripped.endswith('\\') and not stripped.endswith('\\\\'):
+        stripped += ' '
+    line = stripped
+    negate = line.startswith('!')
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # Шаблон со слешем в начале или середине привязан к папке .gitignore, без слеша - ищется на любой глубине
+    anchored = '/' in line
+    line = line.lstrip('/')
+    out = []
+    i, n = 0, len(line)
+    while i < n:
+        c = line[i]
+        if line.startswith('**', i) and (i == 0 or line[i - 1] == '/') and (i + 2 == n or line[i + 2] == '/'):
+            # "**" целым сегментом: в конце - всё внутри, в начале и середине - ноль или больше папок
+            if i + 2 == n:
+                out.append('.*')
+                break
+            out.append('(?:.*/)?')
+            i += 3
+            continue
+        if c == '*':
+            while i + 1 < n and line[i + 1] == '*':
+                i += 1
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            bracket = _ignore_class(line, i)
+            if bracket is None:
+                out.append('\\[')
+            else:
+                out.append(bracket[0])
+                i = bracket[1]
+                continue
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(line[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return re.compile(f"{prefix}{''.join(out)}", re.DOTALL).fullmatch, negate, dir_only
+
+
+def _load_ignore_spec(path: str):
+    # Правила файла в обратном порядке: побеждает последнее совпавшее, поэтому проверка идёт с конца
+    stamp = _file_stamp(path)
+    if stamp is None:
+        return None
+    cached = _gitignore_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = [rule for rule in map(_translate_ignore_line, f) if rule is not None]
+    except (OSError, UnicodeDecodeError, re.error) as e:
+        print(f"[WARN] Ошибка чтения {path}: {e}")
+        rules = None
+    spec = tuple(reversed(rules)) if rules else None
+    _gitignore_cache[path] = (stamp, spec)
+    return spec
+
+
+class GitignoreMatcher:
+    __slots__ = ("parent", "spec", "base", "prefix", "source")
+
+    def __init__(self, parent=None, spec=None, base: str = "", prefix: str = "", source: str | None = None):
+        self.parent = parent
+        self.spec = spec
+        # base - директория правила относительно корня проекта,
+        # prefix - путь корня проекта относительно правила (для .gitignore выше корня)
+        self.base = base
+        self.prefix = prefix
+        self.source = source
+
+    def extend(self, source: str, base: str = "", prefix: str = ""):
+        spec = _load_ignore_spec(source)
+        if spec is None:
+            return self
+        return GitignoreMatcher(self, spec, base, prefix, source)
+
+    def for_directory(self, dir_path: str, rel_dir: str):
+        return self.extend(os.path.join(dir_path, '.gitignore'), base=rel_dir)
+
+    def sources(self):
+        level, result = self, []
+        while level is not None:
+            if level.source:
+                result.append(level.source)
+            level = level.parent
+        return result
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        # Правила переведены в регулярки со слешами, а пути и base склеены через os.sep
+        if os.sep != '/':
+            rel_path = rel_path.replace(os.sep, '/')
+        level = self
+        while level is not None:
+            if level.spec is not None:
+                local = rel_path[len(level.base) + 1:] if level.base else rel_path
+                if level.prefix:
+                    local = level.prefix + local
+                # Побеждает самое глубокое правило, а внутри файла - последнее совпавшее
+                for match, negate, dir_only in level.spec:
+                    if (is_dir or not dir_only) and match(local):
+                        return not negate
+            level = level.parent
+        return False
+
+
+def _find_git_dir(path: Path):
+    for candidate in (path, *path.parents):
+        dot_git = candidate / '.git'
+        if dot_git.is_dir():
+            return candidate, dot_git
+        if dot_git.is_file():
+            try:
+                line = dot_git.read_text(encoding='utf-8').strip()
+            except OSError:
+                return candidate, None
+            if line.startswith('gitdir:'):
+                return candidate, (candidate / line[len('gitdir:'):].strip()).resolve()
+            return candidate, None
+    return None, None
+
+
+def load_gitignore_rules(project_root: Path) -> GitignoreMatcher:
+    matcher = GitignoreMatcher()
+    repo_root, git_dir = _find_git_dir(project_root)
+    if repo_root is None:
+        return matcher
+
+    def prefix_for(directory: Path):
+        rel = project_root.relative_to(directory).as_posix()
+        return "" if rel == "." else rel + "/"
+
+    if git_dir is not None:
+        matcher = matcher.extend(str(git_dir / 'info' / 'exclude'), prefix=prefix_for(repo_root))
+    # .gitignore от корня репозитория до родителя проекта; свой .gitignore корень подхватит при обходе
+    if repo_root != project_root:
+        for directory in reversed(project_root.parents):
+            if directory != repo_root and repo_root not in directory.parents:
+                continue
+            matcher = matcher.extend(str(directory / '.gitignore'), prefix=prefix_for(directory))
+    return matcher
+
+
+def gitignore_for_directory(project_root: Path, rel_dir: str, gitignore: GitignoreMatcher | None):
+    # Цепочка правил для папки внутри проекта: корень и все промежуточные .gitignore, как при полном обходе
+    if gitignore is None or not rel_dir:
+        return gitignore
+    parts = Path(rel_dir).parts
+    for i in range(len(parts)):
+        ancestor_rel = os.path.join(*parts[:i]) if i else ""
+        gitignore = gitignore.for_directory(os.path.join(project_root, ancestor_rel), ancestor_rel)
+    return gitignore
+
+
+def _dir_key(path: str):
+    st = os.stat(path)
+    return st.st_dev, st.st_ino
+
+
+class ScanIndex:
+    # Меняется вместе с семантикой сопоставления .gitignore: старые листинги собраны по другим правилам
+    VERSION = 2
+
+    def __init__(self, project_root: Path, fingerprint: str):
+        self.path = CACHE_DIR / "scan_index" / f"{hashlib.sha1(str(project_root).encode('utf-8')).hexdigest()}.json"
+        self.fingerprint = fingerprint
+        self.old_dirs = {}
+        self.dirs = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, project_root: Path, gitignore: GitignoreMatcher | None, matcher: ExclusionMatcher):
+        # Смена исключений, use_gitignore или корневых правил git делает весь индекс недействительным
+        parts = [str(cls.VERSION), matcher.signature, str(gitignore is not None)]
+        if gitignore is not None:
+            parts.extend(f"{src}:{_file_stamp(src)}" for src in gitignore.sources())
+        index = cls(project_root, hashlib.sha1("\n".join(parts).encode('utf-8')).hexdigest())
+        try:
+            data = json.loads(index.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return index
+        # Чужой или испорченный файл (не тот формат) считается пустым индексом
+        if isinstance(data, dict) and data.get("fingerprint") == index.fingerprint and isinstance(data.get("dirs"), dict):
+            index.old_dirs = data["dirs"]
+        return index
+
+    def lookup(self, rel_dir: str, mtime_ns: int):
+        record = self.old_dirs.get(rel_dir)
+        if record is None or record["mtime"] != mtime_ns:
+            return None
+        return record
+
+    def store(self, rel_dir: str, record: dict, hit: bool):
+        with self._lock:
+            self.dirs[rel_dir] = record
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self):
+        # Перезаписываем, только если что-то поменялось (пропавшие каталоги тоже считаются)
+        if not self.misses and len(self.dirs) == len(self.old_dirs):
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"fingerprint": self.fingerprint, "dirs": self.dirs}), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[WARN] Не удалось сохранить индекс сканирования: {e}")
+
+
+class _ScanContext(NamedTuple):
+    matcher: ExclusionMatcher
+    index: ScanIndex | None
+    stats: MergeStats | None = None
+
+
+def _list_directory(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+                    dirty: bool = False):
+    stats = ctx.stats
+    started = _clock() if stats is not None else None
+    index = ctx.index
+    if index is not None:
+        mtime_ns = os.stat(dir_path).st_mtime_ns
+        record = None if dirty else index.lookup(rel_dir, mtime_ns)
+        # Правка содержимого .gitignore не меняет mtime папки, поэтому его штамп проверяется отдельно
+        if record is not None and record["gi"] is not None:
+            gi_stamp = _file_stamp(os.path.join(dir_path, '.gitignore'))
+            if gi_stamp is None or list(gi_stamp) != record["gi"]:
+                record = None
+        if record is not None:
+            if gitignore is not None and record["gi"] is not None:
+                gitignore = gitignore.for_directory(dir_path, rel_dir)
+            index.store(rel_dir, record, hit=True)
+            entries = []
+            for name, is_file, dir_key in record["entries"]:
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                entries.append((is_file, name, rel_path, os.path.join(dir_path, name), tuple(dir_key) if dir_key else None))
+            if started is not None:
+                stats.stop("walk", started, count=len(entries))
+            return entries, gitignore, False
+
+    with os.scandir(dir_path) as it:
+        scanned = list(it)
+
+    gi_stamp = None
+    if gitignore is not None and any(entry.name == '.gitignore' for entry in scanned):
+        gitignore = gitignore.for_directory(dir_path, rel_dir)
+        gi_stamp = _file_stamp(os.path.join(dir_path, '.gitignore'))
+
+    is_ignored = None
+    if gitignore is not None:
+        is_ignored = gitignore.is_ignored
+        if started is not None:
+            gi_time = [0.0, 0.0, 0]
+            is_ignored = _timed_matcher(is_ignored, gi_time)
+
+    entries = []
+    for entry in scanned:
+        name = entry.name
+        if name == exclusions_file.name:
+            continue
+
+        # DirEntry кэширует тип из readdir(), лишний stat нужен только для симлинков
+        is_file = entry.is_file()
+        if ctx.matcher.excludes(name, is_file):
+            continue
+        if name in SCRIPT_NAMES and os.path.realpath(entry.path) in SCRIPT_PATHS:
+            continue
+
+        is_dir = not is_file and entry.is_dir()
+        rel_path = os.path.join(rel_dir, name) if rel_dir else name
+        # Игнорируемая директория отбрасывается здесь и в обход уже не попадает
+        if is_ignored is not None and is_ignored(rel_path, is_dir):
+            continue
+
+        dir_key = None
+        if is_dir:
+            try:
+                dir_key = _dir_key(entry.path)
+            except OSError:
+                continue
+        entries.append((is_file, name, rel_path, entry.path, dir_key))
+
+    entries.sort(key=lambda e: (e[0], e[1].lower()))
+
+    if index is not None:
+        old = index.old_dirs.get(rel_dir)
+        # Поменялись правила этой папки -> листинги всех потомков тоже надо пересобрать
+        dirty = dirty or old is None or old["gi"] != (list(gi_stamp) if gi_stamp else None)
+        index.store(rel_dir, {
+            "mtime": mtime_ns,
+            "gi": list(gi_stamp) if gi_stamp else None,
+            "entries": [[name, is_file, dir_key] for is_file, name, _, _, dir_key in entries],
+        }, hit=False)
+    if started is not None:
+        # Сопоставление с .gitignore - отдельный этап, в обход идёт остальное время листинга
+        wall, cpu = _elapsed(started)
+        if is_ignored is not None:
+            stats.add("gitignore", gi_time[0], gi_time[1], count=gi_time[2])
+            wall, cpu = wall - gi_time[0], cpu - gi_time[1]
+        stats.add("walk", wall, cpu, count=len(scanned))
+    return entries, gitignore, dirty
+
+
+def _timed_matcher(is_ignored, totals):
+    def timed(rel_path: str, is_dir: bool) -> bool:
+        started = _clock()
+        result = is_ignored(rel_path, is_dir)
+        wall, cpu = _elapsed(started)
+        totals[0] += wall
+        totals[1] += cpu
+        totals[2] += 1
+        return result
+    return timed
+
+
+def _safe_list_directory(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+                         dirty: bool = False):
+    try:
+        return _list_directory(dir_path, rel_dir, gitignore, ctx, dirty)
+    except OSError:
+        return [], gitignore, dirty
+
+
+def _has_files(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+               ancestors: frozenset) -> bool:
+    # Есть ли в папке хоть один файл, прошедший фильтры; обход обрывается на первом найденном
+    entries, gitignore, _ = _safe_list_directory(dir_path, rel_dir, gitignore, ctx)
+    if any(is_file for is_file, *_ in entries):
+        return True
+    return any(_has_files(abs_path, rel_path, gitignore, ctx, ancestors | {dir_key})
+               for _, _, rel_path, abs_path, dir_key in entries if dir_key is not None and dir_key not in ancestors)
+
+
+def _walk_tree(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+               ancestors: frozenset, dirty: bool = False, depth: int | None = None):
+    tree = []
+    entries, gitignore, dirty = _safe_list_directory(dir_path, rel_dir, gitignore, ctx, dirty)
+    for _, name, rel_path, abs_path, dir_key in entries:
+        entry = {"name": name, "path": rel_path}
+        if dir_key is not None:
+            # Симлинк на одного из предков -> цикл, дальше не идём
+            if dir_key in ancestors:
+                continue
+            entry["type"] = "dir"
+            if depth is not None and depth <= 1:
+                # Граница глубины: содержимое подгрузится по запросу, а пустые папки скрываются, как и при полном обходе
+                if _has_files(abs_path, rel_path, gitignore, ctx, ancestors | {dir_key}):
+                    entry["lazy"] = True
+                    tree.append(entry)
+                continue
+            children = _walk_tree(abs_path, rel_path, gitignore, ctx, ancestors | {dir_key}, dirty,
+                                  None if depth is None else depth - 1)
+            if children:
+                entry["children"] = children
+                tree.append(entry)
+        else:
+            entry["type"] = "file"
+            tree.append(entry)
+    return tree
+
+
+def _iter_listings(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+                   ancestors: frozenset, dirty: bool = False, depth: int | None = None):
+    # Отдаёт (rel_dir, записи, папки на границе глубины, в которых есть файлы)
+    entries, gitignore, dirty = _safe_list_directory(dir_path, rel_dir, gitignore, ctx, dirty)
+    subdirs = [(name, rel_path, abs_path, dir_key) for _, name, rel_path, abs_path, dir_key in entries
+               if dir_key is not None and dir_key not in ancestors]
+    if depth is not None and depth <= 1:
+        lazy = [(name, rel_path) for name, rel_path, abs_path, dir_key in subdirs
+                if _has_files(abs_path, rel_path, gitignore, ctx, ancestors | {dir_key})]
+        yield rel_dir, entries, lazy
+        return
+    yield rel_dir, entries, []
+    for _, rel_path, abs_path, dir_key in subdirs:
+        yield from _iter_listings(abs_path, rel_path, gitignore, ctx, ancestors | {dir_key}, dirty,
+                                  None if depth is None else depth - 1)
+
+
+def _iter_listings_parallel(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+                            ancestors: frozenset, workers: int):
+    # Листинги отдаются по мере готовности, порядок зависит от того, кто первым закончил
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        pending = {pool.submit(_safe_list_directory, dir_path, rel_dir, gitignore, ctx): (rel_dir, ancestors)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel, chain = pending.pop(future)
+                entries, dir_gitignore, dirty = future.result()
+                for _, _, rel_path, abs_path, dir_key in entries:
+                    if dir_key is not None and dir_key not in chain:
+                        job = pool.submit(_safe_list_directory, abs_path, rel_path, dir_gitignore, ctx, dirty)
+                        pending[job] = (rel_path, chain | {dir_key})
+                yield rel, entries, []
+    finally:
+        # Клиент потокового скана мог отключиться - недошедшие листинги не нужны
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _walk_tree_parallel(dir_path: str, rel_dir: str, gitignore: GitignoreMatcher | None, ctx: _ScanContext,
+                        ancestors: frozenset, workers: int):
+    listings = {rel: entries for rel, entries, _ in _iter_listings_parallel(dir_path, rel_dir, gitignore, ctx,
+                                                                            ancestors, workers)}
+
+    # Сборка идёт по отсортированным листингам, поэтому порядок не зависит от того, кто первым закончил
+    def assemble(rel):
+        tree = []
+        for _, name, rel_path, _, dir_key in listings.get(rel, ()):
+            entry = {"name": name, "path": rel_path}
+            if dir_key is not None:
+                entry["type"] = "dir"
+                children = assemble(rel_path) if rel_path in listings else []
+                if children:
+                    entry["children"] = children
+                    tree.append(entry)
+            else:
+                entry["type"] = "file"
+                tree.append(entry)
+        return tree
+
+    return assemble(rel_dir)
+
+
+def build_file_tree(dir_path: Path, project_root: Path, gitignore: GitignoreMatcher | None, workers: int = 1,
+                    matcher: ExclusionMatcher | None = None, index: ScanIndex | None = None, depth: int | None = None,
+                    stats: MergeStats | None = None):
+    # Матчер берётся один раз: POST /exclusions посреди обхода его не подменит
+    ctx = _ScanContext(matcher=matcher or get_exclusion_matcher(), index=index, stats=stats)
+    rel_dir = os.path.relpath(dir_path, project_root)
+    if rel_dir == os.curdir:
+        rel_dir = ""
+    try:
+        root_key = _dir_key(str(dir_path))
+    except OSError:
+        return []
+    if depth is not None:
+        # Частичный обход последовательный: на один уровень пул потоков не окупается
+        tree = _walk_tree(str(dir_path), rel_dir, gitignore, ctx, frozenset({root_key}), depth=depth)
+    elif workers > 1:
+        tree = _walk_tree_parallel(str(dir_path), rel_dir, gitignore, ctx, frozenset({root_key}), workers)
+    else:
+        tree = _walk_tree(str(dir_path), rel_dir, gitignore, ctx, frozenset({root_key}))
+    if index is not None:
+        index.save()
+    return tree
+
+
+def iter_file_listings(dir_path: Path, project_root: Path, gitignore: GitignoreMatcher | None, workers: int = 1,
+                       matcher: ExclusionMatcher | None = None, index: ScanIndex | None = None,
+                       depth: int | None = None, stats: MergeStats | None = None):
+    # Те же файлы, что и в build_file_tree, но по папкам и по ходу обхода: (rel_dir, [(имя, путь)], [ленивые папки]).
+    # Папки без файлов не отдаются, их предков клиент достраивает сам - как и пустые ветки в дереве
+    ctx = _ScanContext(matcher=matcher or get_exclusion_matcher(), index=index, stats=stats)
+    rel_dir = os.path.relpath(dir_path, project_root)
+    if rel_dir == os.curdir:
+        rel_dir = ""
+    try:
+        root_key = _dir_key(str(dir_path))
+    except OSError:
+        return
+    if depth is not None:
+        listings = _iter_listings(str(dir_path), rel_dir, gitignore, ctx, frozenset({root_key}), depth=depth)
+    elif workers > 1:
+        listings = _iter_listings_parallel(str(dir_path), rel_dir, gitignore, ctx, frozenset({root_key}), workers)
+    else:
+        listings = _iter_listings(str(dir_path), rel_dir, gitignore, ctx, frozenset({root_key}))
+    for rel, entries, lazy in listings:
+        files = [(name, rel_path) for is_file, name, rel_path, _, _ in entries if is_file]
+        if files or lazy:
+            yield rel, files, lazy
+    if index is not None:
+        index.save()
+
+
+def group_paths_by_directory(paths):
+    listings = {}
+    for rel_path in sorted(paths):
+        rel_dir, name = os.path.split(rel_path)
+        listings.setdefault(rel_dir, []).append((name, rel_path))
+    return ((rel_dir, files, []) for rel_dir, files in listings.items())
+
+
+def normalize_rel_dir(rel_dir: str):
+    # Только папки внутри проекта и только относительным путём без '..'
+    rel_parts = Path(rel_dir).parts
+    if Path(rel_dir).is_absolute() or '..' in rel_parts:
+        return None
+    return os.path.join(*rel_parts) if rel_parts else ""
+
+
+def expand_lazy_dirs(project_root: Path, rel_dirs, gitignore: GitignoreMatcher | None,
+                     matcher: ExclusionMatcher | None = None):
+    # Отмеченные, но не раскрытые в интерфейсе папки: их файлы собираются тем же обходом, что и при полном скане
+    files = []
+    for rel_dir in rel_dirs:
+        rel_dir = normalize_rel_dir(rel_dir)
+        if rel_dir is None:
+            raise ValueError("Путь должен быть относительным и лежать внутри проекта")
+        dir_path = project_root / rel_dir
+        if not dir_path.is_dir():
+            continue
+        tree = build_file_tree(dir_path, project_root, gitignore_for_directory(project_root, rel_dir, gitignore),
+                               matcher=matcher)
+        files.extend(flatten_file_tree(tree))
+    return files
+
+
+TREE_TYPE_CODES = {"file": "f", "dir": "d"}
+
+
+def encode_tree_columnar(tree) -> dict:
+    # Плоские колонки вместо вложенных объектов: имя, индекс родителя (-1 - корень) и тип одной буквой
+    # (f - файл, d - папка, l - ленивая папка, b - двоичный файл). Путь клиент собирает сам по цепочке родителей.
+    # Кодировки не-UTF-8 файлов - редкость, они идут отдельной картой индекс -> кодировка.
+    # Размеры файлов (есть после sniff_tree) - колонка sizes, у папок null
+    names, parents, types, sizes = [], [], [], []
+    encodings = {}
+    stack = [(node, -1) for node in reversed(tree)]
+    while stack:
+        node, parent = stack.pop()
+        index = len(names)
+        names.append(node["name"])
+        parents.append(parent)
+        types.append("l" if node.get("lazy") else "b" if node.get("binary") else TREE_TYPE_CODES[node["type"]])
+        sizes.append(node.get("size"))
+        if "encoding" in node:
+            encodings[index] = node["encoding"]
+        stack.extend((child, index) for child in reversed(node.get("children", ())))
+    # base - папка, внутри которой лежат корневые узлы (у /tree/children это не корень проекта)
+    base = os.path.dirname(tree[0]["path"]) if tree else ""
+    payload = {"encoding": "columnar", "sep": os.sep, "base": base, "names": names, "parents": parents,
+               "types": "".join(types)}
+    if encodings:
+        payload["encodings"] = encodings
+    if any(size is not None for size in sizes):
+        payload["sizes"] = sizes
+    return payload
+
+
+def decode_tree_columnar(payload: dict):
+    sep = payload["sep"]
+    prefix = payload["base"] + sep if payload["base"] else ""
+    encodings = {int(index): encoding for index, encoding in payload.get("encodings", {}).items()}
+    sizes = payload.get("sizes") or [None] * len(payload["names"])
+    roots = []
+    nodes = []
+    for name, parent, code, size in zip(payload["names"], payload["parents"], payload["types"], sizes):
+        node = {"name": name}
+        if parent < 0:
+            node["path"] = prefix + name
+            roots.append(node)
+        else:
+            owner = nodes[parent]
+            node["path"] = owner["path"] + sep + name
+            owner.setdefault("children", []).append(node)
+        node["type"] = "file" if code in "fb" else "dir"
+        if code == "l":
+            node["lazy"] = True
+        elif code == "b":
+            node["binary"] = True
+        if len(nodes) in encodings:
+            node["encoding"] = encodings[len(nodes)]
+        if size is not None:
+            node["size"] = size
+        nodes.append(node)
+    return roots
+
+
+def build_tree_from_paths(paths):
+    root = {}
+    for rel_path in paths:
+        parts = rel_path.split(os.sep)
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = None
+
+    def convert(node, rel_dir):
+        tree = []
+        for name in sorted(node, key=lambda n: (node[n] is None, n.lower())):
+            rel_path = os.path.join(rel_dir, name) if rel_dir else name
+            entry = {"name": name, "path": rel_path}
+            if node[name] is None:
+                entry["type"] = "file"
+            else:
+                entry["type"] = "dir"
+                entry["children"] = convert(node[name], rel_path)
+            tree.append(entry)
+        return tree
+
+    return convert(root, "")
+
+
+def _git_ls_files(project_root: Path, *args):
+    import subprocess
+
+    result = subprocess.run(["git", "-C", str(project_root), "ls-files", "-z", *args],
+                            capture_output=True, check=True)
+    return [p for p in result.stdout.decode('utf-8', errors='surrogateescape').split('\0') if p]
+
+
+def list_git_files(project_root: Path, matcher: ExclusionMatcher | None = None):
+    import subprocess
+
+    matcher = matcher or get_exclusion_matcher()
+    try:
+        staged = _git_ls_files(project_root, "--stage")
+        deleted = set(_git_ls_files(project_root, "--deleted"))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    dir_verdicts = {}
+
+    def dir_excluded(rel_dir):
+        if not rel_dir:
+            return False
+        verdict = dir_verdicts.get(rel_dir)
+        if verdict is None:
+            parent, _, name = rel_dir.rpartition('/')
+            verdict = dir_excluded(parent) or name == exclusions_file.name or matcher.excludes(name, False)
+            dir_verdicts[rel_dir] = verdict
+        return verdict
+
+    files = []
+    seen = set()
+    for line in staged:
+        meta, _, rel_path = line.partition('\t')
+        mode = meta.split(' ', 1)[0]
+        # Сабмодули (160000) и дубли при конфликтах слияния (stage 1-3) пропускаем
+        if mode == '160000' or rel_path in seen or rel_path in deleted:
+            continue
+        seen.add(rel_path)
+        rel_dir, _, name = rel_path.rpartition('/')
+        if name == exclusions_file.name or matcher.excludes(name, True) or dir_excluded(rel_dir):
+            continue
+        abs_path = project_root / rel_path
+        if name in SCRIPT_NAMES and str(abs_path.resolve()) in SCRIPT_PATHS:
+            continue
+        if mode == '120000' and not abs_path.is_file():
+            continue
+        files.append(rel_path.replace('/', os.sep))
+    return files
+
+
+def build_git_file_tree(project_root: Path, matcher: ExclusionMatcher | None = None):
+    files = list_git_files(project_root, matcher)
+    if files is None:
+        return None
+    return build_tree_from_paths(files)
+
+
+def flatten_file_tree(tree_nodes):
+    paths = []
+    for node in tree_nodes:
+        if node['type'] == 'file':
+            paths.append(node['path'])
+        elif node['type'] == 'dir' and 'children' in node:
+            paths.extend(flatten_file_tree(node['children']))
+    return paths
+
+
+SNIFF_SIZE = 8192
+# UTF-32 раньше UTF-16: BOM UTF-32 LE начинается с BOM UTF-16 LE
+_BOMS = ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"), (codecs.BOM_UTF8, "utf-8"),
+         (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+# Управляющие байты, которых в тексте не бывает (таб, переводы строк, \f, \b и ESC - бывают)
+_BINARY_CONTROL = bytes(set(range(32)) - {8, 9, 10, 12, 13, 27})
+_CYRILLIC_RUN = re.compile(rb'[\xc0-\xff]{3}')
+
+
+class BinaryFileError(Exception):
+    pass
+
+
+def _utf16_without_bom(prefix: bytes):
+    # Латиница в UTF-16 без BOM: нули стоят строго в одной половине байтов и их много
+    half = len(prefix) // 2
+    even, odd = prefix[0::2].count(0), prefix[1::2].count(0)
+    if even == 0 and odd > half // 2:
+        encoding = "utf-16-le"
+    elif odd == 0 and even > half // 2:
+        encoding = "utf-16-be"
+    else:
+        return None
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(prefix)
+    except UnicodeDecodeError:
+        return None
+    return encoding
+
+
+def sniff_encoding(prefix: bytes):
+    # Кодировка по первым SNIFF_SIZE байтам; None - двоичный файл
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if b"\0" in prefix:
+        return _utf16_without_bom(prefix)
+    if len(prefix) - len(prefix.translate(None, _BINARY_CONTROL)) > len(prefix) // 20:
+        return None
+    if prefix.isascii():
+        return "utf-8"
+    try:
+        # Префикс мог обрезать многобайтовый символ, поэтому без final
+        codecs.getincrementaldecoder("utf-8")().decode(prefix)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    # Однобайтовая кодировка: кириллица в cp1251 идёт сплошными словами из старших байтов,
+    # а акценты в cp1252 разбросаны по одному среди латиницы. latin-1 декодирует что угодно
+    for encoding in ("cp1251" if _CYRILLIC_RUN.search(prefix) else "cp1252", "latin-1"):
+        try:
+            prefix.decode(encoding)
+            return encoding
+        except UnicodeDecodeError:
+            pass
+
+
+def sniff_file(file_abs_path: str):
+    # (кодировка или None, размер в байтах): размер берётся с уже открытого дескриптора, почти бесплатно
+    try:
+        with open(file_abs_path, "rb") as src:
+            return sniff_encoding(src.read(SNIFF_SIZE)), os.fstat(src.fileno()).st_size
+    except OSError:
+        # Ошибку чтения покажет сама склейка
+        return "utf-8", None
+
+
+def _file_kind(encoding):
+    # Для дерева: "binary", имя кодировки или None для обычного UTF-8
+    if encoding is None:
+        return "binary"
+    return None if encoding == "utf-8" else encoding
+
+
+def sniff_paths(project_root: Path, rel_paths, mapper=map):
+    # (вид файла, размер) на каждый путь. mapper - map или pool.map: чтение префиксов упирается в диск,
+    # и потоки его распараллеливают
+    root = str(project_root)
+
+    def sniff(rel):
+        encoding, size = sniff_file(os.path.join(root, rel))
+        return _file_kind(encoding), size
+
+    return list(mapper(sniff, rel_paths))
+
+
+def _sniff_batched(project_root: Path, paths, workers: int = 1):
+    if workers > 1 and len(paths) > 1:
+        # Пачками по потоку: future на каждый файл дороже чтения префикса из тёплого кэша
+        from concurrent.futures import ThreadPoolExecutor
+
+        step = -(-len(paths) // workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            batches = pool.map(lambda batch: sniff_paths(project_root, batch),
+                               [paths[i:i + step] for i in range(0, len(paths), step)])
+            return [kind for batch in batches for kind in batch]
+    return sniff_paths(project_root, paths)
+
+
+def drop_binary_files(project_root: Path, rel_paths, workers: int = 1):
+    # Файлы папок, отмеченных целиком: двоичные интерфейс не отмечает и поштучно не шлёт, здесь они отсеиваются так же
+    kinds = _sniff_batched(project_root, rel_paths, workers)
+    return [rel_path for rel_path, (kind, _) in zip(rel_paths, kinds) if kind != "binary"]
+
+
+def sniff_tree(project_root: Path, tree, workers: int = 1):
+    # Помечает узлы файлов: "size" в байтах и "binary": true или "encoding": "cp1251"; у UTF-8 кодировки нет
+    nodes = []
+    stack = list(tree)
+    while stack:
+        node = stack.pop()
+        if node["type"] == "file":
+            nodes.append(node)
+        else:
+            stack.extend(node.get("children", ()))
+    kinds = _sniff_batched(project_root, [node["path"] for node in nodes], workers)
+    for node, (kind, size) in zip(nodes, kinds):
+        if size is not None:
+            node["size"] = size
+        if kind == "binary":
+            node["binary"] = True
+        elif kind is not None:
+            node["encoding"] = kind
+    return tree
+
+
+_PATHSPEC_GROUP = re.compile(r'\(\?P<\w+>')
+
+
+def _compile_pathspec(patterns):
+    if not patterns:
+        return None
+    import pathspec
+    spec = pathspec.PathSpec.from_lines('gitwildmatch', patterns)
+    active = [p for p in spec.patterns if p.include is not None]
+    if not active:
+        return None
+    if any(not p.include for p in active):
+        # С отрицаниями (!шаблон) важен порядок строк, проверку оставляем pathspec
+        return spec.match_file
+    # Без отрицаний хватает одного регулярного выражения на все шаблоны (именованные группы повторяются)
+    return re.compile("|".join(_PATHSPEC_GROUP.sub('(?:', p.regex.pattern) for p in active)).match
+
+
+class PathSelection(NamedTuple):
+    include: object
+    exclude: object
+
+    def matches(self, rel_path: str) -> bool:
+        if os.sep != '/':
+            rel_path = rel_path.replace(os.sep, '/')
+        if self.include and not self.include(rel_path):
+            return False
+        return not (self.exclude and self.exclude(rel_path))
+
+
+def compile_selection(include=(), exclude=()) -> PathSelection | None:
+    # Шаблоны в синтаксисе .gitignore относительно корня проекта: "/src/", "*.py", "**/tests/"
+    include = [p for p in include if p]
+    exclude = [p for p in exclude if p]
+    if not include and not exclude:
+        return None
+    return PathSelection(include=_compile_pathspec(include), exclude=_compile_pathspec(exclude))
+
+
+def select_files(files, selection: PathSelection):
+    return [rel_path for rel_path in files if selection.matches(rel_path)]
+
+
+_PATHSPEC_SPECIAL = re.compile(r'([\\*?\[\] !#])')
+
+
+def literal_pattern(rel_path: str, is_dir: bool = False) -> str:
+    # Путь из дерева как шаблон: от корня проекта, спецсимволы экранированы
+    pattern = '/' + _PATHSPEC_SPECIAL.sub(r'\\\1', rel_path.replace(os.sep, '/'))
+    return pattern + '/' if is_dir else pattern
+
+
+SCAN_RESULTS_LIMIT = 8
+scan_results = {}
+scan_results_lock = threading.Lock()
+
+
+def _scan_key(project_path: Path, source: str, use_gitignore: bool, matcher: ExclusionMatcher):
+    return str(project_path), source, bool(use_gitignore) or source == 'git', matcher.signature
+
+
+def remember_scan(project_path: Path, source: str, use_gitignore: bool, matcher: ExclusionMatcher, files):
+    # files=None - скан был неполным (depth), старый список больше не отражает диск
+    key = _scan_key(project_path, source, use_gitignore, matcher)
+    with scan_results_lock:
+        scan_results.pop(key, None)
+        if files is not None:
+            scan_results[key] = files
+            while len(scan_results) > SCAN_RESULTS_LIMIT:
+                del scan_results[next(iter(scan_results))]
+
+
+def cached_scan(project_path: Path, source: str, use_gitignore: bool, matcher: ExclusionMatcher):
+    with scan_results_lock:
+        return scan_results.get(_scan_key(project_path, source, use_gitignore, matcher))
+
+
+def scan_file_list(project_path: Path, source: str, use_gitignore: bool, matcher: ExclusionMatcher):
+    # Последний полный скан проекта: выбор по шаблонам отбирает файлы из него, не обходя диск заново
+    if source == 'git':
+        files = cached_scan(project_path, 'git', use_gitignore, matcher)
+        if files is None:
+            files = list_git_files(project_path, matcher)
+            if files is not None:
+                remember_scan(project_path, 'git', use_gitignore, matcher, files)
+        if files is not None:
+            return files
+    files = cached_scan(project_path, 'fs', use_gitignore, matcher)
+    if files is None:
+        gitignore = load_gitignore_rules(project_path) if use_gitignore else None
+        files = flatten_file_tree(build_file_tree(project_path, project_path, gitignore, matcher=matcher))
+        remember_scan(project_path, 'fs', use_gitignore, matcher, files)
+    return files
+
+class MergeDelta(NamedTuple):
+    added: list
+    changed: list
+    deleted: list
+    baseline: str
+
+    def marks(self):
+        marks = dict.fromkeys(self.added, "[+]")
+        marks.update(dict.fromkeys(self.changed, "[*]"))
+        marks.update(dict.fromkeys(self.deleted, "[-]"))
+        return marks
+
+
+MANIFEST_VERSION = 1
+
+
+def _hash_file(abs_path: str) -> str:
+    digest = hashlib.sha1()
+    with open(abs_path, "rb") as src:
+        for block in iter(lambda: src.read(MERGE_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    # Нет манифеста (первый запуск) -> пустая база, всё попадёт в дельту как новое
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def build_manifest(project_path: Path, files, previous: dict | None = None) -> dict:
+    previous = previous or {}
+    manifest = {}
+    for rel in files:
+        abs_path = os.path.join(project_path, rel)
+        try:
+            st = os.stat(abs_path)
+            old = previous.get(rel)
+            # Тот же размер и mtime -> хэш берём из прошлого манифеста, файл не читаем
+            if old and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                digest = old[2]
+            else:
+                digest = _hash_file(abs_path)
+        except OSError:
+            continue
+        manifest[rel] = [st.st_size, st.st_mtime_ns, digest]
+    return manifest
+
+
+def save_manifest(manifest_path: Path, manifest: dict):
+    tmp = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": MANIFEST_VERSION, "files": manifest}), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+
+
+def project_manifest_path(project_root: Path) -> Path:
+    # Манифест веб-API живёт в кэше сервера: путь от клиента означал бы запись в любой файл
+    return CACHE_DIR / "manifests" / f"{hashlib.sha1(str(project_root).encode('utf-8')).hexdigest()}.json"
+
+
+def manifest_delta(old: dict, new: dict, baseline: str) -> MergeDelta:
+    added = sorted(rel for rel in new if rel not in old)
+    changed = sorted(rel for rel in new if rel in old and old[rel][2] != new[rel][2])
+    deleted = sorted(rel for rel in old if rel not in new)
+    return MergeDelta(added, changed, deleted, baseline)
+
+
+def _path_excluded(rel_path: str, matcher: ExclusionMatcher) -> bool:
+    *dirs, name = rel_path.split('/')
+    return (name == exclusions_file.name or matcher.excludes(name, True)
+            or any(matcher.excludes(part, False) for part in dirs))
+
+
+def git_delta(project_root: Path, revision: str, files, matcher: ExclusionMatcher | None = None) -> MergeDelta:
+    import subprocess
+
+    matcher = matcher or get_exclusion_matcher()
+    git = ["git", "-C", str(project_root)]
+    try:
+        subprocess.run(git + ["rev-parse", "--verify", "--quiet", f"{revision}^{{commit}}"],
+                       capture_output=True, check=True)
+        # --relative: пути относительно папки проекта, файлы вне неё не попадают
+        diff = subprocess.run(git + ["diff", "--relative", "--no-renames", "--name-status", "-z", revision, "--"],
+                              capture_output=True, check=True)
+        untracked = _git_ls_files(project_root, "--others", "--exclude-standard")
+    except OSError as e:
+        raise ValueError(f"git недоступен: {e}") from None
+    except subprocess.CalledProcessError:
+        raise ValueError(f"Не удалось сравнить с ревизией git '{revision}'") from None
+
+    # Дельта ограничена текущим списком файлов, так что исключения и .gitignore продолжают работать
+    current = {rel.replace(os.sep, '/'): rel for rel in files}
+    added, changed, deleted = set(), set(), set()
+    fields = diff.stdout.decode('utf-8', errors='surrogateescape').split('\0')
+    for status, rel_path in zip(fields[0::2], fields[1::2]):
+        if status == 'D':
+            if rel_path not in current and not _path_excluded(rel_path, matcher):
+                deleted.add(rel_path.replace('/', os.sep))
+        elif rel_path in current:
+            (added if status == 'A' else changed).add(current[rel_path])
+    added.update(current[rel_path] for rel_path in untracked if rel_path in current)
+    return MergeDelta(sorted(added), sorted(changed), sorted(deleted), f"git {revision}")
+
+
+LANG_MAP = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.mjs': 'javascript',
+    '.ts': 'typescript',
+    '.tsx': 'tsx',
+    '.jsx': 'jsx',
+    '.rb': 'ruby',
+    '.java': 'java',
+    '.cs': 'csharp',
+    '.php': 'php',
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.h': 'c',
+    '.hpp': 'cpp',
+    '.go': 'go',
+    '.rs': 'rust',
+    '.kt': 'kotlin',
+    '.kts': 'kotlin',
+    '.swift': 'swift',
+    '.html': 'html',
+    '.css': 'css',
+    '.scss': 'scss',
+    '.sass': 'sass',
+    '.xml': 'xml',
+    '.json': 'json',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+    '.md': 'markdown',
+    '.sh': 'shell',
+    '.bat': 'batch',
+    '.ps1': 'powershell',
+    '.sql': 'sql',
+    'Dockerfile': 'dockerfile',
+}
+
+FILE_CONTENT_TRANSLATIONS = {
+    "ru": {
+        "project_build": "Сборка проекта",
+        "project_structure": "СТРУКТУРА ПРОЕКТА (ВКЛЮЧЕННЫЕ ФАЙЛЫ)",
+        "file_contents": "СОДЕРЖИМОЕ ФАЙЛОВ",
+        "file_header": "Файл",
+        "read_error": "Ошибка чтения файла",
+        "binary_file": "Двоичный файл, содержимое пропущено",
+        "delta_since": "изменения относительно",
+        "delta_legend": "[+] новый, [*] изменён, [-] удалён",
+        "deleted_files": "УДАЛЁННЫЕ ФАЙЛЫ",
+        "truncated": "файл обрезан: {size}, из середины пропущено {skipped}",
+        "total_limit": "НЕ ВОШЛИ: ДОСТИГНУТ ОБЩИЙ ЛИМИТ",
+        "part": "часть"
+    },
+    "en": {
+        "project_build": "Project Build",
+        "project_structure": "PROJECT STRUCTURE (INCLUDED FILES)",
+        "file_contents": "FILE CONTENTS",
+        "file_header": "File",
+        "read_error": "Error reading file",
+        "binary_file": "Binary file, contents skipped",
+        "delta_since": "changes since",
+        "delta_legend": "[+] added, [*] changed, [-] deleted",
+        "deleted_files": "DELETED FILES",
+        "truncated": "file truncated: {size}, {skipped} skipped in the middle",
+        "total_limit": "NOT INCLUDED: TOTAL SIZE LIMIT REACHED",
+        "part": "part"
+    }
+}
+
+class SecretRule(NamedTuple):
+    pattern: str
+    replacement: str
+    # Подстроки в нижнем регистре, без которых правило сработать не может; пусто - проверять всегда
+    keywords: tuple = ()
+    validator: object = None
+
+
+def _shannon_entropy(text: str) -> float:
+    counts = {}
+    for ch in text:
+        counts[ch] = counts.get(ch, 0) + 1
+    length = len(text)
+    return -sum(c / length * math.log2(c / length) for c in counts.values())
+
+
+def _looks_random(text: str) -> bool:
+    return (any(ch.isdigit() for ch in text) and any(ch.isalpha() for ch in text)
+            and _shannon_entropy(text) >= 4.5)
+
+
+SECRET_RULES = {
+    # Все правила - одна альтернатива; на одной позиции выигрывает правило выше. env_line стоит первым:
+    # строку KEY=... он заменяет целиком, как прежний второй проход re.sub поверх первого
+    "env_line": SecretRule(
+        r"""(^((?:API|ACCESS|SECRET|PRIVATE)_?(?:KEY|TOKEN)|TOKEN|PASSWORD)=)[^\n]*""",
+        r'\1[SECRET REMOVED]',
+        ("key", "token", "password"),
+    ),
+    "assignment": SecretRule(
+        # Опережающая проверка первого символа: без неё re на каждой позиции входит в группу и ветки ключей
+        r"""(?=['"apst])(['"]?((?:api|access|secret|private)_?(?:key|token)|token|password)['"]?\s*[:=]\s*)['"][^'"]*['"]""",
+        r'\1"[SECRET REMOVED]"',
+        ("key", "token", "password"),
+    ),
+    "aws": SecretRule(
+        r"""(?-i:\b(?:AKIA|ASIA)[0-9A-Z]{16}\b)""",
+        "[SECRET REMOVED]",
+        ("akia", "asia"),
+    ),
+    "github": SecretRule(
+        r"""(?-i:\b(?:gh[pousr]_[A-Za-z0-9]{36,255}|github_pat_[A-Za-z0-9_]{22,255})\b)""",
+        "[SECRET REMOVED]",
+        ("ghp_", "gho_", "ghu_", "ghs_", "ghr_", "github_pat_"),
+    ),
+    "entropy": SecretRule(
+        r"""(?<![A-Za-z0-9+/=_-])[A-Za-z0-9+/_-]{32,}={0,2}(?![A-Za-z0-9+/=_-])""",
+        "[SECRET REMOVED]",
+        validator=_looks_random,
+    ),
+}
+DEFAULT_SECRET_RULES = ("env_line", "assignment")
+
+
+class SecretScanner:
+    def __init__(self, rule_names=DEFAULT_SECRET_RULES):
+        self._rules = [(name, rule) for name, rule in SECRET_RULES.items() if name in rule_names]
+        # Выражение собирается на набор правил, чьи ключевые слова есть в файле: файл без "ghp_"
+        # не платит за github
+        self._compiled = {}
+
+    def _compile(self, names):
+        compiled = self._compiled.get(names)
+        if compiled is None:
+            parts, replacements = [], {}
+            group = 0
+            for name, rule in self._rules:
+                if name not in names:
+                    continue
+                # Группа-метка стоит после правила: она закрывается последней, и m.lastgroup - имя правила,
+                # а ветка начинается с первой операции самого правила, которую re отсекает дешевле группы.
+                # Номера групп правила сдвигаются на его место в общей альтернативе; шаблон разобран заранее:
+                # match.expand на каждом совпадении заметно дороже
+                template = re.split(r"\\(\d+)", rule.replacement)
+                template[1::2] = [int(index) + group for index in template[1::2]]
+                replacements[name] = (template, rule.validator)
+                parts.append(f"(?:{rule.pattern})(?P<{name}>)")
+                group += re.compile(rule.pattern).groups + 1
+            regex = re.compile("|".join(parts), re.IGNORECASE | re.MULTILINE)
+            compiled = self._compiled[names] = (regex, replacements)
+        return compiled
+
+    def redact(self, content: str) -> str:
+        lowered = None
+        names = []
+        for name, rule in self._rules:
+            if rule.keywords:
+                # Предфильтр по исходному тексту: правило без своих ключевых слов в файле сработать не может
+                if lowered is None:
+                    lowered = content.lower()
+                if not any(kw in lowered for kw in rule.keywords):
+                    continue
+            names.append(name)
+        if not names:
+            return content
+        regex, replacements = self._compile(tuple(names))
+
+        def replace(match):
+            template, validator = replacements[match.lastgroup]
+            if validator is not None and not validator(match.group()):
+                return match.group()
+            if len(template) == 1:
+                return template[0]
+            return "".join([part if part.__class__ is str else match.group(part) or "" for part in template])
+        return regex.sub(replace, content)
+
+
+_secret_scanners = {}
+
+
+def get_secret_scanner(rule_names=DEFAULT_SECRET_RULES) -> SecretScanner:
+    key = tuple(sorted(rule_names))
+    scanner = _secret_scanners.get(key)
+    if scanner is None:
+        scanner = _secret_scanners[key] = SecretScanner(key)
+    return scanner
+
+
+def sanitize_content(content: str, rule_names=DEFAULT_SECRET_RULES) -> str:
+    return get_secret_scanner(rule_names).redact(content)
+
+class _CommentSyntax(NamedTuple):
+    # Исходник выражения: компилируется при первой очистке файла с этим расширением, а не при импорте
+    pattern: str
+    # Многострочный блочный комментарий: перевод строки (ASI в JS/Go) или пробел (C-препроцессор)
+    block_newline: bool = True
+    docstrings: bool = False
+    prologue: re.Pattern = None
+    epilogue: re.Pattern = None
+    paste_guard: bool = True
+    # Подстроки, с которых начинаются многострочные лексемы. Если обычные строки языка однострочные,
+    # строку исходника без них сканер перепрыгивает целиком, а однострочные комментарии в ней
+    # убираются при сборке кода: целые строки - вместе с пустыми одной заменой, хвостовые - по одному
+    needles: tuple = ()
+    line_comment: str = None
+    # Однострочные комментарии, которые меняют смысл файла и остаются на месте
+    magic: re.Pattern = None
+    # Две кавычки однострочных строк: если перед маркером на строке кавычки одного вида, их чётное число
+    # и ни одна не экранирована, все строки закрыты и комментарий убирается без match
+    quotes: str = None
+    # Схлопывание пустых строк вместе со строками из одного комментария, собирается при компиляции.
+    # Второй вариант - для кода без табуляций: повтор одного пробела re проходит быстрее, чем класс [ \t]
+    blank_lines: re.Pattern = None
+    blank_spaces: re.Pattern = None
+
+
+_SHEBANG = re.compile(r'#![^\n]*')
+# Shebang, кодировка (PEP 263 и Ruby) и прагмы Ruby: работают, только если занимают строку целиком,
+# а кодировка - ещё и только в первых двух строках
+_CODING_COMMENT = r'(?P<coding>#.*?coding[:=][ \t]*[-\w.])'
+_MAGIC_COMMENT = re.compile(r'#!|#[ \t]*(?:frozen_string_literal|warn_indent|shareable_constant_value)[ \t]*:|'
+                            + _CODING_COMMENT)
+_PYTHON_MAGIC = re.compile(rf'#!|{_CODING_COMMENT}')
+# Шапка Python: shebang и кодировка
+_PYTHON_HEADER = re.compile(r'(?:(?P<first>[ \t]*#[^\n]*)\n)?[ \t]*#[^\n]*?coding[:=][ \t]*[-\w.][^\n]*|#![^\n]*')
+# Пустая строка после продолжения через \ завершает его, такую не схлопываем. Проверка стоит после \n,
+# чтобы re искал литерал: так выражение не медленнее варианта без неё
+_BLANK_LINES = re.compile(r'\n(?<!\\\n)[ \t]*+\n(?:[ \t]*+\n)*+')
+_BLANK_SPACES = re.compile(r'\n(?<!\\\n) *+\n(?: *+\n)*+')
+_NESTED_COMMENT = re.compile(r'/\*|\*/')
+_STATEMENT_TAIL = re.compile(r'[ \t]*(?:#[^\n]*)?(?:\n|\Z)')
+_TRAILING_WORD = re.compile(r'[\w$]+$')
+_REGEX_PRECEDERS = frozenset('(,=:[!&|?{};+-*%>~^}')
+_REGEX_KEYWORDS = frozenset(('return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw',
+                             'case', 'do', 'else', 'yield', 'await', 'if', 'unless', 'when', 'elsif', 'while',
+                             'until', 'and', 'or', 'not'))
+_OPERATOR_CHARS = frozenset('+-*/%&|^!=<>.:')
+_DOCSTRING_PREFIX_CHARS = frozenset('rRbBuU')
+# Метка выброшенной докстроки. Не \x00: в строках не-ASCII его младший байт совпадает со старшими
+# байтами обычных символов, и проверка `in` перестаёт быть быстрой
+_DOCSTRING_MARK = '\x01'
+_CODE_LINE = re.compile(r'^([ \t]*)[^ \t\n\x01]', re.MULTILINE)
+# Отступ следующей строки с кодом после докстроки и открывающие кавычки, если это снова строка.
+# Оставляемый shebang считается кодом, как и в разборе через tokenize
+_NEXT_CODE_LINE = re.compile(r'[ \t]*+(?:#[^\n]*+)?(?:\n[ \t]*+(?:#(?!!)[^\n]*+)?(?=\n))*+\n([ \t]*+)(?=[^\s#]|#!)'
+                             r'([rRbBuU]{0,2}(?:\'\'\'|"""))?')
+
+_DQ = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+_DQ_MULTILINE = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_SQ = r"'[^'\\\n]*(?:\\.[^'\\\n]*)*'"
+_SQ_MULTILINE = r"'[^'\\]*(?:\\.[^'\\]*)*'"
+_CHAR = r"'(?:[^'\\\n]|\\[^\n][^'\n]{0,9})'"
+_TRIPLE_DQ = r'"""[^"]*(?:"(?!"")[^"]*)*"""'
+_BACKTICK = r'`[^`\\]*(?:\\.[^`\\]*)*`'
+_C_LINE = r'(?P<line>//[^\n]*)'
+_C_BLOCK = r'(?P<block>/\*.*?\*/)'
+_C_NESTED = r'(?P<nested>/\*)'
+# %q(...), %w[...], %r{...}: парные скобки допускают вложенность до трёх уровней (#{...} внутри)
+def _ruby_percent_literal(depth: int) -> str:
+    pairs = []
+    for o, c in (('\\(', '\\)'), ('\\[', '\\]'), ('\\{', '\\}'), ('<', '>')):
+        body = f'{o}[^{o}{c}]*{c}'
+        for _ in range(depth):
+            body = f'{o}(?:[^{o}{c}\\\\]|\\\\.|{body})*{c}'
+        pairs.append(body)
+    pairs.append(r'(?P<pdelim>[|!/^%])(?:(?!(?P=pdelim))[^\\]|\\.)*(?P=pdelim)')
+    return '%[qQwWiIrsx]?(?:' + '|'.join(pairs) + ')'
+
+
+def _ruby_string(depth: int) -> str:
+    # "...#{...}..." - внутри интерполяции бывают свои строки и блоки, разбираем до depth уровней
+    if depth == 0:
+        return _DQ_MULTILINE
+    inner = _ruby_string(depth - 1)
+    braces = r'\{[^{}]*\}'
+    for _ in range(depth):
+        braces = rf'\{{(?:[^{{}}"\'\\]|\\.|{inner}|{_SQ_MULTILINE}|{braces})*\}}'
+    return rf'"(?:[^"\\#]|\\.|#(?!\{{)|#{braces})*"'
+
+
+_REGEX_LITERAL = r'(?P<regex>/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*)'
+
+
+def _safe_string(quote: str, unsafe: str) -> str:
+    # Однострочная строка без опасных символов поглощается кодом прямо в движке re
+    body = f'[^{quote}\\\\\\n{unsafe}]'
+    return f'{quote}(?!{quote}{quote}){body}*(?:\\\\.{body}*)*{quote}'
+
+
+def _comment_syntax(special, safe, keep, *comments, **options):
+    # Один вызов match проглатывает обычный код вместе с безопасными строками и останавливается
+    # на первой лексеме, которой нужна логика: комментарии, строки с опасным содержимым, маркеры
+    chunk = '|'.join([f'[^{special}]++'] + list(safe))
+    tokens = list(comments) + ([f"(?P<keep>{'|'.join(keep)})"] if keep else [])
+    pattern = f"(?:{chunk})*+(?:{'|'.join(tokens)}|(?P<stray>.)|\\Z)"
+    options.setdefault('prologue', _SHEBANG)
+    return _CommentSyntax(pattern, **options)
+
+
+_SINGLE3 = r"'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''"
+_DOUBLE3 = r'"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""'
+# Строки и комментарии Python - для точного подсчёта скобок перед кандидатом в докстроки
+_PYTHON_NOISE = '|'.join((_SINGLE3, _DOUBLE3, _SQ, _DQ, r'#[^\n]*'))
+_python_noise = None
+_TRIPLE_DOUBLE = re.compile('"""')
+_TRIPLE_SINGLE = re.compile("\'\'\'")
+# Докстрока под однострочным def/class целиком: заголовок, отступ (1), сама строка (2) и хвост _NEXT_CODE_LINE (3, 4).
+# Тело идёт повтором одного символа - так re проходит его почти со скоростью str.find; экранированные
+# закрывающие кавычки выражение не разбирает и оставляет общему разбору
+_SIGNATURE_DOCSTRING = re.compile(
+    r'[ \t]*(?:async[ \t]+)?(?:def[ \t]+\w+[ \t]*\([^\n#]*\)(?:[ \t]*->[^\n#]*)?|class[ \t]+\w+(?:[ \t]*\([^\n#]*\))?)'
+    r'[ \t]*:[ \t]*\n([ \t]+)("""[^"]*+(?:"(?!"")[^"]*+)*+(?<!\\)"""|\'\'\'[^\']*+(?:\'(?!\'\')[^\']*+)*+(?<!\\)\'\'\')'
+    + _NEXT_CODE_LINE.pattern)
+# Докстрока модуля: до неё только пустые строки и комментарии
+_MODULE_DOCSTRING = re.compile(rf'(?:[ \t]*+(?:#[^\n]*+)?\n)*+({_DOUBLE3}|{_SINGLE3})(?=[ \t]*+(?:#[^\n]*+)?(?:\n|\Z))')
+_BLOCK_HEADER = re.compile(r'([ \t]*)(?:(?:async[ \t]+)?(?:def|for|with)[ \t(]|(?:class|if|elif|while|except)\b|'
+                           r'(?:else|try|finally)[ \t]*:)[^\n]*:')
+
+
+def _strip_python_tokens(content: str) -> str:
+    # Точный разбор через tokenize; на 3.11 он в десятки раз медленнее сканера, поэтому нужен только
+    # там, где сканер не справился, и как эталон в тестах. Код, который не токенизируется, остаётся
+    # как есть, схлопываются только пустые строки
+    import tokenize
+
+    statement_start = (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING, None)
+    skipped = (tokenize.NL, tokenize.COMMENT)
+    string_end = {tokenize.STRING: tokenize.STRING}
+    if hasattr(tokenize, 'FSTRING_START'):
+        string_end[tokenize.FSTRING_START] = tokenize.FSTRING_END
+    line_starts = [0]
+    line_starts.extend(m.end() for m in re.finditer('\n', content))
+    # Без перевода строки в конце tokenize ставит ENDMARKER на строку дальше последней
+    line_starts.append(len(content))
+
+    def offset(point):
+        return line_starts[point[0] - 1] + point[1]
+
+    docstrings = _DOCSTRING_MARK not in content
+    cuts, kept = [], []
+    prev = None
+    marked = False
+    # Токены идут потоком: список всех токенов большого файла занял бы в разы больше самого файла
+    tokens = tokenize.generate_tokens(io.StringIO(content).readline)
+    try:
+        for token in tokens:
+            start = offset(token.start)
+            if token.type == tokenize.COMMENT:
+                if not _magic_comment(content, start, _PYTHON_MAGIC):
+                    while start and content[start - 1] in ' \t':
+                        start -= 1
+                    cuts.append((start, offset(token.end), ''))
+                continue
+            if token.type in string_end:
+                # f-строка на 3.12+ - это поток токенов до парного FSTRING_END, в ней бывают вложенные
+                opening, closing = token.type, string_end[token.type]
+                depth = 0 if opening == closing else 1
+                while depth:
+                    token = next(tokens)
+                    depth += (token.type == opening) - (token.type == closing)
+                end = offset(token.end)
+                body = content[start:end].lstrip('rRbBuUfF')
+                quote = end - len(body)
+                if (docstrings and prev in statement_start and body[:3] in ("'''", '"""')
+                        and _statement_prefix(content, content.rfind('\n', 0, quote) + 1, quote, end) is not None):
+                    cuts.append((start, end, _DOCSTRING_MARK))
+                    marked = True
+                elif '\n' in body:
+                    kept.append((start, end))
+            if token.type not in skipped:
+                prev = token.type
+    except (tokenize.TokenError, SyntaxError):
+        return _BLANK_LINES.sub('\n', content).strip()
+
+    # Пустые строки схлопываются везде, кроме многострочных литералов
+    out, run = [], []
+    pos = 0
+    for start, end, repl in sorted(cuts + [(start, end, None) for start, end in kept]):
+        run.append(content[pos:start])
+        if repl is None:
+            out.append(_BLANK_LINES.sub('\n', ''.join(run)))
+            out.append(content[start:end])
+            run.clear()
+        else:
+            run.append(repl)
+        pos = end
+    run.append(content[pos:])
+    out.append(_BLANK_LINES.sub('\n', ''.join(run)))
+    text = ''.join(out)
+    if marked:
+        text = _resolve_docstrings(text)
+    return text.strip()
+
+
+_PYTHON_SYNTAX = _comment_syntax(
+    '\'"#', (_safe_string("'", '#'), _safe_string('"', '#')),
+    (r"'[^\n'\\]*(?:\\.[^\n'\\]*)*'", r'"[^\n"\\]*(?:\\.[^\n"\\]*)*"'),
+    "(?P<docstring>'''|\"\"\")", r'(?P<line>#[^\n]*)',
+    docstrings=True, needles=("'''", '"""'), line_comment='#', magic=_SHEBANG, quotes='\'"', prologue=_PYTHON_HEADER,
+)
+_JS_SYNTAX = _comment_syntax(
+    '\'"`/', (_safe_string("'", '/'), _safe_string('"', '/')),
+    (_DQ, _SQ, _BACKTICK), _C_LINE, _C_BLOCK, _REGEX_LITERAL,
+    needles=('/*', '`'), line_comment='//',
+)
+_C_SAFE = (_safe_string('"', '/'), r'/(?![/*])')
+_C_SYNTAX = _comment_syntax(
+    '\'"/R', _C_SAFE + (r'R(?!"[^()\\\s]{0,16}\()',),
+    (r'R"(?P<delim>[^()\\\s]{0,16})\(.*?\)(?P=delim)"', _DQ, _CHAR), _C_LINE, _C_BLOCK,
+    block_newline=False, line_comment='//', needles=('/*', 'R"'),
+)
+_JVM_SYNTAX = _comment_syntax('\'"/', _C_SAFE, (_TRIPLE_DQ, _DQ, _CHAR), _C_LINE, _C_NESTED,
+                              line_comment='//', needles=('/*', '"""'))
+_MARKUP_SYNTAX = _comment_syntax(
+    '<', (r'<(?!!--|!\[CDATA\[|(?i:script|style|pre|textarea)\b)',),
+    (r'<!\[CDATA\[.*?\]\]>', r'<(?i:(?P<raw>script|style|pre|textarea))\b.*?</(?P=raw)\s*>'),
+    r'(?P<block><!--.*?-->)', prologue=None, paste_guard=False,
+)
+_COMMENT_SYNTAX = {
+    '.py': _PYTHON_SYNTAX,
+    '.js': _JS_SYNTAX,
+    '.ts': _JS_SYNTAX,
+    '.jsx': _JS_SYNTAX,
+    '.tsx': _JS_SYNTAX,
+    '.go': _comment_syntax('\'"`/', _C_SAFE, (_DQ, _CHAR, r'`[^`]*`'), _C_LINE, _C_BLOCK,
+                           line_comment='//', needles=('/*', '`')),
+    '.rs': _comment_syntax('\'"/', _C_SAFE, (_DQ_MULTILINE, _CHAR), _C_LINE, _C_NESTED),
+    '.java': _comment_syntax('\'"/', _C_SAFE, (_TRIPLE_DQ, _DQ, _CHAR), _C_LINE, _C_BLOCK,
+                             line_comment='//', needles=('/*', '"""')),
+    '.cs': _comment_syntax(
+        '\'"/@', _C_SAFE + (r'@(?!\$?")',),
+        (r'@\$?"[^"]*(?:""[^"]*)*"', _TRIPLE_DQ, _DQ, _CHAR), _C_LINE, _C_BLOCK,
+        line_comment='//', needles=('/*', '@', '"""'),
+    ),
+    '.c': _C_SYNTAX,
+    '.cpp': _C_SYNTAX,
+    '.h': _C_SYNTAX,
+    '.hpp': _C_SYNTAX,
+    '.swift': _comment_syntax('"/', _C_SAFE, (_TRIPLE_DQ, _DQ), _C_LINE, _C_NESTED,
+                              line_comment='//', needles=('/*', '"""')),
+    '.kt': _JVM_SYNTAX,
+    '.kts': _JVM_SYNTAX,
+    '.rb': _comment_syntax(
+        '\'"`#<=/%?$',
+        (r'\$\S?', r'=(?!begin\b)', r'<(?!<[~-]?[\'"`]?[A-Z_])', r'%(?![qQwWiIrsx]?[(\[{<|!/^%])', r'\?(?:\\.|[^\s\w])?'),
+        (_ruby_string(3), _SQ_MULTILINE, _BACKTICK, _ruby_percent_literal(3)),
+        r'(?P<block>^=begin\b.*?^=end\b[^\n]*)',
+        r'(?P<heredoc><<[~-]?(?P<quote>[\'"`]?)(?P<tag>[A-Z_][A-Z_0-9]*)(?P=quote))',
+        r'(?P<line>#[^\n]*)',
+        r'(?P<regex>/(?:[^/\\\[]|\\.|\[(?:[^\]\\]|\\.)*\])+/[a-z]*)',
+        epilogue=re.compile(r'^__END__$', re.MULTILINE), magic=_MAGIC_COMMENT,
+    ),
+    # Вне <?php ... ?> идёт разметка, её не трогаем
+    '.php': _comment_syntax(
+        '\'"/#?<', (_safe_string('"', '/#?'), r'/(?![/*])', r'\?(?!>)', r'<(?!<<)', r'#\['),
+        (r'\?>.*?(?:<\?(?:php\b|=)?|\Z)', _DQ_MULTILINE, _SQ_MULTILINE),
+        r'(?P<heredoc><<<[ \t]*(?P<quote>[\'"]?)(?P<tag>[A-Za-z_]\w*)(?P=quote))',
+        r'(?P<line>(?://|#)(?:[^\n?]|\?(?!>))*)', _C_BLOCK,
+        prologue=re.compile(r'.*?(?:<\?(?:php\b|=)?|\Z)', re.DOTALL),
+    ),
+    '.sh': _comment_syntax(
+        '\'"`#<\\\\', (r'\\.', r'(?<=[^\s;&|()])#', r'<<<', r'<(?!<-?[ \t]*[\'"]?[A-Za-z_])'),
+        (r"'[^']*'", _DQ_MULTILINE, _BACKTICK),
+        r'(?P<heredoc><<-?[ \t]*(?P<quote>[\'"]?)(?P<tag>[A-Za-z_]\w*)(?P=quote))',
+        r'(?P<line>#[^\n]*)', magic=_MAGIC_COMMENT,
+    ),
+    '.css': _comment_syntax('\'"/', (_safe_string('"', '/'), _safe_string("'", '/'), r'/(?!\*)'),
+                            (_DQ, _SQ), _C_BLOCK, prologue=None, needles=('/*',)),
+    '.html': _MARKUP_SYNTAX,
+    '.xml': _MARKUP_SYNTAX,
+}
+
+
+def _magic_comment(content: str, start: int, magic: re.Pattern) -> bool:
+    m = magic.match(content, start)
+    if m is None or content[content.rfind('\n', 0, start) + 1:start].strip():
+        return False
+    return m.lastgroup != 'coding' or content.count('\n', 0, start) < 2
+
+
+def _has_magic_comment(content: str, start: int) -> bool:
+    # Кодировка действует только в первых двух строках; shebang ниже шапки оставляет сам сканер
+    second = content.find('\n', content.find('\n') + 1)
+    second = len(content) if second == -1 else max(start, second)
+    return any(_magic_comment(content, m.start(), _PYTHON_MAGIC) for m in _PYTHON_MAGIC.finditer(content, start, second))
+
+
+def _would_paste(left: str, right: str) -> bool:
+    if left.isalnum() or left == '_':
+        return right.isalnum() or right == '_'
+    return left in _OPERATOR_CHARS and right in _OPERATOR_CHARS
+
+
+def _trim_run(run):
+    while run:
+        piece = run[-1].rstrip(' \t')
+        if piece:
+            run[-1] = piece
+            return
+        run.pop()
+
+
+def _regex_allowed(run, out) -> bool:
+    for piece in reversed(run):
+        piece = piece.rstrip()
+        if piece:
+            break
+    else:
+        return not out
+    if piece[-1] in _REGEX_PRECEDERS:
+        return True
+    word = _TRAILING_WORD.search(piece)
+    return word is not None and word.group() in _REGEX_KEYWORDS
+
+
+def _statement_prefix(content: str, line_start: int, start: int, end: int):
+    # Строка занимает логическую строку целиком - значит, это выражение-оператор (докстрока);
+    # возвращает длину строкового префикса (r, b, f...), который уже ушёл в код
+    prefix = content[line_start:start].lstrip(' \t')
+    # f-строка вычисляется при выполнении, её выбрасывать нельзя
+    if len(prefix) > 2 or not _DOCSTRING_PREFIX_CHARS.issuperset(prefix):
+        return None
+    if line_start >= 2 and content[line_start - 2] == '\\':
+        return None
+    if _STATEMENT_TAIL.match(content, end) is None:
+        return None
+    return len(prefix)
+
+
+def _resolve_docstrings(text: str) -> str:
+    # Строка-выражение удалена; если блок опустел, на её место встаёт pass
+    out = []
+    last = 0
+    prev = ''
+    while True:
+        mark = text.find(_DOCSTRING_MARK, last)
+        if mark == -1:
+            break
+        start = text.rfind('\n', 0, mark) + 1
+        if start > last:
+            prev = text[text.rfind('\n', last, start - 1) + 1:start].rstrip()
+            out.append(text[last:start])
+        indent = text[start:mark]
+        line_end = text.find('\n', mark)
+        last = len(text) if line_end == -1 else line_end + 1
+        nxt = _CODE_LINE.search(text, last)
+        if prev.endswith(':') and (nxt is None or len(nxt.group(1)) < len(indent)):
+            prev = indent + 'pass'
+            out.append(prev + '\n')
+    out.append(text[last:])
+    return ''.join(out)
+
+
+def _triple_quote_end(content: str, start: int) -> int:
+    # Тело докстроки ищем через str.find: посимвольный разбор тела в re заметно медленнее
+    quote = content[start:start + 3]
+    end = start + 3
+    while True:
+        end = content.find(quote, end)
+        if end == -1:
+            return -1
+        escape = end
+        while content[escape - 1] == '\\':
+            escape -= 1
+        if (end - escape) % 2 == 0:
+            return end + 3
+        end += 1
+
+
+def _bracket_balance(code: str) -> int:
+    global _python_noise
+    if _python_noise is None:
+        _python_noise = re.compile(_PYTHON_NOISE, re.DOTALL)
+    if "'" in code or '"' in code or '#' in code:
+        code = _python_noise.sub('', code)
+    return (code.count('(') + code.count('[') + code.count('{')
+            - code.count(')') - code.count(']') - code.count('}'))
+
+
+def _previous_code_line(content: str, line_start: int, match):
+    # Ближайшая строка выше с кодом, без хвостового комментария
+    end = line_start - 1
+    while end > 0:
+        begin = content.rfind('\n', 0, end) + 1
+        line = content[begin:end].rstrip()
+        stripped = line.lstrip()
+        if stripped and stripped[0] != '#':
+            break
+        end = begin - 1
+    else:
+        return 0, None
+    pos = begin
+    while '#' in stripped:
+        m = match(content, pos)
+        kind = m.lastgroup
+        if kind == 'line' and m.start(kind) < end:
+            return begin, content[begin:m.start(kind)].rstrip()
+        if kind != 'keep' or m.end(kind) >= end:
+            break
+        pos = m.end(kind)
+    return begin, line
+
+
+def _closes_expression(line: str) -> bool:
+    # Строка кончается законченным выражением: строковый литерал сразу под ней внутри скобок
+    # был бы синтаксической ошибкой, значит, скобки закрыты
+    last = line[-1]
+    if last in ')]}':
+        return True
+    if not (last.isalnum() or last == '_'):
+        return False
+    word = _TRAILING_WORD.search(line)
+    return word is not None and not keyword.iskeyword(word.group())
+
+
+def _strip_line_comments(code: str, syntax: _CommentSyntax, blank_lines=None) -> str:
+    # Комментарии после кода на строках, которые сканер перепрыгнул; строка от начала разбирается
+    # тем же выражением, чтобы маркер внутри литерала остался на месте. С blank_lines пустые строки
+    # схлопываются заново, если убранный комментарий кончался на \ и прятал их от первого прохода
+    match = syntax.pattern.match
+    marker = syntax.line_comment
+    magic = syntax.magic
+    quotes = syntax.quotes
+    if quotes is not None:
+        first, second = quotes
+    out = []
+    pos = scan = 0
+    continued = False
+    hit = code.find(marker)
+    while hit != -1:
+        line_start = code.rfind('\n', scan, hit) + 1
+        if line_start > scan and code[line_start - 2:line_start] != '\\\n':
+            scan = line_start
+        if quotes is not None:
+            # Строка до маркера без экранирования и с чётным числом кавычек одного вида - маркер вне литерала
+            head = code[scan:hit]
+            if first in head:
+                plain = second not in head and not head.count(first) % 2 and '\\' not in head
+            else:
+                plain = second not in head or not head.count(second) % 2 and '\\' not in head
+            if plain and magic is not None and _magic_comment(code, hit, magic):
+                # Строку целиком занимает shebang - он остаётся
+                scan = code.find('\n', hit)
+                if scan == -1:
+                    break
+                hit = code.find(marker, scan)
+                continue
+            if plain:
+                out.append(code[pos:hit].rstrip(' \t'))
+                pos = scan = code.find('\n', hit)
+                if pos == -1:
+                    pos = scan = len(code)
+                elif code[pos - 1] == '\\':
+                    continued = True
+                hit = code.find(marker, scan)
+                continue
+        m = match(code, scan)
+        kind = m.lastgroup
+        if kind is None:
+            break
+        start, end = m.span(kind)
+        if kind == 'line' and (magic is None or not _magic_comment(code, start, magic)):
+            out.append(code[pos:start].rstrip(' \t'))
+            pos = end
+            continued = continued or code[end - 1] == '\\'
+        elif kind == 'stray' or kind == 'regex' and not _regex_allowed((code[max(pos, start - 80):start],), ()):
+            end = start + 1
+        scan = end
+        hit = code.find(marker, scan)
+    if not out:
+        return code
+    out.append(code[pos:])
+    code = ''.join(out)
+    if continued and blank_lines is not None:
+        code = blank_lines.sub('\n', code)
+    return code
+
+
+def _block_start(content: str, low: int, high: int) -> int:
+    # Ближайшая строка def/class выше high: скобки на ней заведомо закрыты. -1 - такой нет после low
+    best = -1
+    for keyword in ('def ', 'class '):
+        hit = high
+        while True:
+            hit = content.rfind(keyword, max(low, best), hit)
+            if hit == -1:
+                break
+            line_start = content.rfind('\n', 0, hit) + 1
+            if (content[line_start:hit].strip(' \t') in ('', 'async')
+                    and content[line_start - 2:line_start] != '\\\n'):
+                best = line_start
+                break
+    return best
+
+
+def _strip_python(content: str, syntax: _CommentSyntax) -> str:
+    # Вне тройных кавычек строки Python однострочные, поэтому сканер идёт только по тройным кавычкам:
+    # докстроки выбрасываются, остальные строки копируются, а код между ними чистит flush
+    if '#' not in content and "'''" not in content and '"""' not in content:
+        return _BLANK_LINES.sub('\n', content).strip()
+    prologue = syntax.prologue.match(content)
+    if _has_magic_comment(content, prologue.end() if prologue else 0):
+        # Кодировку в первых двух строках, но не в шапке, сканер не отличит от обычного комментария
+        return _strip_python_tokens(content)
+    out, run, kept = [], [], []
+    pos = scan = depth = depth_pos = 0
+    block_line = -1
+    docstrings = _DOCSTRING_MARK not in content
+    match = syntax.pattern.match
+    blank_lines, blank_spaces = syntax.blank_lines, syntax.blank_spaces
+
+    def flush():
+        if run:
+            code = ''.join(run)
+            code = (blank_lines if '\t' in code else blank_spaces).sub('\n', code)
+            if '#' in code:
+                # Комментарий с \ в конце не продолжает строку: пустые строки после него тоже схлопываются
+                code = _strip_line_comments(code, syntax, blank_lines)
+            out.append(code)
+            run.clear()
+
+    if prologue:
+        header = prologue.group()
+        if prologue.group('first') is not None and not _magic_comment(content, content.find('#'), _PYTHON_MAGIC):
+            # Кодировка во второй строке, а в первой - обычный комментарий (например, о генерации файла)
+            header = header[prologue.end('first') + 1:]
+        out.append(header)
+        pos = scan = prologue.end()
+    # Позиции тройных кавычек: поиск литерала в re заметно быстрее, чем str.find по трём символам
+    quotes = [m.start() for m in _TRIPLE_DOUBLE.finditer(content, pos)]
+    single = _TRIPLE_SINGLE.search(content, pos)
+    if single is not None:
+        quotes.extend(m.start() for m in _TRIPLE_SINGLE.finditer(content, single.start()))
+        quotes.sort()
+    index, count = 0, len(quotes)
+    module = _MODULE_DOCSTRING.match(content, pos) if docstrings and count else None
+    if module is not None:
+        run.append(content[pos:module.start(1)])
+        pos = scan = module.end()
+    while index < count:
+        start = quotes[index]
+        index += 1
+        if start < scan:
+            continue
+        line_start = content.rfind('\n', 0, start) + 1
+        if docstrings and line_start > pos and content[line_start - 2] == ':':
+            # Частый случай - докстрока под однострочным def/class: скобки на строке выше закрыты, и одно
+            # выражение проверяет заголовок, находит конец докстроки и следующую строку с кодом
+            above = content.rfind('\n', 0, line_start - 1) + 1
+            doc = _SIGNATURE_DOCSTRING.match(content, above) if above >= pos else None
+            if doc is not None and doc.end(1) == start:
+                # Кавычки внутри докстроки и закрывающие пропустит проверка start < scan
+                if doc.end(3) - doc.start(3) < start - line_start:
+                    # Блок кончился на докстроке
+                    run.append(content[pos:start])
+                    run.append('pass')
+                    pos = scan = doc.end(2)
+                    while content[pos] in ' \t':
+                        pos += 1
+                else:
+                    # Вместе с докстрокой уходят пустые строки и комментарии после неё
+                    run.append(content[pos:line_start])
+                    pos = scan = doc.start(3)
+                    if doc.group(4):
+                        block_line = pos
+                depth, depth_pos = 0, line_start
+                continue
+        lexed = line_start if line_start > scan and content[line_start - 2:line_start] != '\\\n' else scan
+        head = content[lexed:start]
+        if '#' in head or "'" in head or '"' in head:
+            # Кавычки могут стоять внутри комментария или обычной строки - разбираем строку выражением
+            m = match(content, lexed)
+            while m.lastgroup == 'keep' and m.end() <= start:
+                m = match(content, m.end())
+            kind = m.lastgroup
+            if kind == 'stray':
+                # Незакрытая кавычка: сканер уже не знает, где код, - разбираем файл целиком через tokenize
+                return _strip_python_tokens(content)
+            if kind == 'docstring':
+                scan = m.start(kind)
+            else:
+                scan = m.end()
+            if kind != 'docstring' or scan != start:
+                # Выражение остановилось на комментарии до кавычек или проглотило их вместе с простой
+                # строкой - продолжаем с того места, где оно остановилось
+                index -= 1
+                continue
+        opened = index
+        end = quotes[index] if index < count else -1
+        if end != -1 and content[end] == content[start] and content[end - 1] != '\\':
+            # Закрывающие кавычки - следующие того же вида в списке
+            end += 3
+            index += 1
+        else:
+            end = _triple_quote_end(content, start)
+            if end == -1:
+                return _strip_python_tokens(content)
+        scan = end
+        # Докстрокой может быть только строка, перед которой на строке отступ и, возможно, префикс r/b/u
+        if docstrings and lexed == line_start and len(head.lstrip(' \t')) <= 2:
+            prefix = _statement_prefix(content, line_start, start, end)
+        else:
+            prefix = None
+        if prefix is not None:
+            indent = start - prefix - line_start
+            if line_start == block_line:
+                # Предыдущая строка-выражение блока уже выброшена
+                header, depth = True, 0
+            else:
+                begin, prev = _previous_code_line(content, line_start, match)
+                header = prev is not None and prev[-1] == ':'
+                block = _BLOCK_HEADER.fullmatch(prev) if header else None
+                # Глубину скобок считаем лениво и только для строк, которые не стоят сразу под def/class/if...
+                if prev is None or block is not None and len(block.group(1)) < indent:
+                    depth = 0
+                elif (opened < 2 or quotes[opened - 2] < begin) and _closes_expression(prev):
+                    # Строка выше лежит вне тройных кавычек и разобрана верно
+                    depth = 0
+                else:
+                    anchor = _block_start(content, max(depth_pos, pos), line_start)
+                    if anchor == -1:
+                        depth += _bracket_balance(content[depth_pos:line_start])
+                    else:
+                        depth = _bracket_balance(content[anchor:line_start])
+            depth_pos = line_start
+            if depth <= 0:
+                run.append(content[pos:start - prefix])
+                pos = end
+                if header:
+                    # Опустевший блок получает pass; строка без него станет пустой и схлопнется
+                    nxt = _NEXT_CODE_LINE.match(content, end)
+                    if nxt is not None and nxt.group(2):
+                        block_line = nxt.start(1)
+                    elif nxt is None or len(nxt.group(1)) < indent:
+                        run.append('pass')
+                        while pos < len(content) and content[pos] in ' \t':
+                            pos += 1
+                continue
+        run.append(content[pos:start])
+        if docstrings:
+            # Строку заменяет метка: код вокруг неё flush чистит одним проходом, а не по куску на строку
+            run.append(_DOCSTRING_MARK)
+            kept.append(content[start:end])
+        else:
+            flush()
+            out.append(content[start:end])
+        pos = end
+    run.append(content[pos:])
+    flush()
+    text = ''.join(out)
+    if not kept:
+        return text.strip()
+    # Строки встают на места меток; края обрезаются до склейки, чтобы не копировать текст ещё раз
+    parts = text.split(_DOCSTRING_MARK)
+    parts[0] = parts[0].lstrip()
+    parts[-1] = parts[-1].rstrip()
+    pieces = [''] * (2 * len(parts) - 1)
+    pieces[::2] = parts
+    pieces[1::2] = kept
+    return ''.join(pieces)
+
+
+def _strip_comments(content: str, syntax: _CommentSyntax) -> str:
+    out, run = [], []
+    pos = 0
+    tail = ''
+
+    def flush():
+        if run:
+            code = ''.join(run)
+            code = (syntax.blank_lines if '\t' in code else syntax.blank_spaces).sub('\n', code)
+            if line_comment and line_comment in code:
+                code = _strip_line_comments(code, syntax)
+            out.append(code)
+            run.clear()
+
+    if syntax.epilogue is not None:
+        epilogue = syntax.epilogue.search(content)
+        if epilogue:
+            content, tail = content[:epilogue.start()], content[epilogue.start():]
+    if syntax.prologue is not None:
+        prologue = syntax.prologue.match(content)
+        if prologue:
+            out.append(prologue.group())
+            pos = prologue.end()
+
+    events = line_comment = None
+    if syntax.needles:
+        events = sorted(m.start() for needle in syntax.needles for m in re.finditer(re.escape(needle), content))
+        event = 0
+        line_comment = syntax.line_comment
+    match = syntax.pattern.match
+    while True:
+        if events is not None:
+            event = bisect_left(events, pos, event)
+            if event == len(events):
+                run.append(content[pos:])
+                break
+            # До строки со следующей подстрокой-маркером - только код и однострочные литералы
+            line_start = content.rfind('\n', pos, events[event]) + 1
+            if line_start > pos and content[line_start - 2:line_start] != '\\\n':
+                run.append(content[pos:line_start])
+                pos = line_start
+        m = match(content, pos)
+        kind = m.lastgroup
+        if kind is None:
+            run.append(content[pos:])
+            break
+        start, end = m.span(kind)
+        run.append(content[pos:start])
+        pos = end
+
+        if kind == 'line':
+            if syntax.magic is not None and _magic_comment(content, start, syntax.magic):
+                run.append(m.group(kind))
+            else:
+                _trim_run(run)
+        elif kind == 'stray':
+            run.append(content[start])
+        elif kind == 'keep':
+            token = m.group(kind)
+            if '\n' in token:
+                flush()
+                out.append(token)
+            else:
+                run.append(token)
+        elif kind == 'block' or kind == 'nested':
+            if kind == 'nested':
+                level = 1
+                while level:
+                    inner = _NESTED_COMMENT.search(content, end)
+                    if inner is None:
+                        end = len(content)
+                        break
+                    level += 1 if inner.group() == '/*' else -1
+                    end = inner.end()
+                pos = end
+            if end == len(content) or content[end] == '\n':
+                _trim_run(run)
+            elif '\n' in content[start:end] and syntax.block_newline:
+                run.append('\n')
+            elif start and content[start - 1] in ' \t':
+                # Пробел перед комментарием уже в выводе, пробелы после него лишние
+                while pos < len(content) and content[pos] in ' \t':
+                    pos += 1
+            elif start and syntax.paste_guard and _would_paste(content[start - 1], content[end]):
+                # a/**/b не должно склеиться в ab, а -/**/- в --
+                run.append(' ')
+        elif kind == 'regex':
+            if _regex_allowed(run, out):
+                run.append(m.group(kind))
+            else:
+                run.append('/')
+                pos = start + 1
+        elif kind == 'heredoc':
+            # Остаток строки с открывающим маркером копируется как есть, тело - до строки-терминатора
+            line_end = content.find('\n', end)
+            if line_end == -1:
+                run.append(m.group(kind))
+                continue
+            terminator = re.compile(r'^[ \t]*' + re.escape(m.group('tag')) + r'[ \t]*$', re.MULTILINE)
+            closing = terminator.search(content, line_end + 1)
+            pos = closing.end() if closing else len(content)
+            run.append(content[start:line_end + 1])
+            flush()
+            out.append(content[line_end + 1:pos])
+    flush()
+    text = ''.join(out)
+    return text.strip() + '\n' + tail if tail else text.strip()
+
+
+_compiled_syntax = {}
+
+
+def _get_comment_syntax(file_extension: str):
+    syntax = _compiled_syntax.get(file_extension)
+    if syntax is None:
+        syntax = _COMMENT_SYNTAX.get(file_extension)
+        if syntax is not None:
+            blank_lines, blank_spaces = _BLANK_LINES, _BLANK_SPACES
+            if syntax.needles and syntax.line_comment:
+                # Чередование вместо необязательной группы: re проверяет его на каждом переводе строки
+                marker = re.escape(syntax.line_comment)
+                if syntax.magic is _SHEBANG:
+                    # Строка-shebang остаётся на месте: пустые строки вокруг неё схлопываются, а она - нет
+                    marker += '(?!!)'
+                line = rf'(?:\n|{marker}.*\n)'
+                blank_lines = re.compile(rf'\n(?<!\\\n)[ \t]*+{line}(?:[ \t]*+{line})*+')
+                blank_spaces = re.compile(rf'\n(?<!\\\n) *+{line}(?: *+{line})*+')
+            syntax = syntax._replace(pattern=re.compile(syntax.pattern, re.DOTALL | re.MULTILINE),
+                                     blank_lines=blank_lines, blank_spaces=blank_spaces)
+            _compiled_syntax[file_extension] = syntax
+    return syntax
+
+
+def clear_for_ai(content: str, file_extension: str) -> str:
+    syntax = _get_comment_syntax(file_extension)
+    if syntax is None:
+        return re.sub(r'\n\s*\n', '\n', content).strip()
+    if syntax.docstrings:
+        return _strip_python(content, syntax)
+    return _strip_comments(content, syntax)
+
+MERGE_CHUNK_SIZE = 64 * 1024
+MERGE_COPY_SIZE = 1024 * 1024
+MERGE_BATCH_SIZE = 16
+CONTENT_CACHE_MB = 256
+# Грубая оценка для лимитов в токенах: около 4 байт исходника на токен
+TOKEN_BYTES = 4
+LIMIT_KEYS = ("max_file_size", "max_file_tokens", "head_size", "tail_size", "max_total_size", "max_total_tokens",
+              "shard_size", "shard_tokens")
+_SIZE_VALUE = re.compile(r'\s*(\d+(?:\.\d+)?)\s*([kmg]?)b?\s*', re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+class SizeLimits(NamedTuple):
+    # max_file - байты исходника на файл (0 - без ограничения), из файла больше него остаются head байт
+    # с начала и tail с конца; max_total - общий объём содержимого в выводе; shard - предел одной части,
+    # если вывод режется на части
+    max_file: int = 0
+    head: int = 0
+    tail: int = 0
+    max_total: int = 0
+    shard: int = 0
+
+
+class _Truncated(NamedTuple):
+    # Содержимое файла больше лимита: начало и конец уже декодированы, середина не читалась
+    head: str
+    tail: str
+    size: int
+    skipped: int
+
+
+def parse_size(value) -> int:
+    # 1048576, "512K", "2M", "1.5G"; у токенов те же суффиксы
+    if isinstance(value, bool):
+        raise ValueError(f"Неверный размер: {value}")
+    if isinstance(value, (int, float)):
+        size = value
+    else:
+        match = _SIZE_VALUE.fullmatch(str(value))
+        if not match:
+            raise ValueError(f"Неверный размер: {value}")
+        size = float(match[1]) * _SIZE_UNITS[match[2].lower()]
+    if size < 0:
+        raise ValueError(f"Неверный размер: {value}")
+    return int(size)
+
+
+def size_limits(config: dict) -> SizeLimits | None:
+    # Ключи LIMIT_KEYS из merger_exclusions.json, CLI или /merge; None - ограничений нет
+    unknown = sorted(set(config) - set(LIMIT_KEYS))
+    if unknown:
+        raise ValueError(f"Неизвестные ключи лимитов: {', '.join(unknown)}")
+
+    def pick(size_key, tokens_key):
+        # Заданы и байты, и токены - действует меньший лимит
+        values = [parse_size(config.get(size_key) or 0), parse_size(config.get(tokens_key) or 0) * TOKEN_BYTES]
+        values = [value for value in values if value]
+        return min(values) if values else 0
+
+    max_file = pick("max_file_size", "max_file_tokens")
+    max_total = pick("max_total_size", "max_total_tokens")
+    shard = pick("shard_size", "shard_tokens")
+    if not (max_file or max_total or shard):
+        return None
+    if max_total and shard:
+        raise ValueError("общий лимит и разбиение на части несовместимы: у каждой части свой предел")
+    head, tail = parse_size(config.get("head_size") or 0), parse_size(config.get("tail_size") or 0)
+    if max_file:
+        if not (head or tail):
+            head = max_file * 3 // 4
+            tail = max_file - head
+        elif not tail:
+            tail = max(0, max_file - head)
+        elif not head:
+            head = max(0, max_file - tail)
+        if head + tail > max_file:
+            raise ValueError("head_size + tail_size больше лимита на файл")
+    return SizeLimits(max_file, head, tail, max_total, shard)
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    if size < 1024 ** 3:
+        return f"{size / (1024 * 1024):.1f} MB"
+    return f"{size / 1024 ** 3:.1f} GB"
+
+
+class ContentCache:
+    # Меняется вместе с sanitize_content/clear_for_ai, чтобы старые результаты не всплывали
+    VERSION = 5
+    # sqlite3 тяжёл для старта CLI: модуль импортируется с первым кэшем, дальше все берут его отсюда
+    _sqlite = None
+
+    def __init__(self, path: Path, max_bytes: int = CONTENT_CACHE_MB * 1024 * 1024):
+        if ContentCache._sqlite is None:
+            import sqlite3
+
+            ContentCache._sqlite = sqlite3
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = {"content": 0, "highlight": 0}
+        self.misses = {"content": 0, "highlight": 0}
+        self.db = self._sqlite.connect(str(path), timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # stamps: путь -> (размер, mtime, хэш содержимого), чтобы неизменный файл вообще не читать;
+        # bodies: хэш содержимого + опции трансформации -> готовый текст
+        self.db.execute("CREATE TABLE IF NOT EXISTS stamps (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS bodies (key TEXT PRIMARY KEY, body TEXT, size INTEGER, used INTEGER)")
+        self.db.commit()
+
+    @classmethod
+    def open(cls, max_mb: int = CONTENT_CACHE_MB, path: Path | None = None):
+        path = path or CACHE_DIR / "content_cache.sqlite3"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            return cls(path, max(1, max_mb) * 1024 * 1024)
+        except OSError as e:
+            error = e
+        except cls._sqlite.Error as e:
+            # Ошибка базы возможна только после импорта sqlite3 в __init__
+            error = e
+        print(f"[WARN] Кэш содержимого недоступен, работаю без него: {error}")
+        return None
+
+    def key(self, *parts) -> str:
+        return hashlib.sha1("\0".join(map(str, (self.VERSION, *parts))).encode("utf-8")).hexdigest()
+
+    # Сбой базы (заблокирована, повреждена) не должен ронять склейку: это просто промах кэша
+    def digest_for(self, path: str, size: int, mtime_ns: int):
+        try:
+            row = self.db.execute("SELECT digest FROM stamps WHERE path = ? AND size = ? AND mtime = ?",
+                                  (path, size, mtime_ns)).fetchone()
+        except self._sqlite.Error:
+            return None
+        return row[0] if row else None
+
+    def remember_digest(self, path: str, size: int, mtime_ns: int, digest: str):
+        try:
+            self.db.execute("INSERT OR REPLACE INTO stamps VALUES (?, ?, ?, ?)", (path, size, mtime_ns, digest))
+        except self._sqlite.Error:
+            pass
+
+    def get(self, key: str):
+        try:
+            row = self.db.execute("SELECT body FROM bodies WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.db.execute("UPDATE bodies SET used = ? WHERE key = ?", (time.time_ns(), key))
+        except self._sqlite.Error:
+            return None
+        return row[0] if row else None
+
+    def put(self, key: str, body: str):
+        try:
+            self.db.execute("INSERT OR REPLACE INTO bodies VALUES (?, ?, ?, ?)",
+                            (key, body, len(body.encode("utf-8")), time.time_ns()))
+        except self._sqlite.Error:
+            pass
+
+    def commit(self):
+        try:
+            self.db.commit()
+        except self._sqlite.Error as e:
+            print(f"[WARN] Не удалось записать кэш содержимого: {e}")
+
+    def count(self, kind: str, hit: bool):
+        if hit:
+            self.hits[kind] += 1
+        else:
+            self.misses[kind] += 1
+
+    def close(self):
+        # LRU: самые давно использованные записи удаляются, пока кэш не влезет в лимит
+        try:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                for key, size in self.db.execute("SELECT key, size FROM bodies ORDER BY used"):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((key,))
+                    total -= size
+                self.db.executemany("DELETE FROM bodies WHERE key = ?", evict)
+            self.db.commit()
+        except self._sqlite.Error as e:
+            print(f"[WARN] Не удалось записать кэш содержимого: {e}")
+        finally:
+            self.db.close()
+
+    def summary(self) -> str:
+        parts = [f"{kind}: {self.hits[kind]} hits / {self.misses[kind]} misses"
+                 for kind in self.hits if self.hits[kind] or self.misses[kind]]
+        return ", ".join(parts) or "not used"
+
+
+_process_caches = {}
+
+
+def _process_content_cache(path: str) -> ContentCache:
+    # Воркер пула открывает своё соединение один раз и держит его до конца процесса
+    cache = _process_caches.get(path)
+    if cache is None:
+        cache = _process_caches[path] = ContentCache(Path(path))
+    return cache
+
+
+def _timed(timings, stage: str, fn, text: str, *args) -> str:
+    # Без статистики - просто вызов; объём этапов над текстом считается в символах
+    if timings is None:
+        return fn(text, *args)
+    started = _clock()
+    result = fn(text, *args)
+    timings.append((stage, *_elapsed(started), len(text), len(result)))
+    return result
+
+
+def _read_source(path: str, timings=None, limits: SizeLimits | None = None):
+    # Один проход: по префиксу решается, двоичный ли файл и в какой он кодировке, остальное дочитывается
+    # тем же дескриптором. Двоичный файл дальше префикса не читается, а от файла больше limits.max_file
+    # читаются только начало и конец - тогда вместо байтов возвращается _Truncated
+    started = _clock() if timings is not None else None
+    with open(path, "rb") as src:
+        data = src.read(SNIFF_SIZE)
+        encoding = sniff_encoding(data)
+        if encoding is None:
+            raise BinaryFileError(path)
+        size = os.fstat(src.fileno()).st_size if limits is not None and limits.max_file else 0
+        if size and size > limits.max_file:
+            data = _read_head_tail(src, data, size, encoding, limits)
+            volume = size - data.skipped
+        else:
+            data += src.read()
+            volume = len(data)
+    if started is not None:
+        timings.append(("read", *_elapsed(started), volume, volume))
+    return data, encoding
+
+
+def _read_head_tail(src, prefix: bytes, size: int, encoding: str, limits: SizeLimits) -> _Truncated:
+    head = prefix[:limits.head] if len(prefix) >= limits.head else prefix + src.read(limits.head - len(prefix))
+    # Конец выравнивается на ширину символа UTF-16/32, чтобы не начать с половины кодовой единицы
+    unit = 4 if "32" in encoding else 2 if "16" in encoding else 1
+    tail_start = max(size - limits.tail, len(head))
+    tail_start += -tail_start % unit
+    src.seek(tail_start)
+    tail = src.read() if tail_start < size else b""
+    text_encoding = _tail_encoding(head, encoding)
+    # Резать по строкам, если они есть: маркер обрезки тогда стоит между целыми строками. Режутся байты,
+    # чтобы "пропущено" в маркере считалось от того, что на самом деле осталось в выводе
+    pos, width = _line_break(head, text_encoding, unit, last=True)
+    if pos > 0:
+        head = head[:pos + width]
+    pos, width = _line_break(tail, text_encoding, unit, last=False)
+    if pos != -1 and pos + width < len(tail):
+        tail = tail[pos + width:]
+    decoder = codecs.getincrementaldecoder(encoding)()
+    head_text = decoder.decode(head).replace("\r\n", "\n").replace("\r", "\n")
+    # Незаконченный символ в конце начала в вывод не попал
+    head_kept = len(head) - len(decoder.getstate()[0])
+    tail_text, tail_skip = _decode_tail(tail, text_encoding, unit)
+    return _Truncated(head_text, tail_text, size, size - head_kept - (len(tail) - tail_skip))
+
+
+def _line_break(data: bytes, encoding: str, unit: int, last: bool):
+    # (начало, длина) последнего (last) или первого перевода строки в байтах; (-1, 0) - его нет.
+    # Совпадение не на границе кодовой единицы UTF-16/32 - это байты другого символа
+    best = -1
+    for char in "\n\r":
+        mark = char.encode(encoding)
+        pos = data.rfind(mark) if last else data.find(mark)
+        while pos != -1 and pos % unit:
+            pos = data.rfind(mark, 0, pos) if last else data.find(mark, pos + 1)
+        if pos != -1 and (best == -1 or (pos > best if last else pos < best)):
+            best = pos
+    if best == -1:
+        return -1, 0
+    crlf = "\r\n".encode(encoding)
+    return best, len(crlf) if data.startswith(crlf, best) else len(crlf) // 2
+
+
+def _tail_encoding(head: bytes, encoding: str) -> str:
+    # В середине файла BOM нет, поэтому порядок байтов берётся из BOM в начале
+    if encoding in ("utf-16", "utf-32"):
+        return encoding + ("-le" if head.startswith(codecs.BOM_UTF16_LE) else "-be")
+    return encoding
+
+
+def _decode_tail(data: bytes, encoding: str, unit: int):
+    # Начало куска может прийтись на середину символа UTF-8 (до 3 байт продолжения) или на вторую
+    # половину суррогатной пары UTF-16 - такие байты пропускаются, ошибка дальше - настоящая.
+    # Возвращает текст и число пропущенных байтов
+    error = None
+    for skip in range(0, 4, unit):
+        try:
+            return _decode_source(data[skip:], encoding), skip
+        except UnicodeDecodeError as e:
+            if e.start != 0:
+                raise
+            error = e
+    raise error
+
+
+def _decode_source(data: bytes, encoding: str, final: bool = True) -> str:
+    # Так же, как read_text(): строгое декодирование и универсальные переводы строк.
+    # final=False - кусок оборван, незаконченный последний символ отбрасывается
+    text = data.decode(encoding) if final else codecs.getincrementaldecoder(encoding)().decode(data)
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _transform_content(file_content: str, suffix: str, secret_rules: tuple, clear_for_ai_flag: bool,
+                       timings=None) -> str:
+    if clear_for_ai_flag:
+        content_sanitized = _timed(timings, "sanitize_content", sanitize_content, file_content, secret_rules)
+        file_content = _timed(timings, "clear_for_ai", clear_for_ai, content_sanitized, suffix)
+    elif secret_rules:
+        file_content = _timed(timings, "sanitize_content", sanitize_content, file_content, secret_rules)
+    return file_content
+
+
+def _load_cached_content(cache: ContentCache, file_abs_path: Path, suffix: str, secret_rules: tuple,
+                         clear_for_ai_flag: bool, timings=None, limits: SizeLimits | None = None):
+    path = str(file_abs_path)
+    st = os.stat(path)
+    if limits is not None and limits.max_file and st.st_size > limits.max_file:
+        # Хэш всего файла означал бы чтение всего файла; обрезанный обрабатывается дёшево и без кэша
+        return _load_file_content(file_abs_path, suffix, secret_rules, clear_for_ai_flag, timings, limits), None
+    options = (suffix, ",".join(secret_rules), clear_for_ai_flag)
+    digest = cache.digest_for(path, st.st_size, st.st_mtime_ns)
+    if digest is not None:
+        body = cache.get(cache.key(digest, *options))
+        if body is not None:
+            return body, True
+
+    data, encoding = _read_source(path, timings)
+    digest = hashlib.sha1(data).hexdigest()
+    key = cache.key(digest, *options)
+    # Файл трогали, но содержимое то же самое - трансформация всё равно не нужна
+    body = cache.get(key)
+    hit = body is not None
+    if not hit:
+        file_content = _decode_source(data, encoding)
+        body = _transform_content(file_content, suffix, secret_rules, clear_for_ai_flag, timings)
+        cache.put(key, body)
+    cache.remember_digest(path, st.st_size, st.st_mtime_ns, digest)
+    return body, hit
+
+
+def _load_file_content(file_abs_path: Path, suffix: str, secret_rules: tuple, clear_for_ai_flag: bool,
+                       timings=None, limits: SizeLimits | None = None):
+    data, encoding = _read_source(str(file_abs_path), timings, limits)
+    if isinstance(data, _Truncated):
+        # Начало и конец обрабатываются порознь: незакрытая строка или комментарий на обрезе
+        # не должны съесть другую часть
+        return data._replace(head=_transform_content(data.head, suffix, secret_rules, clear_for_ai_flag, timings),
+                             tail=_transform_content(data.tail, suffix, secret_rules, clear_for_ai_flag, timings))
+    return _transform_content(_decode_source(data, encoding), suffix, secret_rules, clear_for_ai_flag, timings)
+
+
+def _truncated_text(content: _Truncated, T: dict) -> str:
+    marker = T['truncated'].format(size=format_size(content.size), skipped=format_size(content.skipped))
+    head = content.head if not content.head or content.head.endswith("\n") else content.head + "\n"
+    return f"{head}[... {marker} ...]\n{content.tail}"
+
+
+def _iter_file_body(file_abs_path: Path, suffix: str, secret_rules: tuple, clear_for_ai_flag: bool,
+                    limits: SizeLimits | None = None, T: dict | None = None):
+    # Трансформациям нужен файл целиком, а без них содержимое идёт кусками фиксированного размера.
+    # С лимитом файл тоже читается сразу: он либо не больше лимита, либо от него остаются начало и конец
+    if secret_rules or clear_for_ai_flag or limits is not None:
+        file_content = _load_file_content(file_abs_path, suffix, secret_rules, clear_for_ai_flag, limits=limits)
+        if isinstance(file_content, _Truncated):
+            file_content = _truncated_text(file_content, T)
+        if file_content:
+            yield file_content
+        return
+    yield from _iter_text_chunks(file_abs_path)
+
+
+def _iter_text_chunks(file_abs_path: Path):
+    # Декодируем сами, чтобы знать смещение в байтах: ошибка посреди файла
+    # должна сообщать ту же позицию, что и read_text() целиком. Кодировку определяет первый, короткий кусок
+    offset = 0
+    with open(file_abs_path, "rb") as src:
+        data = src.read(SNIFF_SIZE)
+        encoding = sniff_encoding(data)
+        if encoding is None:
+            raise BinaryFileError(str(file_abs_path))
+        decoder = codecs.getincrementaldecoder(encoding)()
+        newlines = io.IncrementalNewlineDecoder(decoder, translate=True)
+        while True:
+            pending = len(decoder.getstate()[0])
+            try:
+                text = newlines.decode(data, final=not data)
+            except UnicodeDecodeError as e:
+                start = offset - pending + e.start
+                if e.end - e.start == 1:
+                    where = f"byte 0x{e.object[e.start]:02x} in position {start}"
+                else:
+                    where = f"bytes in position {start}-{start + e.end - e.start - 1}"
+                raise ValueError(f"'{e.encoding}' codec can't decode {where}: {e.reason}") from None
+            if text:
+                yield text
+            if not data:
+                return
+            offset += len(data)
+            data = src.read(MERGE_CHUNK_SIZE)
+
+
+def _text_section(export_format: str, T: dict, file_rel_path_str: str, suffix: str):
+    if export_format == 'md':
+        lang_tag = LANG_MAP.get(suffix, '')
+        return f"### `--- {T['file_header']}: {file_rel_path_str} ---`\n\n```{lang_tag}\n", "\n```\n\n"
+    return f"--- {T['file_header']}: {file_rel_path_str} ---\n\n", f"\n\n{'=' * 80}\n\n"
+
+
+def _load_files(batch, cache: ContentCache | None, timed: bool = False):
+    # Результат: (текст или _Truncated, ошибка, попадание в кэш или None, если кэш не участвовал,
+    # замеры этапов или None)
+    results = []
+    for file_abs_path, suffix, secret_rules, clear_for_ai_flag, limits in batch:
+        timings = [] if timed else None
+        try:
+            if cache is not None and (secret_rules or clear_for_ai_flag):
+                file_content, hit = _load_cached_content(cache, Path(file_abs_path), suffix, secret_rules,
+                                                         clear_for_ai_flag, timings, limits)
+            else:
+                file_content = _load_file_content(Path(file_abs_path), suffix, secret_rules, clear_for_ai_flag, timings,
+                                                  limits)
+                hit = None
+            results.append((file_content, None, hit, timings))
+        except BinaryFileError:
+            # Двоичный файл: ни текста, ни ошибки
+            results.append((None, None, None, timings))
+        except Exception as e:
+            # Исключение может не пережить pickle, поэтому наружу уходит только его текст
+            results.append((None, str(e), None, timings))
+        if cache is not None:
+            # Коммит после каждого файла: иначе другие процессы пула ждут блокировку записи
+            cache.commit()
+    return results
+
+
+def _load_file_batch(batch, cache_path: str | None = None, timed: bool = False):
+    return _load_files(batch, _process_content_cache(cache_path) if cache_path else None, timed)
+
+
+def _count_hits(results, cache: ContentCache | None):
+    for file_content, error, hit, timings in results:
+        if hit is not None:
+            cache.count("content", hit)
+        yield file_content, error, timings
+
+
+def _spawn_pool(jobs: int):
+    # multiprocessing нужен только при jobs > 1, поэтому импортируется здесь, а не при старте CLI
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _iter_loaded_files(load_args, jobs: int, cache: ContentCache | None = None, timed: bool = False, pool=None):
+    # pool - уже запущенный пул вызывающего: его процессы делятся с ним, а закрывает пул он сам
+    if jobs <= 1:
+        for args in load_args:
+            yield from _count_hits(_load_files([args], cache, timed), cache)
+        return
+    cache_path = str(cache.path) if cache is not None else None
+
+    # spawn, а не fork: сервер многопоточный, и форк посреди чужого лока может повиснуть
+    window = deque()
+    shared = pool is not None
+    if not shared:
+        pool = _spawn_pool(jobs)
+    try:
+        batch = []
+        for args in load_args:
+            batch.append(args)
+            if len(batch) == MERGE_BATCH_SIZE:
+                window.append(pool.submit(_load_file_batch, batch, cache_path, timed))
+                batch = []
+                # В полёте не больше двух пачек на процесс - память ограничена, порядок сохраняется
+                if len(window) >= jobs * 2:
+                    yield from _count_hits(window.popleft().result(), cache)
+        if batch:
+            window.append(pool.submit(_load_file_batch, batch, cache_path, timed))
+        while window:
+            yield from _count_hits(window.popleft().result(), cache)
+    finally:
+        if shared:
+            # Чужой пул продолжает работать: снимаем только свои пачки, которые уже не нужны
+            for future in window:
+                future.cancel()
+        else:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _LoadBudget:
+    # Загрузчик читает файлы наперёд. Как только полученный текст покрыл общий лимит, новых файлов он не
+    # получает: вывод с заголовками не меньше текста, значит, писатель к этому моменту тоже остановился
+    __slots__ = ("limit", "spent")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.spent = 0
+
+    def args(self, load_args):
+        for args in load_args:
+            if self.limit and self.spent >= self.limit:
+                return
+            yield args
+
+    def spend(self, file_content):
+        if isinstance(file_content, _Truncated):
+            self.spent += len(file_content.head) + len(file_content.tail)
+        elif file_content:
+            self.spent += len(file_content)
+
+
+def _replay_body(file_content, error: str | None, T: dict):
+    if error is not None:
+        raise RuntimeError(error)
+    if file_content is None:
+        raise BinaryFileError()
+    if isinstance(file_content, _Truncated):
+        file_content = _truncated_text(file_content, T)
+    if file_content:
+        yield file_content
+
+
+def _iter_text_bodies(project_path: Path, files_to_merge, secret_rules: tuple, clear_for_ai_flag: bool, jobs: int,
+                      cache: ContentCache | None = None, stats: MergeStats | None = None,
+                      limits: SizeLimits | None = None, T: dict | None = None):
+    ordered = sorted(files_to_merge)
+    # Корень уже разрешён вызывающим, поэтому без resolve() и лишних Path на каждый файл
+    root = str(project_path)
+    budget = _LoadBudget(limits.max_total if limits is not None else 0)
+    if limits is not None and not limits.max_file:
+        limits = None
+    if not (secret_rules or clear_for_ai_flag) and os.linesep == "\n":
+        # Без трансформаций файл копируется байтами; на Windows текстовый режим меняет \n на \r\n, там - декодирование.
+        # Файл больше лимита копировать целиком нельзя, от него читаются только начало и конец
+        for file_rel_path_str in ordered:
+            file_abs_path = os.path.join(root, file_rel_path_str)
+            if limits is not None and _file_size(file_abs_path) > limits.max_file:
+                yield file_rel_path_str, _iter_file_body(Path(file_abs_path), "", (), False, limits, T)
+            else:
+                yield file_rel_path_str, _PassThrough(file_abs_path)
+        return
+    # Со статистикой файл читается целиком через загрузчик: потоковое чтение перемешало бы чтение с записью
+    if stats is not None or ((jobs > 1 or cache is not None) and (secret_rules or clear_for_ai_flag)):
+        load_args = ((os.path.join(root, rel), os.path.splitext(rel)[1], secret_rules, clear_for_ai_flag, limits)
+                     for rel in ordered)
+        loaded = _iter_loaded_files(budget.args(load_args), jobs, cache, timed=stats is not None)
+        for file_rel_path_str, (file_content, error, timings) in zip(ordered, loaded):
+            budget.spend(file_content)
+            if timings is not None:
+                stats.add_file(file_rel_path_str, timings)
+            yield file_rel_path_str, _replay_body(file_content, error, T)
+        return
+    for file_rel_path_str in ordered:
+        file_abs_path = Path(os.path.join(root, file_rel_path_str))
+        yield file_rel_path_str, _iter_file_body(file_abs_path, os.path.splitext(file_rel_path_str)[1], secret_rules,
+                                                 clear_for_ai_flag, limits, T)
+
+
+def _file_size(file_abs_path: str) -> int:
+    # Ошибку доступа покажет чтение самого файла
+    try:
+        return os.stat(file_abs_path).st_size
+    except OSError:
+        return 0
+
+
+def _write_text_sections(f, sections, export_format: str, T: dict, progress=None, stats: MergeStats | None = None,
+                         max_total: int = 0):
+    # Возвращает число пройденных файлов: после max_total байт содержимого остальные не пишутся.
+    # Файл, на котором лимит перейдён, попадает целиком (в пределах лимита на файл). Лимит проверяется
+    # сразу после записи: следующий файл из sections уже не запрашивается, и загрузчик его не читает
+    start = f.tell() if max_total else 0
+    done = 0
+    for file_rel_path_str, body in sections:
+        done += 1
+        if stats is None:
+            _write_text_section(f, file_rel_path_str, body, export_format, T)
+        else:
+            started, position = _clock(), f.tell()
+            _write_text_section(f, file_rel_path_str, body, export_format, T)
+            size = f.tell() - position
+            # При копировании байтами чтение и запись идут одним проходом и меряются вместе
+            stage = "copy" if isinstance(body, _PassThrough) else "write"
+            stats.add_file(file_rel_path_str, [(stage, *_elapsed(started), size, size)])
+        if progress is not None:
+            progress.bytes_written = f.tell()
+            progress.step()
+        if max_total and f.tell() - start >= max_total:
+            break
+    return done
+
+
+def _limit_note(export_format: str, T: dict, skipped) -> str:
+    if export_format == 'md':
+        return f"## {T['total_limit']} ({len(skipped)})\n\n" + "".join(f"- `{rel}`\n" for rel in skipped) + "\n"
+    return (f"{'=' * 80}\n{T['total_limit']} ({len(skipped)})\n{'=' * 80}\n\n"
+            + "".join(f"- {rel}\n" for rel in skipped))
+
+
+def _write_text_section(f, file_rel_path_str: str, body, export_format: str, T: dict):
+    header, footer = _text_section(export_format, T, file_rel_path_str, Path(file_rel_path_str).suffix)
+    if isinstance(body, _PassThrough):
+        if _write_pass_through(f, body.path, header, footer):
+            return
+        body = _iter_text_chunks(Path(body.path))
+    try:
+        first = next(body, "")
+        second = next(body, "") if first else ""
+    except BinaryFileError:
+        f.write(f"{header}[{T['binary_file']}]{footer}")
+        return
+    except Exception as e:
+        f.write(f"{header}[{T['read_error']}: {e}]{footer}")
+        return
+    if not first:
+        return
+    if not second:
+        f.write(f"{header}{first}{footer}")
+        return
+
+    # Большой файл пишется по кускам; если чтение упадёт посередине, откатываемся к началу секции
+    section_start = f.tell()
+    f.write(header)
+    f.write(first)
+    f.write(second)
+    while True:
+        try:
+            chunk = next(body, None)
+        except Exception as e:
+            f.seek(section_start)
+            f.truncate()
+            f.write(f"{header}[{T['read_error']}: {e}]{footer}")
+            return
+        if chunk is None:
+            f.write(footer)
+            return
+        f.write(chunk)
+
+
+class _PassThrough(NamedTuple):
+    # Тело секции без трансформаций: файл копируется в вывод байтами, без str
+    path: str
+
+
+def _copy_text_bytes(data: bytes, src, out) -> bool:
+    # Проверка UTF-8 по ходу копирования: ASCII-кусок проверяется isascii() без декодирования,
+    # декодер включается только на кусках с не-ASCII байтами или с незаконченной последовательностью.
+    # \r\n и одиночный \r переводятся в \n, как это делает чтение в текстовом режиме
+    decoder = None
+    pending_cr = False
+    while data:
+        if not data.isascii() or (decoder is not None and decoder.getstate()[0]):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            try:
+                decoder.decode(data)
+            except UnicodeDecodeError:
+                return False
+        if pending_cr:
+            data = b"\r" + data
+            pending_cr = False
+        if b"\r" in data:
+            # \r в конце куска может оказаться началом \r\n, поэтому он ждёт следующий кусок
+            if data.endswith(b"\r"):
+                data = data[:-1]
+                pending_cr = True
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        out.write(data)
+        data = src.read(MERGE_COPY_SIZE)
+    if decoder is not None:
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+    if pending_cr:
+        out.write(b"\n")
+    return True
+
+
+def _write_pass_through(f, file_abs_path: str, header: str, footer: str) -> bool:
+    # False - секция откачена, и файл надо пройти обычным декодированием (битый UTF-8, ошибка чтения):
+    # так текст ошибки и позиция в нём остаются прежними
+    if not f.write_through:
+        f.flush()
+    out = f.buffer
+    section_start = out.tell()
+    try:
+        with open(file_abs_path, "rb") as src:
+            data = src.read(SNIFF_SIZE)
+            if not data:
+                return True
+            # Двоичные файлы и не-UTF-8 текст уходят на путь с декодированием, он и разберётся
+            if sniff_encoding(data) != "utf-8":
+                return False
+            f.write(header)
+            if not f.write_through:
+                f.flush()
+            copied = _copy_text_bytes(data, src, out)
+    except OSError:
+        copied = False
+    if copied:
+        f.write(footer)
+        return True
+    out.seek(section_start)
+    out.truncate()
+    return False
+
+
+PDF_SECTION_FILES = 200
+# Секция короче этого объёма HTML не отрезается: каждая секция начинается с новой страницы, а вёрстка
+# небольшого куска в отдельном процессе не окупает разрыва
+PDF_SECTION_MIN_BYTES = 2 * 1024 * 1024
+_lexer_cache = {}
+_lexer_name_globs = None
+_pdf_formatter = None
+
+
+def _lexer_for(filename: str):
+    # get_lexer_for_filename перебирает шаблоны всех лексеров на каждый вызов, поэтому лексер кэшируется.
+    # Ключ - расширение, кроме имён под особые шаблоны Pygments (Makefile, CMakeLists.txt, *.html.j2)
+    global _lexer_name_globs
+    from pygments.lexers import get_all_lexers, get_lexer_for_filename, TextLexer
+    if _lexer_name_globs is None:
+        globs = {glob for _, _, filenames, _ in get_all_lexers() for glob in filenames}
+        _lexer_name_globs = _compile_globs(sorted(g for g in globs if not re.fullmatch(r'\*\.[^.*?\[]+', g)))
+    name = os.path.basename(filename)
+    ext = os.path.splitext(name)[1]
+    key = name if not ext or (_lexer_name_globs and _lexer_name_globs(name)) else ext
+    lexer = _lexer_cache.get(key)
+    if lexer is None:
+        try:
+            lexer = get_lexer_for_filename(name, stripall=True)
+        except Exception:
+            lexer = TextLexer()
+        _lexer_cache[key] = lexer
+    return lexer
+
+
+def _get_pdf_formatter():
+    global _pdf_formatter
+    if _pdf_formatter is None:
+        from pygments.formatters import HtmlFormatter
+        _pdf_formatter = HtmlFormatter(linenos=True, cssclass="highlight")
+    return _pdf_formatter
+
+
+def _pdf_head_html(project_name: str, T: dict):
+    pygments_css = _get_pdf_formatter().get_style_defs('.highlight')
+    return (
+        '<!DOCTYPE html>', '<html lang="en">', '<head><meta charset="UTF-8">',
+        f'<title>{T["project_build"]}: {project_name}</title>',
+        '<style>', 'body { font-family: sans-serif; }', 'h1, h2, h3 { color: #333; }',
+        'pre { white-space: pre-wrap; word-wrap: break-word; background-color: #f8f8f8; border: 1px solid #ddd; padding: 10px; border-radius: 5px; }',
+        'code { font-family: monospace; }', pygments_css, '</style>', '</head><body>'
+    )
+
+
+def _pdf_intro_html(project_name: str, file_tree_str: str, T: dict, deleted=()):
+    yield f'<h1>{T["project_build"]}: {project_name}</h1>'
+    yield f'<h2>{T["project_structure"]}</h2>'
+    yield f'<pre><code>{file_tree_str}</code></pre>'
+    if deleted:
+        yield f'<h2>{T["deleted_files"]}</h2>'
+        yield '<pre><code>' + "\n".join(deleted) + '</code></pre>'
+    yield f'<h2>{T["file_contents"]}</h2>'
+
+
+def _iter_pdf_file_html(project_path: Path, files_to_merge, T: dict, secret_rules: tuple, clear_for_ai_flag: bool,
+                        jobs: int = 1, cache: ContentCache | None = None, progress=None, stats: MergeStats | None = None,
+                        limits: SizeLimits | None = None, pool=None):
+    import pygments
+    from pygments import highlight
+
+    formatter = _get_pdf_formatter()
+    ordered = sorted(files_to_merge)
+    root = str(project_path)
+    # Общий лимит в PDF считается по тексту файлов: размер HTML с подсветкой к контексту модели отношения не имеет
+    max_total = limits.max_total if limits is not None else 0
+    total = 0
+    budget = _LoadBudget(max_total)
+    if limits is not None and not limits.max_file:
+        limits = None
+    load_args = ((os.path.join(root, rel), os.path.splitext(rel)[1], secret_rules, clear_for_ai_flag, limits)
+                 for rel in ordered)
+    loaded = zip(ordered, _iter_loaded_files(budget.args(load_args), jobs, cache, timed=stats is not None, pool=pool))
+    if progress is not None:
+        loaded = progress.track(loaded)
+    for index, file_rel_path_str in enumerate(ordered):
+        # Лимит проверяется до запроса следующего файла, чтобы загрузчик его не читал
+        if max_total and total >= max_total:
+            skipped = ordered[index:]
+            print(f"[WARN] Total size limit reached, {len(skipped)} files not included.")
+            yield file_rel_path_str, (f'<h2>{T["total_limit"]} ({len(skipped)})</h2>'
+                                      + '<pre><code>' + "\n".join(skipped) + '</code></pre>')
+            return
+        _, (file_content, error, timings) = next(loaded)
+        budget.spend(file_content)
+        if timings is not None:
+            stats.add_file(file_rel_path_str, timings)
+        header = f'<h3><code>--- {T["file_header"]}: {file_rel_path_str} ---</code></h3>'
+        try:
+            if error is not None:
+                raise RuntimeError(error)
+            if file_content is None:
+                yield file_rel_path_str, header + f'<pre>[{T["binary_file"]}]</pre>'
+                continue
+            if isinstance(file_content, _Truncated):
+                file_content = _truncated_text(file_content, T)
+            if not file_content: continue
+            if max_total:
+                total += len(file_content.encode("utf-8"))
+            highlighted_code = None
+            if cache is not None:
+                # Лексер выбирается по имени файла, поэтому имя входит в ключ вместе с версией Pygments
+                key = cache.key("highlight", pygments.__version__, Path(file_rel_path_str).name,
+                                hashlib.sha1(file_content.encode("utf-8")).hexdigest())
+                highlighted_code = cache.get(key)
+                cache.count("highlight", highlighted_code is not None)
+            if highlighted_code is None:
+                if stats is None:
+                    highlighted_code = highlight(file_content, _lexer_for(file_rel_path_str), formatter)
+                else:
+                    started = _clock()
+                    highlighted_code = highlight(file_content, _lexer_for(file_rel_path_str), formatter)
+                    stats.add_file(file_rel_path_str, [("highlight", *_elapsed(started), len(file_content),
+                                                        len(highlighted_code))])
+                if cache is not None:
+                    cache.put(key, highlighted_code)
+            if cache is not None:
+                cache.commit()
+            yield file_rel_path_str, header + highlighted_code
+        except Exception as e:
+            yield file_rel_path_str, header + f'<pre>[{T["read_error"]}: {e}]</pre>'
+
+
+def _iter_pdf_html(project_path: Path, files_to_merge, project_name: str, file_tree_str: str, T: dict,
+                   secret_rules: tuple, clear_for_ai_flag: bool, jobs: int = 1, cache: ContentCache | None = None,
+                   deleted=(), progress=None, stats: MergeStats | None = None, limits: SizeLimits | None = None):
+    yield from _pdf_head_html(project_name, T)
+    yield from _pdf_intro_html(project_name, file_tree_str, T, deleted)
+    for _, html in _iter_pdf_file_html(project_path, files_to_merge, T, secret_rules, clear_for_ai_flag, jobs, cache,
+                                       progress, stats, limits):
+        yield html
+    yield '</body></html>'
+
+
+def _render_pdf_section(html_path: str, pdf_path: str):
+    # Возвращает стену и CPU процесса-вёрстальщика, чтобы родитель мог учесть их в статистике
+    started = _clock()
+    from weasyprint import HTML
+    HTML(filename=html_path).write_pdf(pdf_path)
+    return _elapsed(started)
+
+
+def _iter_pdf_outline(reader, outline, level: int):
+    # Вложенный список pypdf: за пунктом идёт список его детей
+    for item in outline:
+        if isinstance(item, list):
+            yield from _iter_pdf_outline(reader, item, level + 1)
+        else:
+            yield level, item, reader.get_destination_page_number(item)
+
+
+def _concat_pdf_sections(pdf_paths, output_filepath):
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import Fit
+
+    writer = PdfWriter()
+    parents = []
+    for index, pdf_path in enumerate(pdf_paths):
+        reader = PdfReader(pdf_path)
+        offset = len(writer.pages)
+        writer.append(reader, import_outline=False)
+        if index == 0 and reader.metadata:
+            writer.add_metadata(reader.metadata)
+        # Оглавление собирается заново: в первой секции h1 > h2 > h3, в остальных только h3 файлов,
+        # которые должны встать под "Содержимое файлов" из первой
+        base = 0 if index == 0 else 2
+        for level, item, page in _iter_pdf_outline(reader, reader.outline, base):
+            del parents[level:]
+            fit = Fit.xyz(left=item.left, top=item.top, zoom=item.zoom)
+            parents.append(writer.add_outline_item(item.title, offset + page, parent=parents[-1] if parents else None,
+                                                   fit=fit))
+    with open(output_filepath, "wb") as out:
+        writer.write(out)
+
+
+def _pdf_section_key(file_rel_path_str: str):
+    return file_rel_path_str.split(os.sep, 1)[0]
+
+
+def _write_pdf_parallel(project_path: Path, files_to_merge, project_name: str, file_tree_str: str, T: dict,
+                        secret_rules: tuple, clear_for_ai_flag: bool, jobs: int, cache: ContentCache | None,
+                        deleted, progress, output_filepath, work_dir: Path, stats: MergeStats | None = None,
+                        limits: SizeLimits | None = None):
+    # Подсветка идёт здесь по порядку, а готовые секции HTML сразу уходят на вёрстку WeasyPrint в процессы.
+    # Секция режется на границе папки верхнего уровня, как только набрала PDF_SECTION_FILES файлов
+    # и PDF_SECTION_MIN_BYTES HTML. Секции верстаются независимо, поэтому каждая начинается с новой страницы:
+    # это цена параллельной вёрстки, документ выходит длиннее не больше чем на страницу на секцию.
+    # Если весь HTML уместился в одну секцию, она верстается одним документом с той же раскладкой, что у jobs=1.
+    # Чтение файлов и вёрстка идут в одном пуле, так что процессов всего jobs
+    from concurrent.futures import wait
+
+    head = "".join(_pdf_head_html(project_name, T))
+    pool = _spawn_pool(jobs)
+    futures = []
+    pdf_paths = []
+    try:
+        def submit(html_file):
+            html_file.write('</body></html>')
+            html_file.close()
+            pdf_path = work_dir / f"section-{len(pdf_paths):05d}.pdf"
+            pdf_paths.append(str(pdf_path))
+            futures.append(pool.submit(_render_pdf_section, html_file.name, str(pdf_path)))
+
+        def open_section():
+            html_file = open(work_dir / f"section-{len(pdf_paths):05d}.html", "w", encoding="utf-8")
+            html_file.write(head)
+            return html_file
+
+        html_file = open_section()
+        html_file.write("".join(_pdf_intro_html(project_name, file_tree_str, T, deleted)))
+        count, last_key, written = 0, None, 0
+        for file_rel_path_str, html in _iter_pdf_file_html(project_path, files_to_merge, T, secret_rules,
+                                                           clear_for_ai_flag, jobs, cache, progress, stats, limits,
+                                                           pool):
+            key = _pdf_section_key(file_rel_path_str)
+            if (count >= PDF_SECTION_FILES and html_file.tell() >= PDF_SECTION_MIN_BYTES
+                    and (key != last_key or count >= 2 * PDF_SECTION_FILES)):
+                written += html_file.tell()
+                submit(html_file)
+                html_file = open_section()
+                count = 0
+            html_file.write(html)
+            count += 1
+            last_key = key
+            if progress is not None:
+                progress.bytes_written = written + html_file.tell()
+        if not pdf_paths:
+            html_file.write('</body></html>')
+            html_file.close()
+            print("[INFO] HTML generated. Starting PDF conversion...")
+            wall, cpu = _render_pdf_section(html_file.name, str(output_filepath))
+            if stats is not None:
+                stats.add("render", wall, cpu, os.path.getsize(html_file.name), os.path.getsize(output_filepath))
+            return
+        submit(html_file)
+        print(f"[INFO] HTML generated. Rendering {len(futures)} PDF sections in {jobs} processes...")
+        for future, pdf_path in zip(futures, pdf_paths):
+            while not wait([future], timeout=0.5).done:
+                if progress is not None:
+                    progress.check()
+            wall, cpu = future.result()
+            if stats is not None:
+                stats.add("render", wall, cpu, os.path.getsize(Path(pdf_path).with_suffix(".html")),
+                          os.path.getsize(pdf_path))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    started = _clock()
+    _concat_pdf_sections(pdf_paths, output_filepath)
+    if stats is not None:
+        stats.stop("concat", started, sum(map(os.path.getsize, pdf_paths)), os.path.getsize(output_filepath),
+                   count=len(pdf_paths))
+
+
+SHARD_FILE_OVERHEAD = 128
+SHARD_HEADER_SIZE = 1024
+SHARDS_VERSION = 1
+
+
+class Shard(NamedTuple):
+    files: list
+    size: int
+
+
+def plan_shards(project_path: Path, files_to_merge, limits: SizeLimits, workers: int = 1):
+    # Отсортированный список режется на части не больше limits.shard по оценке: исходник (от файла больше
+    # лимита на файл - начало и конец, от двоичного - ничего) плюс заголовок секции и строка дерева.
+    # Папка, которая влезает в часть, не разрывается, не влезающая делится по подпапкам.
+    # Файл больше предела занимает часть один
+    ordered = sorted(files_to_merge)
+    budget = max(1, limits.shard - SHARD_HEADER_SIZE)
+    entries = []
+    for rel, (kind, size) in zip(ordered, _sniff_batched(project_path, ordered, workers)):
+        if kind == "binary" or size is None:
+            size = 0
+        elif limits.max_file:
+            size = min(size, limits.max_file)
+        entries.append((rel.split(os.sep), rel, size + 2 * len(rel) + SHARD_FILE_OVERHEAD))
+    parts, sizes = [[]], [0]
+
+    def place(group, depth):
+        # Пути отсортированы, поэтому содержимое папки идёт подряд и groupby собирает его целиком
+        for _, items in groupby(group, key=lambda entry: entry[0][depth]):
+            items = list(items)
+            cost = sum(entry[2] for entry in items)
+            if sizes[-1] + cost > budget and parts[-1]:
+                # Под папку новая часть заводится, только если текущая заполнена хотя бы наполовину,
+                # иначе при папках чуть больше половины предела частей стало бы вдвое больше
+                if len(items) == 1 or (cost <= budget and sizes[-1] >= budget // 2):
+                    parts.append([])
+                    sizes.append(0)
+            if sizes[-1] + cost <= budget or len(items) == 1:
+                parts[-1].extend(entry[1] for entry in items)
+                sizes[-1] += cost
+            else:
+                place(items, depth + 1)
+
+    place(entries, 0)
+    return [Shard(files, size + SHARD_HEADER_SIZE) for files, size in zip(parts, sizes) if files]
+
+
+def shard_paths(output_filepath, count: int):
+    # project.txt -> project.part001.txt, project.part002.txt, ...
+    output_filepath = Path(output_filepath)
+    width = max(3, len(str(count)))
+    return [output_filepath.with_name(f"{output_filepath.stem}.part{index:0{width}d}{output_filepath.suffix}")
+            for index in range(1, count + 1)]
+
+
+def shards_manifest_path(output_filepath) -> Path:
+    output_filepath = Path(output_filepath)
+    return output_filepath.with_name(f"{output_filepath.stem}.shards.json")
+
+
+def _shard_delta(delta: MergeDelta, files, first: bool) -> MergeDelta:
+    # Удалённые файлы перечисляются один раз, в первой части
+    chosen = set(files)
+    return MergeDelta([rel for rel in delta.added if rel in chosen], [rel for rel in delta.changed if rel in chosen],
+                      delta.deleted if first else [], delta.baseline)
+
+
+class _ShardProgress:
+    # Прогресс части пишется в общий счётчик задачи: start не сбрасывает итог, байты идут после готовых частей
+    __slots__ = ("progress", "written")
+
+    def __init__(self, progress, written: int):
+        self.progress = progress
+        self.written = written
+
+    def start(self, total: int):
+        self.progress.check()
+
+    def step(self):
+        self.progress.step()
+
+    def check(self):
+        self.progress.check()
+
+    def track(self, items):
+        return self.progress.track(items)
+
+    @property
+    def bytes_written(self):
+        return self.progress.bytes_written - self.written
+
+    @bytes_written.setter
+    def bytes_written(self, value: int):
+        self.progress.bytes_written = self.written + value
+
+
+def _merge_shard(merge: dict, cache_path: str | None = None, cache_mb: int = CONTENT_CACHE_MB, timed: bool = False):
+    # Воркер пула: часть склеивается обычным _perform_merge в одном процессе. Вывод в консоль собирается,
+    # наверх уходят только предупреждения, иначе строки параллельных частей перемешались бы
+    log = io.StringIO()
+    stats = MergeStats() if timed else None
+    cache = None
+    with contextlib.redirect_stdout(log):
+        try:
+            cache = ContentCache.open(cache_mb, Path(cache_path)) if cache_path else None
+            _perform_merge(**merge, jobs=1, content_cache=cache, progress=None, stats=stats)
+        finally:
+            if cache is not None:
+                cache.close()
+    hits = (cache.hits, cache.misses) if cache is not None else None
+    return stats, hits, [line for line in log.getvalue().splitlines() if line.startswith("[WARN]")]
+
+
+def _perform_sharded_merge(project_path, files_to_merge, output_filepath, export_format, lang, remove_secrets,
+                           clear_for_ai_flag, jobs, secret_rules, content_cache, delta, progress, stats, limits):
+    # Каждая часть - самостоятельный документ со своим деревом. Части пишутся одновременно в jobs процессах,
+    # манифест рядом с ними говорит, какой файл в какой части
+    from concurrent.futures import wait
+
+    if delta is not None:
+        files_to_merge = delta.added + delta.changed
+    started = _clock() if stats is not None else None
+    shards = plan_shards(project_path, files_to_merge, limits, jobs)
+    if not shards and delta is not None and delta.deleted:
+        # Дельта из одних удалений - всё равно одна часть со списком удалённых, иначе после сохранения
+        # нового манифеста о них нигде не останется следа
+        shards = [Shard([], SHARD_HEADER_SIZE)]
+    if started is not None:
+        stats.stop("shard_plan", started, count=len(files_to_merge))
+    paths = shard_paths(output_filepath, len(shards))
+    print(f"[INFO] Splitting {len(files_to_merge)} files into {len(shards)} parts of up to {format_size(limits.shard)}.")
+    over = sum(1 for shard in shards if shard.size > limits.shard)
+    if over:
+        print(f"[WARN] {over} parts exceed the limit: each holds a single larger file (see max_file_size).")
+    if progress is not None:
+        progress.start(len(files_to_merge))
+    merges = [{"project_path": project_path, "files_to_merge": shard.files, "output_filepath": path,
+               "export_format": export_format, "lang": lang, "remove_secrets": remove_secrets,
+               "clear_for_ai_flag": clear_for_ai_flag, "secret_rules": secret_rules,
+               "delta": _shard_delta(delta, shard.files, index == 0) if delta is not None else None,
+               "limits": limits, "part": (index + 1, len(shards))}
+              for index, (shard, path) in enumerate(zip(shards, paths))]
+    written = 0
+    if jobs <= 1 or len(merges) == 1:
+        for merge in merges:
+            _perform_merge(**merge, jobs=jobs, content_cache=content_cache, stats=stats,
+                           progress=_ShardProgress(progress, written) if progress is not None else None)
+            written += os.path.getsize(merge["output_filepath"])
+    else:
+        print(f"[INFO] Writing {len(merges)} parts in {min(jobs, len(merges))} processes...")
+        cache_path = str(content_cache.path) if content_cache is not None else None
+        cache_mb = content_cache.max_bytes // (1024 * 1024) if content_cache is not None else CONTENT_CACHE_MB
+        pool = _spawn_pool(min(jobs, len(merges)))
+        try:
+            futures = [pool.submit(_merge_shard, merge, cache_path, cache_mb, stats is not None) for merge in merges]
+            for merge, future in zip(merges, futures):
+                while not wait([future], timeout=0.5).done:
+                    if progress is not None:
+                        progress.check()
+                shard_stats, hits, warnings = future.result()
+                for line in warnings:
+                    print(line)
+                if shard_stats is not None:
+                    stats.merge(shard_stats, files=True)
+                if hits is not None and content_cache is not None:
+                    for kind in content_cache.hits:
+                        content_cache.hits[kind] += hits[0].get(kind, 0)
+                        content_cache.misses[kind] += hits[1].get(kind, 0)
+                written += os.path.getsize(merge["output_filepath"])
+                if progress is not None:
+                    for _ in merge["files_to_merge"]:
+                        progress.step()
+                    progress.bytes_written = written
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    manifest = {"version": SHARDS_VERSION, "project": project_path.name, "format": export_format,
+                "shard_size": limits.shard,
+                "shards": [{"path": path.name, "files": shard.files, "estimated_bytes": shard.size,
+                            "estimated_tokens": shard.size // TOKEN_BYTES, "bytes": os.path.getsize(path)}
+                           for shard, path in zip(shards, paths)]}
+    if delta is not None:
+        manifest["deleted"] = delta.deleted
+    manifest_path = shards_manifest_path(output_filepath)
+    manifest_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[SUCCESS] {len(shards)} parts written, manifest: {manifest_path.name}.")
+    return manifest
+
+
+def perform_merge_logic(project_path, files_to_merge, output_filepath, export_format, lang, remove_secrets, clear_for_ai_flag,
+                        jobs=1, secret_rules=None, content_cache=None, delta=None, progress=None, stats=None,
+                        limits=None):
+    # С пределом части вывод режется на части, и возвращается их манифест
+    try:
+        if limits is not None and limits.shard:
+            return _perform_sharded_merge(project_path, files_to_merge, output_filepath, export_format, lang,
+                                          remove_secrets, clear_for_ai_flag, jobs, secret_rules, content_cache,
+                                          delta, progress, stats, limits)
+        _perform_merge(project_path, files_to_merge, output_filepath, export_format, lang, remove_secrets,
+                       clear_for_ai_flag, jobs, secret_rules, content_cache, delta, progress, stats, limits)
+    finally:
+        if content_cache is not None:
+            content_cache.close()
+            print(f"[INFO] Content cache: {content_cache.summary()}.")
+
+
+def _perform_merge(project_path, files_to_merge, output_filepath, export_format, lang, remove_secrets, clear_for_ai_flag,
+                   jobs, secret_rules, content_cache, delta, progress, stats, limits, part=None):
+    project_name = project_path.name
+    secret_rules = tuple(secret_rules or DEFAULT_SECRET_RULES) if remove_secrets or clear_for_ai_flag else ()
+    T = FILE_CONTENT_TRANSLATIONS.get(lang, FILE_CONTENT_TRANSLATIONS['ru'])
+    if part is not None:
+        project_name = f"{project_name} ({T['part']} {part[0]}/{part[1]})"
+    deleted = []
+    started = _clock() if stats is not None else None
+    if delta is None:
+        file_tree_str = generate_text_tree(files_to_merge)
+    else:
+        # В дельте склеиваются только новые и изменённые файлы, удалённые видны в дереве и отдельным списком
+        files_to_merge = delta.added + delta.changed
+        deleted = delta.deleted
+        project_name = f"{project_name} ({T['delta_since']} {delta.baseline})"
+        file_tree_str = f"{generate_text_tree(files_to_merge + deleted, delta.marks())}\n\n{T['delta_legend']}"
+    if started is not None:
+        stats.stop("tree", started, size_out=len(file_tree_str), count=len(files_to_merge) + len(deleted))
+    if progress is not None:
+        progress.start(len(files_to_merge))
+
+    if export_format == 'pdf':
+        print("[INFO] PDF export selected. Importing WeasyPrint and Pygments...")
+        try:
+            from weasyprint import HTML
+            import pygments  # noqa: F401
+            print("[SUCCESS] Libraries imported.")
+        except ImportError:
+            raise ImportError("WeasyPrint or Pygments not installed. Run 'pip install WeasyPrint Pygments'.")
+
+        parallel = jobs > 1 and len(files_to_merge) > PDF_SECTION_FILES
+        if parallel:
+            try:
+                import pypdf  # noqa: F401
+            except ImportError:
+                print("[WARN] pypdf not installed, rendering PDF in a single process. Run 'pip install pypdf'.")
+                parallel = False
+        if parallel:
+            import shutil
+
+            work_dir = Path(output_filepath).with_name(f".{Path(output_filepath).name}.{os.getpid()}.sections")
+            work_dir.mkdir(parents=True, exist_ok=True)
+            try:
+                _write_pdf_parallel(project_path, files_to_merge, project_name, file_tree_str, T, secret_rules,
+                                    clear_for_ai_flag, jobs, content_cache, deleted, progress, output_filepath,
+                                    work_dir, stats, limits)
+                if progress is not None:
+                    progress.bytes_written = os.path.getsize(output_filepath)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            print("[SUCCESS] PDF file written successfully.")
+            return
+
+        # HTML не собирается в одну строку в памяти, а пишется во временный файл по мере подсветки
+        html_path = Path(output_filepath).with_name(f".{Path(output_filepath).name}.{os.getpid()}.html")
+        try:
+            with open(html_path, "w", encoding="utf-8") as html_file:
+                for part in _iter_pdf_html(project_path, files_to_merge, project_name, file_tree_str, T,
+                                           secret_rules, clear_for_ai_flag, jobs, content_cache, deleted, progress,
+                                           stats, limits):
+                    html_file.write(part)
+                    if progress is not None:
+                        progress.bytes_written = html_file.tell()
+            print("[INFO] HTML generated. Starting PDF conversion...")
+            started = _clock()
+            HTML(filename=str(html_path)).write_pdf(output_filepath)
+            if stats is not None:
+                stats.stop("render", started, os.path.getsize(html_path), os.path.getsize(output_filepath))
+            if progress is not None:
+                progress.bytes_written = os.path.getsize(output_filepath)
+        finally:
+            html_path.unlink(missing_ok=True)
+        print("[SUCCESS] PDF file written successfully.")
+
+    else:
+        print(f"[INFO] {export_format.upper()} export selected. Starting file write...")
+        with open(output_filepath, "w", encoding="utf-8", errors="ignore") as f:
+            # Текст сразу уходит в двоичный буфер: тела файлов пишутся туда же байтами, и порядок не должен путаться
+            f.reconfigure(write_through=True)
+            if export_format == 'md':
+                f.write(
+                    f"# {T['project_build']}: {project_name}\n\n## {T['project_structure']}\n\n```\n{file_tree_str}\n```\n\n")
+                if deleted:
+                    f.write(f"## {T['deleted_files']}\n\n" + "".join(f"- `{rel}`\n" for rel in deleted) + "\n")
+                f.write(f"## {T['file_contents']}\n\n")
+            else:
+                f.write(
+                    f"{T['project_build']}: {project_name}\n{'=' * 80}\n{T['project_structure']}\n{'=' * 80}\n\n{file_tree_str}\n\n")
+                if deleted:
+                    f.write(f"{'=' * 80}\n{T['deleted_files']}\n{'=' * 80}\n\n" + "".join(f"- {rel}\n" for rel in deleted) + "\n")
+                f.write(f"{'=' * 80}\n{T['file_contents']}\n{'=' * 80}\n\n")
+            sections = _iter_text_bodies(project_path, files_to_merge, secret_rules, clear_for_ai_flag, jobs,
+                                         content_cache, stats, limits, T)
+            done = _write_text_sections(f, sections, export_format, T, progress, stats,
+                                        limits.max_total if limits is not None else 0)
+            # Закрытие останавливает загрузчик, если лимит оборвал склейку раньше
+            sections.close()
+            if done < len(files_to_merge):
+                skipped = sorted(files_to_merge)[done:]
+                print(f"[WARN] Total size limit reached, {len(skipped)} files not included.")
+                f.write(_limit_note(export_format, T, skipped))
+        print(f"[SUCCESS] {export_format.upper()} file written successfully.")
+
+def generate_text_tree(selected_files, marks=None):
+    tree = {}
+    labels = {}
+    for path_str in selected_files:
+        parts = Path(path_str).parts
+        current_level = tree
+        for part in parts:
+            if part not in current_level:
+                current_level[part] = {}
+            current_level = current_level[part]
+        if marks and path_str in marks:
+            labels[parts] = f"{parts[-1]} {marks[path_str]}"
+
+    def build_lines(d, prefix="", parents=()):
+        lines = []
+        items = sorted(d.keys())
+        for i, name in enumerate(items):
+            connector = "└── " if i == len(items) - 1 else "├── "
+            lines.append(f"{prefix}{connector}{labels.get(parents + (name,), name)}")
+            if d[name]:
+                new_prefix = prefix + ("    " if i == len(items) - 1 else "│   ")
+                lines.extend(build_lines(d[name], new_prefix, parents + (name,)))
+        return lines
+
+    return "\n".join(build_lines(tree))
+
+def run_cli():
+    parser = argparse.ArgumentParser(description="Project Merger Tool - CLI Mode")
+    parser.add_argument("--path", "-p", type=str, default=".", help="Путь к папке проекта (по умолчанию текущая)")
+    parser.add_argument("--output", "-o", type=str, help="Путь к выходному файлу (по умолчанию: <имя_папки>.txt)")
+    parser.add_argument("--format", "-f", choices=['txt', 'md', 'pdf'], default="txt", help="Формат вывода (txt, md, pdf)")
+    parser.add_argument("--lang", "-l", choices=['ru', 'en'], default="en", help="Язык заголовков (ru, en)")
+    parser.add_argument("--no-gitignore", action="store_true", help="Не использовать .gitignore")
+    parser.add_argument("--remove-secrets", action="store_true", help="Удалять секреты (ключи, токены)")
+    parser.add_argument("--secret-rules", type=str, default=",".join(DEFAULT_SECRET_RULES),
+                        help=f"Правила поиска секретов через запятую. Доступны: {', '.join(SECRET_RULES)}")
+    parser.add_argument("--clear-ai", action="store_true", help="Очистка для ИИ (удалить комментарии и пустые строки)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="Число процессов для чтения, удаления секретов и очистки для ИИ (по умолчанию 1)")
+    parser.add_argument("--scan-workers", type=int, default=1, metavar="N",
+                        help="Число потоков для параллельного сканирования (по умолчанию 1 - последовательно)")
+    parser.add_argument("--source", choices=['fs', 'git'], default="fs",
+                        help="Откуда брать список файлов: обход диска (fs) или индекс git (git, отслеживаемые файлы)")
+    parser.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                        help="Склеить только файлы по шаблону в синтаксисе .gitignore (\"/src/\", \"*.py\"), можно повторять")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="Исключить файлы по шаблону в синтаксисе .gitignore (\"**/tests/\"), можно повторять")
+    parser.add_argument("--scan-index", action="store_true",
+                        help="Использовать кэш сканирования: пересканируются только изменившиеся папки")
+    delta_group = parser.add_mutually_exclusive_group()
+    delta_group.add_argument("--delta-manifest", type=str, metavar="FILE",
+                             help="Склеить только изменения относительно манифеста прошлого запуска (манифест обновляется)")
+    delta_group.add_argument("--delta-git", type=str, metavar="REV",
+                             help="Склеить только изменения относительно ревизии git (коммит, ветка, тег)")
+    parser.add_argument("--content-cache", action="store_true",
+                        help="Кэшировать обработанное содержимое файлов (секреты, очистка для ИИ, подсветка PDF) между запусками")
+    parser.add_argument("--content-cache-mb", type=int, default=CONTENT_CACHE_MB, metavar="MB",
+                        help=f"Предельный размер кэша содержимого, старые записи вытесняются (по умолчанию {CONTENT_CACHE_MB})")
+    parser.add_argument("--stats", action="store_true",
+                        help="Напечатать время по этапам (обход, .gitignore, чтение, секреты, очистка, подсветка, вёрстка, запись) и самые медленные файлы")
+    parser.add_argument("--stats-json", type=str, metavar="FILE",
+                        help="Записать ту же статистику в JSON-файл")
+    parser.add_argument("--stats-top", type=int, default=STATS_TOP_FILES, metavar="N",
+                        help=f"Сколько самых медленных файлов показывать в статистике (по умолчанию {STATS_TOP_FILES})")
+    # Лимиты размера перекрывают "limits" из merger_exclusions.json; 0 снимает лимит
+    parser.add_argument("--max-file-size", type=str, metavar="SIZE",
+                        help="Файлы больше SIZE (500K, 2M) обрезаются: остаются начало и конец с пометкой об обрезке")
+    parser.add_argument("--max-file-tokens", type=str, metavar="N",
+                        help=f"То же в оценочных токенах (~{TOKEN_BYTES} байта на токен)")
+    parser.add_argument("--head-size", type=str, metavar="SIZE",
+                        help="Сколько оставить от начала обрезанного файла (по умолчанию 3/4 лимита)")
+    parser.add_argument("--tail-size", type=str, metavar="SIZE",
+                        help="Сколько оставить от конца обрезанного файла (по умолчанию остаток лимита)")
+    parser.add_argument("--max-total-size", type=str, metavar="SIZE",
+                        help="Общий объём содержимого: после него файлы не пишутся, их список идёт в конце")
+    parser.add_argument("--max-total-tokens", type=str, metavar="N",
+                        help="То же в оценочных токенах")
+    parser.add_argument("--shard-size", type=str, metavar="SIZE",
+                        help="Разбить вывод на части не больше SIZE: у каждой своё дерево, папки по возможности не "
+                             "разрываются, рядом пишется манифест <имя>.shards.json")
+    parser.add_argument("--shard-tokens", type=str, metavar="N",
+                        help="То же в оценочных токенах")
+    parser.add_argument("--largest", type=int, default=0, metavar="N",
+                        help="Показать N самых больших файлов перед склейкой")
+
+    args = parser.parse_args()
+    stats = MergeStats() if args.stats or args.stats_json else None
+
+    project_path = Path(args.path).resolve()
+    if not project_path.is_dir():
+        print(f"[ERROR] Директория не найдена: {project_path}")
+        sys.exit(1)
+
+    secret_rules = tuple(name.strip() for name in args.secret_rules.split(",") if name.strip())
+    unknown = [name for name in secret_rules if name not in SECRET_RULES]
+    if unknown:
+        print(f"[ERROR] Неизвестные правила поиска секретов: {', '.join(unknown)}")
+        sys.exit(1)
+
+    try:
+        selection = compile_selection(args.include, args.exclude)
+    except ValueError as e:
+        print(f"[ERROR] Неверный шаблон выбора файлов: {e}")
+        sys.exit(1)
+
+    overrides = {key: getattr(args, key) for key in LIMIT_KEYS if getattr(args, key) is not None}
+    try:
+        limits = size_limits({**get_exclusions().get("limits", {}), **overrides})
+    except ValueError as e:
+        print(f"[ERROR] Неверные лимиты размера: {e}")
+        sys.exit(1)
+
+    matcher = get_exclusion_matcher()
+    files_to_merge = None
+    if args.source == 'git':
+        started = _clock()
+        files_to_merge = list_git_files(project_path, matcher)
+        if stats is not None:
+            stats.stop("git_ls_files", started, count=len(files_to_merge or ()))
+        if files_to_merge is None:
+            print("[WARN] Не удалось получить список файлов из git (это не репозиторий?), сканирую файловую систему.")
+        else:
+            print("[INFO] Список файлов взят из индекса git.")
+
+    if files_to_merge is None:
+        gitignore = None
+        if not args.no_gitignore:
+            gitignore = load_gitignore_rules(project_path)
+            print("[INFO] Правила .gitignore (включая вложенные и .git/info/exclude) будут использованы.")
+
+        print(f"[INFO] Сканирование директории: {project_path}")
+        index = ScanIndex.open(project_path, gitignore, matcher) if args.scan_index else None
+        tree = build_file_tree(project_path, project_path, gitignore, workers=max(1, args.scan_workers),
+                               matcher=matcher, index=index, stats=stats)
+        if index is not None:
+            print(f"[INFO] Индекс сканирования: из кэша {index.hits} папок, пересканировано {index.misses}.")
+        files_to_merge = flatten_file_tree(tree)
+
+    if selection is not None:
+        files_to_merge = select_files(files_to_merge, selection)
+        print(f"[INFO] По шаблонам --include/--exclude отобрано файлов: {len(files_to_merge)}")
+
+    if not files_to_merge:
+        print("[ERROR] Не найдено файлов для склейки (проверьте фильтры и исключения).")
+        sys.exit(1)
+
+    delta = None
+    manifest_path = manifest = None
+    if args.delta_git:
+        try:
+            delta = git_delta(project_path, args.delta_git, files_to_merge, matcher)
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+    elif args.delta_manifest:
+        manifest_path = Path(args.delta_manifest).resolve()
+        previous = load_manifest(manifest_path)
+        if not previous:
+            print(f"[INFO] Манифест {manifest_path} не найден, база пустая: в дельту попадут все файлы.")
+        manifest = build_manifest(project_path, files_to_merge, previous)
+        delta = manifest_delta(previous, manifest, f"manifest {manifest_path.name}")
+    if delta is not None:
+        print(f"[INFO] Дельта: новых {len(delta.added)}, изменённых {len(delta.changed)}, удалённых {len(delta.deleted)}.")
+        if not (delta.added or delta.changed or delta.deleted):
+            if manifest is not None:
+                save_manifest(manifest_path, manifest)
+            print("[DONE] Изменений нет, файл не создаётся.")
+            return
+        files_to_merge = delta.added + delta.changed
+
+    print(f"[INFO] Найдено файлов: {len(files_to_merge)}")
+    if files_to_merge:
+        print("[INFO] Первые 5 файлов, которые будут обработаны:")
+        for i, f in enumerate(sorted(files_to_merge)):
+            if i >= 5:
+                print(f"  ... и еще {len(files_to_merge) - i} файлов.")
+                break
+            print(f"  - {f}")
+
+    if args.largest > 0 or (limits is not None and limits.max_file):
+        root = str(project_path)
+        sizes = {rel: _file_size(os.path.join(root, rel)) for rel in files_to_merge}
+        if limits is not None and limits.max_file:
+            over = sum(1 for size in sizes.values() if size > limits.max_file)
+            if over:
+                print(f"[INFO] Файлов больше {format_size(limits.max_file)}: {over}, от них останутся начало и конец.")
+        if args.largest > 0:
+            import heapq
+
+            print("[INFO] Самые большие файлы:")
+            for rel in heapq.nlargest(args.largest, sizes, key=sizes.get):
+                print(f"  {format_size(sizes[rel]):>10}  {rel}")
+
+    if args.output:
+        output_filepath = Path(args.output).resolve()
+    else:
+        output_filename = f"{project_path.name}.{args.format}"
+        output_filepath = Path.cwd() / output_filename
+
+    try:
+        shards = perform_merge_logic(
+            project_path=project_path,
+            files_to_merge=files_to_merge,
+            output_filepath=output_filepath,
+            export_format=args.format,
+            lang=args.lang,
+            remove_secrets=args.remove_secrets,
+            clear_for_ai_flag=args.clear_ai,
+            jobs=max(1, args.jobs),
+            secret_rules=secret_rules,
+            content_cache=ContentCache.open(args.content_cache_mb) if args.content_cache else None,
+            delta=delta,
+            stats=stats,
+            limits=limits
+        )
+        # Манифест сдвигается только после удачной склейки, иначе изменения потерялись бы
+        if manifest is not None:
+            save_manifest(manifest_path, manifest)
+        if shards is not None:
+            print(f"[DONE] Частей: {len(shards['shards'])}, манифест: {shards_manifest_path(output_filepath)}")
+        else:
+            print(f"[DONE] Файл успешно сохранен: {output_filepath}")
+    except Exception as e:
+        print(f"[FAIL] Ошибка при создании файла: {e}")
+        sys.exit(1)
+
+    if args.stats:
+        print(f"[INFO] Статистика по этапам:\n{stats.report(args.stats_top)}")
+    if args.stats_json:
+        Path(args.stats_json).write_text(json.dumps(stats.as_dict(args.stats_top), indent=2, ensure_ascii=False),
+                                         encoding="utf-8")
+        print(f"[INFO] Статистика записана в {args.stats_json}")
+
+
+if __name__ == '__main__':
+    run_cli()
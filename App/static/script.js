@@ -21,9 +21,19 @@ document.addEventListener('DOMContentLoaded', () => {
             githubLinkTitle: "My GitHub",
             websiteLinkTitle: "My Website",
             useGitignore: "Use .gitignore",
+            useGitIndex: "Take files from the git index",
             exportFormatTitle: "Export Format",
             removeSecrets: "Remove secrets (keys, tokens)",
-            clearForAI: "Clear for AI (remove comments & empty lines)"
+            clearForAI: "Clear for AI (remove comments & empty lines)",
+            cancelBtn: "Cancel",
+            mergeCancelled: "Merge cancelled.",
+            mergeQueued: "Queued...",
+            binaryFile: "Binary file, contents are not merged",
+            sortBySize: "Sort by size",
+            sortByName: "Sort by name",
+            downloadManifest: "Download parts manifest",
+            shardPart: "Part",
+            shardFiles: "files"
         },
         ru: {
             mainTitle: "Project Merger Tool",
@@ -45,9 +55,19 @@ document.addEventListener('DOMContentLoaded', () => {
             githubLinkTitle: "Мой GitHub",
             websiteLinkTitle: "Мой сайт",
             useGitignore: "Учитывать .gitignore",
+            useGitIndex: "Брать файлы из индекса git",
             exportFormatTitle: "Формат экспорта",
             removeSecrets: "Удалить секреты (ключи, токены)",
-            clearForAI: "Очистить для ИИ (убрать комменты и пустые строки)"
+            clearForAI: "Очистить для ИИ (убрать комменты и пустые строки)",
+            cancelBtn: "Отменить",
+            mergeCancelled: "Склейка отменена.",
+            mergeQueued: "В очереди...",
+            binaryFile: "Двоичный файл, содержимое не склеивается",
+            sortBySize: "По размеру",
+            sortByName: "По имени",
+            downloadManifest: "Скачать манифест частей",
+            shardPart: "Часть",
+            shardFiles: "файлов"
         }
     };
 
@@ -63,12 +83,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const projectNameEl = getEl('project-name');
     const resultView = getEl('result');
     const downloadLink = getEl('download-link');
+    const shardLinks = getEl('shard-links');
     const errorDiv = getEl('error-message');
     const folderPicker = getEl('folder-picker');
     const folderPickerBtn = getEl('folder-picker-btn');
     const themeToggle = getEl('theme-toggle');
     const langSwitcher = document.querySelector('.lang-switcher');
     const saveExclusionsBtn = getEl('save-exclusions-btn');
+    const mergeProgress = getEl('merge-progress');
+    const cancelMergeBtn = getEl('cancel-merge-btn');
+    const sortSizeBtn = getEl('sort-size-btn');
 
     let projectPath = '';
 
@@ -136,52 +160,211 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
 // --- Логика дерева файлов ---
-function renderTree(nodes, container) {
-    const ul = document.createElement('ul');
-    nodes.forEach(node => {
-        const li = document.createElement('li');
-        li.dataset.path = node.path;
+function createTreeItem(node) {
+    const li = document.createElement('li');
+    li.dataset.path = node.path;
 
-        const isDir = node.type === 'dir';
-        li.className = isDir ? 'dir-item' : 'file-item';
+    const isDir = node.type === 'dir';
+    li.className = isDir ? 'dir-item' : 'file-item';
+    // Ключ сортировки как на сервере: сначала папки, потом файлы, без учёта регистра
+    li.dataset.sortKey = (isDir ? '0' : '1') + node.name.toLowerCase();
 
-        if (isDir) {
-            li.classList.add('collapsed');
-        }
+    if (isDir) {
+        li.classList.add('collapsed');
+    }
 
-        const itemDiv = document.createElement('div');
-        itemDiv.className = 'tree-item';
+    const itemDiv = document.createElement('div');
+    itemDiv.className = 'tree-item';
+
+    const toggler = document.createElement('span');
+    toggler.className = 'toggler';
+    if (!isDir) toggler.style.visibility = 'hidden';
+
+    const checkbox = document.createElement('input');
+    checkbox.type = 'checkbox';
+    checkbox.checked = true;
+
+    // --- НОВАЯ ЛОГИКА ИКОНОК ЗДЕСЬ ---
+    const iconEl = document.createElement('i');
+    // Устанавливаем атрибут, который Lucide будет искать
+    iconEl.setAttribute('data-lucide', isDir ? 'folder' : node.binary ? 'file-x' : 'file-text');
+    // --- КОНЕЦ НОВОЙ ЛОГИКИ ---
+
+    const nameSpan = document.createElement('span');
+    nameSpan.className = 'item-name';
+    nameSpan.textContent = node.name;
+
+    // Собираем строку элемента: переключатель, чекбокс, иконка, имя
+    itemDiv.append(toggler, checkbox, iconEl, nameSpan);
+
+    // Двоичный файл (сервер определил по первым байтам) серый и не отмечается
+    if (node.binary) {
+        li.classList.add('binary-item');
+        checkbox.checked = false;
+        checkbox.disabled = true;
+        itemDiv.dataset.translateKeyTitle = 'binaryFile';
+        itemDiv.title = translations[localStorage.getItem('pmt-lang') || 'ru'].binaryFile;
+    } else if (node.encoding) {
+        const encodingSpan = document.createElement('span');
+        encodingSpan.className = 'item-encoding';
+        encodingSpan.textContent = node.encoding;
+        itemDiv.appendChild(encodingSpan);
+    }
+    // Размер приходит со сканом (его даёт та же проверка первых байтов)
+    if (node.size != null) {
+        li.dataset.size = node.size;
+        const sizeSpan = document.createElement('span');
+        sizeSpan.className = 'item-size';
+        sizeSpan.textContent = formatBytes(node.size);
+        itemDiv.appendChild(sizeSpan);
+    }
+    li.appendChild(itemDiv);
+    return li;
+}
 
-        const toggler = document.createElement('span');
-        toggler.className = 'toggler';
-        if (!isDir) toggler.style.visibility = 'hidden';
+// --- Потоковое построение дерева из NDJSON-кусков /scan/stream ---
+function createStreamTree(container, sep) {
+    const rootUl = document.createElement('ul');
+    container.appendChild(rootUl);
+    const dirs = new Map();
+
+    const childList = (li) => {
+        let ul = li.querySelector(':scope > ul');
+        if (!ul) {
+            ul = document.createElement('ul');
+            li.appendChild(ul);
+        }
+        return ul;
+    };
 
-        const checkbox = document.createElement('input');
-        checkbox.type = 'checkbox';
-        checkbox.checked = true;
+    const insertSorted = (ul, li, parentLi) => {
+        if (parentLi) {
+            // Новый элемент наследует галочку папки, которую могли уже снять
+            li.querySelector('input[type="checkbox"]').checked =
+                parentLi.querySelector(':scope > .tree-item > input[type="checkbox"]').checked;
+        }
+        const key = li.dataset.sortKey;
+        const last = ul.lastElementChild;
+        // Файлы одной папки приходят уже отсортированными, так что обычно хватает append
+        if (!last || last.dataset.sortKey < key) {
+            ul.appendChild(li);
+            return;
+        }
+        for (const child of ul.children) {
+            if (child.dataset.sortKey > key) {
+                ul.insertBefore(li, child);
+                return;
+            }
+        }
+        ul.appendChild(li);
+    };
 
-        // --- НОВАЯ ЛОГИКА ИКОНОК ЗДЕСЬ ---
-        const iconEl = document.createElement('i');
-        // Устанавливаем атрибут, который Lucide будет искать
-        iconEl.setAttribute('data-lucide', isDir ? 'folder' : 'file-text');
-        // --- КОНЕЦ НОВОЙ ЛОГИКИ ---
+    const ensureDir = (dirPath) => {
+        if (!dirPath) return null;
+        let li = dirs.get(dirPath);
+        if (li) return li;
+        const cut = dirPath.lastIndexOf(sep);
+        const parentLi = ensureDir(cut === -1 ? '' : dirPath.slice(0, cut));
+        li = createTreeItem({ name: dirPath.slice(cut + 1), path: dirPath, type: 'dir' });
+        insertSorted(parentLi ? childList(parentLi) : rootUl, li, parentLi);
+        dirs.set(dirPath, li);
+        return li;
+    };
 
-        const nameSpan = document.createElement('span');
-        nameSpan.className = 'item-name';
-        nameSpan.textContent = node.name;
+    return {
+        addFiles(dirPath, files) {
+            const parentLi = ensureDir(dirPath);
+            const ul = parentLi ? childList(parentLi) : rootUl;
+            // Третий элемент - размер, четвёртый - "binary" или кодировка не-UTF-8 файла
+            files.forEach(([name, path, size, kind]) => {
+                const node = { name, path, type: 'file', size };
+                if (kind === 'binary') node.binary = true;
+                else if (kind) node.encoding = kind;
+                insertSorted(ul, createTreeItem(node), parentLi);
+            });
+        },
+        // Папки на границе глубины: содержимое подгрузится при раскрытии
+        addLazyDirs(lazyDirs) {
+            lazyDirs.forEach(([, path]) => {
+                ensureDir(path).dataset.lazy = '1';
+            });
+        }
+    };
+}
 
-        // Собираем строку элемента: переключатель, чекбокс, иконка, имя
-        itemDiv.append(toggler, checkbox, iconEl, nameSpan);
-        li.appendChild(itemDiv);
+// --- Компактное колоночное дерево (encoding: 'columnar') -> обычные вложенные узлы ---
+function decodeColumnarTree(payload) {
+    const { sep, base, names, parents, types } = payload;
+    const encodings = payload.encodings || {};
+    const sizes = payload.sizes || [];
+    const prefix = base ? base + sep : '';
+    const roots = [];
+    const nodes = new Array(names.length);
+    for (let i = 0; i < names.length; i++) {
+        const name = names[i];
+        const parent = parents[i];
+        const code = types[i];
+        const owner = parent < 0 ? null : nodes[parent];
+        const node = { name, path: owner ? owner.path + sep + name : prefix + name, type: code === 'f' || code === 'b' ? 'file' : 'dir' };
+        if (code === 'l') node.lazy = true;
+        if (code === 'b') node.binary = true;
+        if (encodings[i]) node.encoding = encodings[i];
+        if (sizes[i] != null) node.size = sizes[i];
+        if (owner) {
+            (owner.children || (owner.children = [])).push(node);
+        } else {
+            roots.push(node);
+        }
+        nodes[i] = node;
+    }
+    return roots;
+}
 
-        if (isDir && node.children) {
-            renderTree(node.children, li);
+// --- Подгрузка содержимого папки по запросу (/tree/children) ---
+function renderChildren(nodes, li) {
+    const checked = li.querySelector(':scope > .tree-item > input[type="checkbox"]').checked;
+    const ul = document.createElement('ul');
+    nodes.forEach(node => {
+        const child = createTreeItem(node);
+        if (!node.binary) child.querySelector('input[type="checkbox"]').checked = checked;
+        if (node.lazy) {
+            child.dataset.lazy = '1';
+        } else if (node.type === 'dir' && node.children) {
+            renderChildren(node.children, child);
         }
-        ul.appendChild(li);
+        ul.appendChild(child);
     });
-    container.appendChild(ul);
+    if (sortBySize) sortList(ul);
+    li.appendChild(ul);
 }
 
+    // --- Сортировка: по имени, как на сервере, или файлы папки по убыванию размера (папки всё равно сверху) ---
+    let sortBySize = false;
+
+    function sortList(ul) {
+        const items = Array.from(ul.children);
+        items.sort((a, b) => {
+            if (sortBySize && a.classList.contains('file-item') && b.classList.contains('file-item')) {
+                const diff = Number(b.dataset.size || 0) - Number(a.dataset.size || 0);
+                if (diff) return diff;
+            }
+            return a.dataset.sortKey < b.dataset.sortKey ? -1 : a.dataset.sortKey > b.dataset.sortKey ? 1 : 0;
+        });
+        const fragment = document.createDocumentFragment();
+        items.forEach(li => fragment.appendChild(li));
+        ul.appendChild(fragment);
+    }
+
+    const sortTree = () => fileTreeContainer.querySelectorAll('ul').forEach(sortList);
+
+    sortSizeBtn.addEventListener('click', () => {
+        sortBySize = !sortBySize;
+        const key = sortBySize ? 'sortByName' : 'sortBySize';
+        sortSizeBtn.dataset.translateKey = key;
+        sortSizeBtn.textContent = translations[localStorage.getItem('pmt-lang') || 'ru'][key];
+        sortTree();
+    });
+
     // --- Обработчики событий дерева (делегирование) ---
     fileTreeContainer.addEventListener('click', (e) => {
         const target = e.target;
@@ -190,11 +373,14 @@ function renderTree(nodes, container) {
 
         if (target.matches('.item-name, .toggler') && li.classList.contains('dir-item')) {
             li.classList.toggle('collapsed');
+            if (li.dataset.lazy && !li.classList.contains('collapsed')) {
+                loadChildren(li);
+            }
         }
 
         if (target.type === 'checkbox') {
             const isChecked = target.checked;
-            li.querySelectorAll('input[type="checkbox"]').forEach(childBox => {
+            li.querySelectorAll('input[type="checkbox"]:not(:disabled)').forEach(childBox => {
                 childBox.checked = isChecked;
                 childBox.indeterminate = false;
             });
@@ -205,7 +391,8 @@ function renderTree(nodes, container) {
     function updateParentCheckboxes(element) {
         let current = element.parentElement.closest('li');
         while (current) {
-            const childCheckboxes = Array.from(current.querySelectorAll(':scope > ul > li > .tree-item > input[type="checkbox"]'));
+            // Отключённые чекбоксы двоичных файлов на состояние папки не влияют
+            const childCheckboxes = Array.from(current.querySelectorAll(':scope > ul > li > .tree-item > input[type="checkbox"]:not(:disabled)'));
             if (childCheckboxes.length === 0) {
                 current = current.parentElement.closest('li');
                 continue;
@@ -228,10 +415,43 @@ function renderTree(nodes, container) {
         }
     }
 
+    let scanUseGitignore = true;
+    let scanSource = 'fs';
+
+    async function loadChildren(li) {
+        delete li.dataset.lazy;
+        try {
+            const response = await fetch('/tree/children', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    project_path: projectPath,
+                    path: li.dataset.path,
+                    use_gitignore: scanUseGitignore,
+                    depth: 1,
+                    encoding: 'columnar'
+                })
+            });
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error);
+            }
+            renderChildren(decodeColumnarTree(data.children), li);
+            lucide.createIcons();
+        } catch (error) {
+            // Не вышло - папка снова ленивая, следующее раскрытие повторит запрос
+            li.dataset.lazy = '1';
+            li.classList.add('collapsed');
+            errorDiv.textContent = error.message || 'Ошибка сети или сервера.';
+            errorDiv.classList.remove('hidden');
+        }
+    }
+
     // --- Кнопка Сканировать ---
     async function performScan() {
         const path = pathInput.value.trim();
         const useGitignoreCheckbox = getEl('use-gitignore-checkbox');
+        const useGitIndexCheckbox = getEl('use-git-index-checkbox');
         if (!path) {
             pathInput.focus();
             return;
@@ -243,31 +463,80 @@ function renderTree(nodes, container) {
     errorDiv.classList.add('hidden');
 
         try {
-            const response = await fetch('/scan', {
+            const response = await fetch('/scan/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 path: path,
-                use_gitignore: useGitignoreCheckbox.checked // Отправляем состояние галочки
+                use_gitignore: useGitignoreCheckbox.checked, // Отправляем состояние галочки
+                source: useGitIndexCheckbox.checked ? 'git' : 'fs',
+                // Обход диска - только первый уровень, остальное по раскрытию папок
+                depth: useGitIndexCheckbox.checked ? null : 1
             })
             });
-            const data = await response.json();
+            scanUseGitignore = useGitignoreCheckbox.checked;
+
+            if (!response.ok) {
+                const data = await response.json();
+                fileTreeContainer.innerHTML = '';
+                errorDiv.textContent = data.error || 'Произошла неизвестная ошибка.';
+                errorDiv.classList.remove('hidden');
+                return;
+            }
 
-            fileTreeContainer.innerHTML = '';
-            if (response.ok) {
-                projectPath = data.project_path;
-                projectNameEl.textContent = `${data.project_name}`;
-                if(data.tree.length > 0) {
-                    renderTree(data.tree, fileTreeContainer);
+            // Дерево растёт по мере обхода: каждая строка ответа - отдельный JSON
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let tree = null;
+            let total = 0;
+            let finished = false;
+            let iconsPending = false;
+            const refreshIcons = () => {
+                if (iconsPending) return;
+                iconsPending = true;
+                requestAnimationFrame(() => {
+                    iconsPending = false;
                     lucide.createIcons();
+                });
+            };
+            const handleMessage = (message) => {
+                if (message.type === 'start') {
+                    projectPath = message.project_path;
+                    scanSource = message.source;
+                    projectNameEl.textContent = `${message.project_name}`;
+                    fileTreeContainer.innerHTML = '';
+                    tree = createStreamTree(fileTreeContainer, message.sep);
                     projectView.classList.remove('hidden');
-                    mergePanel.classList.remove('hidden');
-                } else {
-                    errorDiv.textContent = 'В этой директории не найдено файлов для склейки (проверьте исключения).';
-                    errorDiv.classList.remove('hidden');
+                } else if (message.type === 'files') {
+                    tree.addFiles(message.dir, message.files);
+                    if (message.lazy) tree.addLazyDirs(message.lazy);
+                    refreshIcons();
+                } else if (message.type === 'end') {
+                    total = message.files + message.lazy_dirs;
+                    finished = true;
                 }
+            };
+
+            while (true) {
+                const { value, done } = await reader.read();
+                buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.filter(Boolean).forEach(line => handleMessage(JSON.parse(line)));
+                if (done) break;
+            }
+
+            if (!finished) {
+                throw new Error('scan stream ended early');
+            }
+            // Во время потока файлы вставляются по имени, порядок по размеру наводится в конце
+            if (sortBySize) sortTree();
+            if (total > 0) {
+                mergePanel.classList.remove('hidden');
             } else {
-                errorDiv.textContent = data.error || 'Произошла неизвестная ошибка.';
+                projectView.classList.add('hidden');
+                errorDiv.textContent = 'В этой директории не найдено файлов для склейки (проверьте исключения).';
                 errorDiv.classList.remove('hidden');
             }
         } catch (error) {
@@ -284,14 +553,26 @@ function renderTree(nodes, container) {
     });
 
 mergeBtn.addEventListener('click', async () => {
+    // Полностью отмеченные папки уходят одним путём - их файлы сервер отберёт сам
+    // (из последнего скана или обходом), поштучно только файлы из частично отмеченных папок
     const checkedFiles = [];
-    fileTreeContainer.querySelectorAll('li.file-item').forEach(li => {
-        if (li.querySelector(':scope > .tree-item > input[type="checkbox"]').checked) {
-            checkedFiles.push(li.dataset.path);
+    const checkedDirs = [];
+    const collect = (ul) => {
+        for (const li of ul.children) {
+            const checkbox = li.querySelector(':scope > .tree-item > input[type="checkbox"]');
+            if (li.classList.contains('file-item')) {
+                if (checkbox.checked) checkedFiles.push(li.dataset.path);
+            } else if (checkbox.checked && !checkbox.indeterminate) {
+                checkedDirs.push(li.dataset.path);
+            } else if (checkbox.indeterminate) {
+                const childList = li.querySelector(':scope > ul');
+                if (childList) collect(childList);
+            }
         }
-    });
+    };
+    fileTreeContainer.querySelectorAll(':scope > ul').forEach(collect);
 
-    if (checkedFiles.length === 0) {
+    if (checkedFiles.length === 0 && checkedDirs.length === 0) {
         alert('Выберите хотя бы один файл.');
         return;
     }
@@ -303,6 +584,8 @@ mergeBtn.addEventListener('click', async () => {
 
     loaderOverlay.classList.add('visible');
     mergeBtn.disabled = true;
+    errorDiv.classList.add('hidden');
+    mergeProgress.textContent = '';
 
     try {
         const response = await fetch('/merge', {
@@ -310,6 +593,9 @@ mergeBtn.addEventListener('click', async () => {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 files: checkedFiles,
+                dirs: checkedDirs,
+                use_gitignore: scanUseGitignore,
+                source: scanSource,
                 project_path: projectPath,
                 format: exportFormat,
                 lang: currentLang,
@@ -318,25 +604,100 @@ mergeBtn.addEventListener('click', async () => {
             })
         });
         const data = await response.json();
+        if (!response.ok) {
+            errorDiv.textContent = data.error || 'Ошибка при склейке файлов.';
+            errorDiv.classList.remove('hidden');
+            return;
+        }
 
-        if (response.ok && data.success) {
-            downloadLink.href = data.download_url;
+        // Склейка идёт в фоне на сервере, здесь только опрашиваем её статус
+        currentJobId = data.job_id;
+        cancelMergeBtn.classList.remove('hidden');
+        const job = await pollMergeJob(data.status_url);
+
+        if (job.status === 'done') {
+            // Вывод, разбитый на части, скачивается по частям, основная ссылка ведёт на манифест
+            const linkKey = job.shards ? 'downloadManifest' : 'downloadLink';
+            downloadLink.dataset.translateKey = linkKey;
+            downloadLink.textContent = translations[currentLang][linkKey];
+            downloadLink.href = job.download_url;
+            renderShardLinks(job.shards || []);
             resultView.classList.remove('hidden');
             resultView.scrollIntoView({ behavior: 'smooth' });
             triggerConfetti();
+        } else if (job.status === 'cancelled') {
+            errorDiv.textContent = translations[currentLang].mergeCancelled;
+            errorDiv.classList.remove('hidden');
         } else {
-            errorDiv.textContent = data.error || 'Ошибка при склейке файлов.';
+            errorDiv.textContent = job.error || 'Ошибка при склейке файлов.';
             errorDiv.classList.remove('hidden');
         }
     } catch (error) {
         errorDiv.textContent = 'Ошибка сети или сервера.';
         errorDiv.classList.remove('hidden');
     } finally {
+        currentJobId = null;
+        cancelMergeBtn.classList.add('hidden');
         loaderOverlay.classList.remove('visible');
         mergeBtn.disabled = false;
     }
 });
 
+    // --- Фоновая склейка: опрос статуса и отмена ---
+    let currentJobId = null;
+    const MERGE_POLL_INTERVAL = 500;
+
+    const formatBytes = (bytes) => {
+        if (bytes < 1024) return `${bytes} B`;
+        if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+        return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+    };
+
+    const renderShardLinks = (shards) => {
+        const lang = localStorage.getItem('pmt-lang') || 'ru';
+        shardLinks.replaceChildren();
+        shards.forEach((shard, index) => {
+            const li = document.createElement('li');
+            const link = document.createElement('a');
+            link.href = shard.url;
+            link.download = '';
+            link.textContent = `${translations[lang].shardPart} ${index + 1}`;
+            li.append(link, ` · ${shard.files} ${translations[lang].shardFiles} · ${formatBytes(shard.bytes)}`);
+            shardLinks.appendChild(li);
+        });
+        shardLinks.classList.toggle('hidden', shards.length === 0);
+    };
+
+    async function pollMergeJob(statusUrl) {
+        const lang = localStorage.getItem('pmt-lang') || 'ru';
+        while (true) {
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+            if (!response.ok) {
+                return { status: 'error', error: job.error };
+            }
+            if (job.status === 'queued') {
+                mergeProgress.textContent = translations[lang].mergeQueued;
+            } else {
+                mergeProgress.textContent = `${job.files_done} / ${job.files_total} · ${formatBytes(job.bytes_written)} · ${job.elapsed.toFixed(1)} s`;
+            }
+            if (job.status !== 'queued' && job.status !== 'running') {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, MERGE_POLL_INTERVAL));
+        }
+    }
+
+    cancelMergeBtn.addEventListener('click', async () => {
+        if (!currentJobId) return;
+        cancelMergeBtn.disabled = true;
+        try {
+            await fetch(`/jobs/${currentJobId}/cancel`, { method: 'POST' });
+        } finally {
+            cancelMergeBtn.disabled = false;
+        }
+    });
+
     // --- Выбор папки ---
     folderPickerBtn.addEventListener('click', () => folderPicker.click());
     folderPicker.addEventListener('change', (e) => {
@@ -0,0 +1,198 @@
+import email
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import tokenize
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import clear_for_ai  # noqa: E402
+
+# (расширение, исходник, ожидаемый результат)
+FIXTURES = [
+    ('.py',
+     '#!/usr/bin/env python3\n# -*- coding: utf-8 -*-\n"""Module docstring."""\nimport os  # comment\n\n\n'
+     'URL = "http://x/#anchor"\n'
+     'def f():\n    """Only a docstring."""\n\nclass A:\n    """Doc."""\n    x = \'\'\'keep\n\nme\'\'\'\n'
+     'msg = (\n    "a"\n    """b"""\n)\nf"""{os.getpid()}"""\n',
+     '#!/usr/bin/env python3\n# -*- coding: utf-8 -*-\nimport os\nURL = "http://x/#anchor"\ndef f():\n    pass\nclass A:\n'
+     '    x = \'\'\'keep\n\nme\'\'\'\nmsg = (\n    "a"\n    """b"""\n)\nf"""{os.getpid()}"""'),
+    ('.js',
+     '#!/usr/bin/env node\n// header\nconst url = "http://example.com"; // tail\nconst re = /\\/\\/[^/*]+/g;\n'
+     'const half = total / 2 / count;\n/* block\n   comment */\nconst t = `line\n\n// not a comment`;\n',
+     '#!/usr/bin/env node\nconst url = "http://example.com";\nconst re = /\\/\\/[^/*]+/g;\n'
+     'const half = total / 2 / count;\nconst t = `line\n\n// not a comment`;'),
+    ('.ts',
+     'export function f(a: string): string { // tail\n  return a.replace(/\\/*$/, "") /* inline */ + \'//\';\n}\n',
+     'export function f(a: string): string {\n  return a.replace(/\\/*$/, "") + \'//\';\n}'),
+    ('.jsx',
+     'const A = () => (\n  // comment\n  <a href="http://x">{/* jsx comment */}link</a>\n);\n',
+     'const A = () => (\n  <a href="http://x">{}link</a>\n);'),
+    ('.tsx',
+     'const B: FC = () => <div title="a//b">{x / y}</div>; // done\n',
+     'const B: FC = () => <div title="a//b">{x / y}</div>;'),
+    ('.go',
+     'package main\n\n// Doc comment.\nfunc main() {\n\tpath := `C:\\dir\\` // raw string\n\tr := \'/\'\n'
+     '\t_ = "//" + path + string(r) /* end */\n}\n',
+     'package main\nfunc main() {\n\tpath := `C:\\dir\\`\n\tr := \'/\'\n\t_ = "//" + path + string(r)\n}'),
+    ('.rs',
+     'fn main() { /* outer /* nested */ still comment */\n    let s = "http://x"; // tail\n'
+     '    let c = \'"\'; let l: &\'static str = "a";\n}\n',
+     'fn main() {\n    let s = "http://x";\n    let c = \'"\'; let l: &\'static str = "a";\n}'),
+    ('.java',
+     'class A {\n  /** Javadoc. */\n  String s = "/* not */"; // tail\n  char c = \'"\';\n'
+     '  String t = """\n      // text block\n      """;\n}\n',
+     'class A {\n  String s = "/* not */";\n  char c = \'"\';\n  String t = """\n      // text block\n      """;\n}'),
+    ('.cs',
+     'class A {\n  string p = @"C:\\dir\\"; // verbatim\n  string q = "a\\"//b"; /* c */\n}\n',
+     'class A {\n  string p = @"C:\\dir\\";\n  string q = "a\\"//b";\n}'),
+    ('.c',
+     '#include <stdio.h>\n#define TWO 1 + /* multi\n   line */ 1\nint main(void) { // tail\n'
+     '  puts("/* not a comment */"); return \'\\\'\' - TWO;\n}\n',
+     '#include <stdio.h>\n#define TWO 1 + 1\nint main(void) {\n  puts("/* not a comment */"); return \'\\\'\' - TWO;\n}'),
+    ('.cpp',
+     'auto s = R"x(// raw "quoted" )x"; // tail\nint a/**/b;\n',
+     'auto s = R"x(// raw "quoted" )x";\nint a b;'),
+    ('.h',
+     '#ifndef A_H /* guard */\n#define A_H\n// declarations\nint f(const char *s);\n#endif\n',
+     '#ifndef A_H\n#define A_H\nint f(const char *s);\n#endif'),
+    ('.hpp',
+     '#pragma once\n/// doc\ntemplate <class T> T id(T v) { return v; } // tail\n',
+     '#pragma once\ntemplate <class T> T id(T v) { return v; }'),
+    ('.swift',
+     'let url = "http://x" // tail\n/* outer /* inner */ outer */\nlet s = """\n// kept\n"""\n',
+     'let url = "http://x"\nlet s = """\n// kept\n"""'),
+    ('.kt',
+     'fun main() { /* a /* b */ c */\n    val u = "http://x" // tail\n    val r = """C:\\dir\\"""\n}\n',
+     'fun main() {\n    val u = "http://x"\n    val r = """C:\\dir\\"""\n}'),
+    ('.kts',
+     'plugins { id("java") } // tail\n// full line\nval v = \'#\'\n',
+     'plugins { id("java") }\nval v = \'#\''),
+    ('.rb',
+     '# frozen_string_literal: true\n=begin\nblock\n=end\nputs "a #{x + 1} b" # tail\nc = ?#\n'
+     'r = %r{#not}; s = <<~SQL\n  # kept\nSQL\n__END__\n# data\n',
+     '# frozen_string_literal: true\nputs "a #{x + 1} b"\nc = ?#\nr = %r{#not}; s = <<~SQL\n  # kept\nSQL\n__END__\n# data\n'),
+    ('.php',
+     '<p>Don\'t touch // this</p>\n<?php\n// comment\n$u = \'http://x\'; # hash\n#[Attribute]\n'
+     'echo "a"; // tail ?>\n<b>html # text</b>\n',
+     '<p>Don\'t touch // this</p>\n<?php\n$u = \'http://x\';\n#[Attribute]\necho "a";?>\n<b>html # text</b>'),
+    ('.sh',
+     '#!/bin/bash\n# comment\n  #!not first line\necho "#not" \'#no\' a#b ${#arr} $# # tail\ncat <<EOF\n# kept\nEOF\nx=\\#\n',
+     '#!/bin/bash\n  #!not first line\necho "#not" \'#no\' a#b ${#arr} $#\ncat <<EOF\n# kept\nEOF\nx=\\#'),
+    ('.css',
+     'a { background: url(http://x/y.png); } /* tail */\n',
+     'a { background: url(http://x/y.png); }'),
+    ('.html',
+     '<!-- head -->\n<p>a</p>\n<script>var s = "<!-- not -->";</script>\n',
+     '<p>a</p>\n<script>var s = "<!-- not -->";</script>'),
+    ('.xml',
+     '<a><!-- c --><![CDATA[<!-- kept -->]]></a>\n',
+     '<a><![CDATA[<!-- kept -->]]></a>'),
+]
+
+# Необязательная проверка валидности на реальном компиляторе, если он установлен
+VALIDATORS = {
+    '.js': ['node', '--check'],
+    '.c': ['gcc', '-fsyntax-only'],
+    '.h': ['gcc', '-fsyntax-only'],
+    '.rs': ['rustfmt', '--emit', 'stdout'],
+    '.go': ['gofmt', '-e'],
+    '.sh': ['bash', '-n'],
+    '.rb': ['ruby', '-c'],
+    '.php': ['php', '-l'],
+    '.xml': ['xmllint', '--noout'],
+}
+
+
+def validate(ext: str, source: str):
+    if ext == '.py':
+        try:
+            compile(source, '<fixture>', 'exec')
+            return True
+        except SyntaxError:
+            return False
+    command = VALIDATORS.get(ext)
+    if command is None or shutil.which(command[0]) is None:
+        return None
+    with tempfile.TemporaryDirectory(prefix="pmt-clear-") as tmp:
+        path = os.path.join(tmp, 'fixture' + ext)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source)
+        return subprocess.run(command + [path], capture_output=True).returncode == 0
+
+
+# Кодировка действует только в первых двух строках, shebang остаётся на любой
+CODING = re.compile(r'#.*?coding[:=]')
+
+# Места, где легко спутать, какие кавычки открывающие и что считать докстрокой
+PYTHON_CASES = [
+    # Тройные кавычки внутри обычных строк перед докстрокой
+    '_QUOTES = (\'"""\', "\'\'\'")\n\nclass A:\n    """Doc."""\n    def f(self):\n        """Doc."""\n        return 1\n',
+    # Строка-выражение после продолжения через \ и комментарий перед ней
+    'x = 1  # comment\nA.__doc__ = \\\n    """Not a docstring."""\ndef f():\n    """Doc."""\n    return 1\ndef g():\n    """Doc."""\n    return 2\n',
+    # Многострочная сигнатура, докстрока - единственное тело, файл без перевода строки в конце
+    'def f(\n    a,\n    b=(1, 2),\n):\n    """Doc."""\n\n\ndef g(): pass\n"""tail"""',
+    # Комментарии в хвосте строк с кавычками и экранированием
+    "table = (\n    '\\x7f'  # DEL\n    '\\''  # quote\n    \"#\" 'a'  # mixed\n)\n",
+    # Вложенные f-строки: на 3.12+ это поток токенов со своими FSTRING_START и FSTRING_END
+    'def f(x, y, width):\n    """Doc."""\n    return f"{x!r:>{width}}" f"{f\'{y}\'}"  # tail\n',
+    # Shebang посреди файла, как в склеенных исходниках: остаётся на месте, в том числе под докстрокой
+    'def f():\n    """Doc."""\n#!/usr/bin/env python3\n    return 1\n\n\n#!/bin/sh\nclass A:\n    """Doc."""\n    #! kept\n    x = 1\n',
+]
+
+
+def python_sources():
+    sources = list(PYTHON_CASES)
+    for package in (json, email):
+        for path in sorted(Path(os.path.dirname(package.__file__)).rglob('*.py')):
+            sources.append(path.read_text(encoding='utf-8'))
+    return sources
+
+
+class ClearForAiTest(unittest.TestCase):
+    def test_fixtures(self):
+        for ext, source, expected in FIXTURES:
+            with self.subTest(ext=ext):
+                result = clear_for_ai(source, ext)
+                self.assertEqual(result, expected)
+                self.assertIsNot(validate(ext, result), False, "output is not valid code")
+
+    def test_python_output_is_clean(self):
+        # На выходе код компилируется, а из комментариев остаются только shebang и кодировка
+        for index, source in enumerate(python_sources()):
+            with self.subTest(source=index):
+                result = clear_for_ai(source, '.py')
+                compile(result, '<stripped>', 'exec')
+                comments = [token.string for token in tokenize.generate_tokens(io.StringIO(result).readline)
+                            if token.type == tokenize.COMMENT and not token.string.startswith('#!')
+                            and not (token.start[0] <= 2 and CODING.match(token.string))]
+                self.assertEqual(comments, [])
+
+    def test_python_scanner_matches_tokenize(self):
+        # Сканер даёт тот же результат, что и разбор через tokenize, и сам в tokenize не уходит:
+        # ни на отдельных файлах, ни на склеенных, где shebang оказывается посреди текста
+        sources = python_sources()
+        sources.append('\n'.join(sources))
+        expected = [merger._strip_python_tokens(source) for source in sources]
+        with mock.patch.object(merger, '_strip_python_tokens', side_effect=AssertionError("tokenize fallback")):
+            for index, source in enumerate(sources):
+                with self.subTest(source=index):
+                    self.assertEqual(clear_for_ai(source, '.py'), expected[index])
+
+    def test_python_not_tokenizable(self):
+        # Незакрытая строка: код не трогаем, кроме пустых строк
+        source = 'x = 1  # comment\n\n\ns = """never closed\n'
+        self.assertEqual(clear_for_ai(source, '.py'), 'x = 1  # comment\ns = """never closed')
+
+
+if __name__ == "__main__":
+    unittest.main()
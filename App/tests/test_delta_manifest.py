@@ -0,0 +1,74 @@
+import importlib.util
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import project_manifest_path  # noqa: E402
+
+HAS_FLASK = importlib.util.find_spec("flask") is not None
+
+
+@unittest.skipUnless(HAS_FLASK, "Flask not installed")
+class DeltaManifestApiTest(unittest.TestCase):
+    def setUp(self):
+        import app
+
+        self.app = app
+        self.client = app.app.test_client()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.project = self.tmp / "project"
+        self.project.mkdir()
+        (self.project / "main.py").write_text("print('main')\n", encoding="utf-8")
+        self.job_dirs = []
+        patcher = mock.patch.object(merger, "CACHE_DIR", self.tmp / "cache")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for job_dir in self.job_dirs:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def merge(self, delta_manifest):
+        return self.client.post("/merge", json={"project_path": str(self.project), "files": ["main.py"],
+                                                "lang": "en", "delta_manifest": delta_manifest})
+
+    def wait(self, response):
+        self.assertEqual(response.status_code, 202)
+        status_url = response.get_json()["status_url"]
+        self.job_dirs.append(Path(self.app.app.static_folder) / "jobs" / status_url.rsplit("/", 1)[1])
+        deadline = time.time() + 30
+        while True:
+            job = self.client.get(status_url).get_json()
+            if job["status"] not in ("queued", "running") or time.time() > deadline:
+                return job
+            time.sleep(0.05)
+
+    def test_client_path_is_rejected(self):
+        target = self.tmp / "outside" / "victim.json"
+        target.parent.mkdir()
+        target.write_text("keep", encoding="utf-8")
+        for value in (str(target), str(self.tmp / "new.json"), "~/.bashrc", 1):
+            with self.subTest(value=value):
+                self.assertEqual(self.merge(value).status_code, 400)
+        self.assertEqual(target.read_text(encoding="utf-8"), "keep")
+        self.assertFalse((self.tmp / "new.json").exists())
+
+    def test_manifest_is_kept_in_cache(self):
+        job = self.wait(self.merge(True))
+        self.assertEqual(job["status"], "done", job)
+        self.assertEqual(job["delta"]["added"], ["main.py"])
+        self.assertTrue(project_manifest_path(self.project.resolve()).is_file())
+        job = self.wait(self.merge(True))
+        self.assertEqual(job["delta"], {"added": [], "changed": [], "deleted": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
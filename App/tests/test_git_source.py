@@ -0,0 +1,108 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import build_git_file_tree, compile_exclusions, flatten_file_tree, list_git_files  # noqa: E402
+
+HAS_FLASK = importlib.util.find_spec("flask") is not None
+
+TRACKED = ["main.py", "src/util.py", "docs/with space.md", "src/модуль.py", "node_modules/dep.js", "forced.log"]
+UNTRACKED = ["new.py", "build.log", "src/scratch.py"]
+
+
+@unittest.skipUnless(shutil.which("git"), "git не установлен")
+class GitSourceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        # Глобальные настройки пользователя не влияют, а поиск репозитория не уходит выше временной папки
+        env = {"HOME": str(self.tmp), "XDG_CONFIG_HOME": str(self.tmp), "GIT_CONFIG_NOSYSTEM": "1",
+               "GIT_CEILING_DIRECTORIES": str(self.tmp)}
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = self.tmp / "repo"
+        self.root.mkdir()
+        self.git("init", "-q")
+        (self.root / ".gitignore").write_text("*.log\n", encoding="utf-8")
+        for rel in TRACKED + UNTRACKED:
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x = 1\n", encoding="utf-8")
+        self.git("add", ".gitignore", *[rel for rel in TRACKED if rel != "forced.log"])
+        # Отслеживаемый файл остаётся в списке, даже если его потом накрыл .gitignore
+        self.git("add", "-f", "forced.log")
+        self.matcher = compile_exclusions({"dirs": ["node_modules"]})
+
+    def git(self, *args):
+        subprocess.run(["git", *args], cwd=self.root, check=True, capture_output=True)
+
+    def listed(self, root=None):
+        files = list_git_files(root or self.root, self.matcher)
+        return None if files is None else sorted(path.replace(os.sep, "/") for path in files)
+
+    def test_only_tracked_files(self):
+        self.assertEqual(self.listed(), sorted([".gitignore", "docs/with space.md", "forced.log", "main.py",
+                                                "src/util.py", "src/модуль.py"]))
+
+    def test_deleted_files_are_skipped(self):
+        (self.root / "main.py").unlink()
+        self.assertNotIn("main.py", self.listed())
+
+    def test_tree_matches_list(self):
+        tree = build_git_file_tree(self.root, self.matcher)
+        self.assertEqual(sorted(path.replace(os.sep, "/") for path in flatten_file_tree(tree)), self.listed())
+
+    def test_not_a_repository(self):
+        plain = self.tmp / "plain"
+        plain.mkdir()
+        (plain / "a.py").write_text("x = 1\n", encoding="utf-8")
+        self.assertIsNone(self.listed(plain))
+        self.assertIsNone(build_git_file_tree(plain, self.matcher))
+        with mock.patch("subprocess.run", side_effect=FileNotFoundError("git")):
+            self.assertIsNone(self.listed())
+
+
+@unittest.skipUnless(shutil.which("git"), "git не установлен")
+@unittest.skipUnless(HAS_FLASK, "Flask not installed")
+class GitSourceApiTest(unittest.TestCase):
+    def setUp(self):
+        import app
+
+        self.client = app.app.test_client()
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        patcher = mock.patch.dict(os.environ, {"GIT_CEILING_DIRECTORIES": str(self.tmp)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = self.tmp / "repo"
+        self.root.mkdir()
+        (self.root / "tracked.py").write_text("x = 1\n", encoding="utf-8")
+        (self.root / "untracked.py").write_text("y = 2\n", encoding="utf-8")
+
+    def scan(self):
+        return self.client.post("/scan", json={"path": str(self.root), "source": "git", "sniff": False}).get_json()
+
+    def test_scan_uses_index(self):
+        subprocess.run(["git", "init", "-q"], cwd=self.root, check=True)
+        subprocess.run(["git", "add", "tracked.py"], cwd=self.root, check=True)
+        data = self.scan()
+        self.assertEqual(data["source"], "git")
+        self.assertEqual(flatten_file_tree(data["tree"]), ["tracked.py"])
+
+    def test_scan_falls_back_outside_repository(self):
+        data = self.scan()
+        self.assertEqual(data["source"], "fs")
+        self.assertEqual(sorted(flatten_file_tree(data["tree"])), ["tracked.py", "untracked.py"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import GitignoreMatcher, build_file_tree, compile_exclusions, flatten_file_tree, load_gitignore_rules  # noqa: E402
+
+# Каждый сценарий - отдельный репозиторий: {путь: содержимое}, .gitignore и .git/info/exclude тоже файлы
+SCENARIOS = {
+    "whitelist": {
+        ".gitignore": "*\n!*/\n!*.py\n!.gitignore\n",
+        "src/a.txt": "", "src/b.py": "", "src/deep/e.py": "", "src/deep/f.md": "", "c.md": "", "d.py": "",
+    },
+    "negated_dir": {
+        ".gitignore": "/pkg_0_1/\n!pkg_0_1/\n*.dat\n",
+        "pkg_0_1/a.dat": "", "pkg_0_1/b.py": "", "pkg_0_1/sub/c.dat": "", "pkg_0_2/d.dat": "", "e.py": "",
+    },
+    "nested": {
+        ".gitignore": "/only_root.txt\n*.log\nlogs/\n!logs/important.log\ndocs/**/*.tmp\n**/cache\nfile[0-9].bin\na?c.txt\n",
+        ".git/info/exclude": "secret.env\n",
+        "only_root.txt": "", "sub/only_root.txt": "", "x.log": "", "logs/important.log": "", "logs/a.txt": "",
+        "docs/a.tmp": "", "docs/x/y/b.tmp": "", "docs/c.md": "", "deep/cache/z.py": "", "cache": "",
+        "file1.bin": "", "fileA.bin": "", "abc.txt": "", "abbc.txt": "", "secret.env": "", "sub/secret.env": "",
+        "sub/.gitignore": "build/\n!keep.log\n/local.txt\n",
+        "sub/keep.log": "", "sub/other.log": "", "sub/build/out.o": "", "sub/local.txt": "", "sub/x/local.txt": "",
+        "sub/build": None,
+    },
+    "dir_only": {
+        ".gitignore": "tmp/\n!tmp/keep/\nout\n\\#hash\n\\!bang\ntrail\\ \n",
+        "tmp/a.py": "", "tmp/keep/b.py": "", "x/tmp": "", "out/c.py": "", "y/out": "", "#hash": "", "!bang": "",
+        "trail ": "", "trail": "",
+    },
+}
+
+
+@unittest.skipUnless(shutil.which("git"), "git не установлен")
+class GitignoreMatchesGitTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # Глобальные настройки и excludesFile пользователя не должны влиять на сравнение
+        self.env = {**os.environ, "HOME": self.tmp, "XDG_CONFIG_HOME": self.tmp, "GIT_CONFIG_NOSYSTEM": "1"}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def make_repo(self, name, files):
+        root = Path(self.tmp) / name
+        root.mkdir()
+        subprocess.run(["git", "init", "-q"], cwd=root, env=self.env, check=True)
+        for rel, content in files.items():
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if content is not None:
+                path.write_text(content, encoding="utf-8")
+        return root
+
+    def git_files(self, root):
+        output = subprocess.run(["git", "ls-files", "-co", "--exclude-standard", "-z"], cwd=root, env=self.env,
+                                check=True, capture_output=True).stdout.decode("utf-8")
+        return sorted(path for path in output.split("\0") if path)
+
+    def test_walker_matches_git_ls_files(self):
+        matcher = compile_exclusions({"dirs": [".git"]})
+        for name, files in SCENARIOS.items():
+            root = self.make_repo(name, files)
+            expected = self.git_files(root)
+            for workers in (1, 4):
+                with self.subTest(scenario=name, workers=workers):
+                    tree = build_file_tree(root, root, load_gitignore_rules(root), workers=workers, matcher=matcher)
+                    walked = sorted(path.replace(os.sep, "/") for path in flatten_file_tree(tree))
+                    self.assertEqual(walked, expected)
+
+
+class GitignoreWindowsSeparatorTest(unittest.TestCase):
+    # Обход склеивает пути через os.sep, а правила ждут "/": на Windows привязанные и вложенные шаблоны не должны отваливаться
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        (self.tmp / ".gitignore").write_text("build/\n/dist\na/**/b\ndocs/*.tmp\n", encoding="utf-8")
+        (self.tmp / "sub").mkdir()
+        (self.tmp / "sub" / ".gitignore").write_text("/local.txt\n", encoding="utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_backslash_paths_match(self):
+        root = GitignoreMatcher().for_directory(str(self.tmp), "")
+        with mock.patch.object(os, "sep", "\\"):
+            sub = root.for_directory(str(self.tmp / "sub"), "sub")
+            cases = [
+                (root, "x\\build", True, True), (root, "x\\build", False, False), (root, "dist", True, True),
+                (root, "x\\dist", True, False), (root, "a\\b", True, True), (root, "a\\c\\d\\b", False, True),
+                (root, "docs\\n.tmp", False, True), (root, "docs\\x\\n.tmp", False, False),
+                (sub, "sub\\local.txt", False, True), (sub, "sub\\x\\local.txt", False, False),
+                (sub, "sub\\build", True, True),
+            ]
+            for matcher, rel_path, is_dir, expected in cases:
+                with self.subTest(rel_path=rel_path, is_dir=is_dir):
+                    self.assertEqual(matcher.is_ignored(rel_path, is_dir), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
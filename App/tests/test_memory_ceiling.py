@@ -0,0 +1,79 @@
+import importlib.util
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HAS_RESOURCE = importlib.util.find_spec("resource") is not None and Path("/proc/self/status").exists()
+
+# Потолок ставится после импорта merger: считается от уже загруженного интерпретатора. Перед склейкой
+# дочерний процесс проверяет, что проект целиком в этот потолок не влезает
+CHILD = """
+import resource, sys
+sys.path.insert(0, {app_dir!r})
+import merger
+
+vm_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmSize:'))
+limit = (vm_kb + {budget_mb} * 1024) * 1024
+resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+try:
+    bytearray({project_bytes})
+except MemoryError:
+    pass
+else:
+    sys.exit(4)
+sys.argv = ['merger.py'] + {argv!r}
+merger.run_cli()
+"""
+
+
+@unittest.skipUnless(HAS_RESOURCE, "resource.setrlimit or /proc is not available")
+class MemoryCeilingTest(unittest.TestCase):
+    TOTAL_MB = 96
+    FILE_MB = 1
+    BUDGET_MB = 24
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.project = cls.tmp / "project"
+        line = "value = compute(alpha, beta)  # password = 'not-a-secret'\n"
+        body = line * (cls.FILE_MB * 1024 * 1024 // len(line))
+        for index in range(cls.TOTAL_MB // cls.FILE_MB):
+            package = cls.project / f"pkg_{index % 8}"
+            package.mkdir(parents=True, exist_ok=True)
+            (package / f"module_{index}.py").write_text(body, encoding="utf-8")
+        cls.project_bytes = sum(path.stat().st_size for path in cls.project.rglob("*.py"))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def run_cli(self, output, *options):
+        code = CHILD.format(app_dir=str(Path(__file__).resolve().parent.parent), budget_mb=self.BUDGET_MB,
+                            project_bytes=self.project_bytes,
+                            argv=["--path", str(self.project), "--output", str(output), *options])
+        return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=300)
+
+    def test_merge_fits_in_memory_cap(self):
+        self.assertGreater(self.project_bytes, 3 * self.BUDGET_MB * 1024 * 1024)
+        for fmt, options in (("txt", ()), ("md", ("--remove-secrets", "--clear-ai"))):
+            with self.subTest(format=fmt, options=options):
+                output = self.tmp / f"out.{fmt}"
+                result = self.run_cli(output, "--format", fmt, *options)
+                self.assertNotEqual(result.returncode, 4, "the memory cap does not limit allocations")
+                self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+                self.assertNotIn("[FAIL]", result.stdout)
+                # MemoryError на отдельном файле не роняет склейку, а попадает в вывод ошибкой чтения
+                merged = output.read_bytes()
+                self.assertNotIn(b"Error reading file", merged)
+                self.assertGreater(len(merged), self.project_bytes // 2)
+                output.unlink()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import importlib.util
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import drop_binary_files, expand_lazy_dirs  # noqa: E402
+
+HAS_FLASK = importlib.util.find_spec("flask") is not None
+
+
+class MergeDirsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.project = cls.tmp / "project"
+        for rel, data in {
+            "src/main.py": b"print('main')\n",
+            "src/logo.png": b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4,
+            "src/lib/util.py": b"def util():\n    return 1\n",
+            "src/lib/data.bin": bytes(range(256)) * 16,
+            "src/legacy.txt": "caf\xe9\n".encode("cp1252"),
+            "docs/readme.md": b"# docs\n",
+        }.items():
+            path = cls.project / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def test_drop_binary_files(self):
+        files = sorted(expand_lazy_dirs(self.project, ["src"], None))
+        expected = [str(Path(rel)) for rel in ("src/legacy.txt", "src/lib/util.py", "src/main.py")]
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                self.assertEqual(drop_binary_files(self.project, files, workers), expected)
+
+    @unittest.skipUnless(HAS_FLASK, "Flask not installed")
+    def test_merge_dirs_skips_binary_files(self):
+        import app
+
+        client = app.app.test_client()
+        response = client.post("/merge", json={"project_path": str(self.project), "dirs": ["src"],
+                                                "files": ["docs/readme.md"], "lang": "en"})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.get_json()["status_url"]
+        job_id = status_url.rsplit("/", 1)[1]
+        try:
+            deadline = time.time() + 30
+            while True:
+                job = client.get(status_url).get_json()
+                if job["status"] not in ("queued", "running") or time.time() > deadline:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(job["status"], "done", job)
+            output = (Path(app.app.static_folder) / "jobs" / job_id / "project.txt").read_text(encoding="utf-8")
+            for rel in ("src/main.py", "src/lib/util.py", "src/legacy.txt", "docs/readme.md"):
+                self.assertIn(str(Path(rel)), output)
+            self.assertNotIn("logo.png ---", output)
+            self.assertNotIn("data.bin ---", output)
+            self.assertNotIn("Binary file", output)
+        finally:
+            shutil.rmtree(Path(app.app.static_folder) / "jobs" / job_id, ignore_errors=True)
+
+    @unittest.skipUnless(HAS_FLASK, "Flask not installed")
+    def test_queued_cancel_counts_job(self):
+        import app
+
+        # Единственный поток склеек занят, поэтому новая задача остаётся в очереди
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.submit(release.wait)
+        client = app.app.test_client()
+        try:
+            with mock.patch.object(app, "merge_executor", executor):
+                response = client.post("/merge", json={"project_path": str(self.project), "files": ["src/main.py"],
+                                                        "lang": "en"})
+                self.assertEqual(response.status_code, 202)
+                job_id = response.get_json()["job_id"]
+                before = dict(app.metrics_jobs)
+                job = client.post(f"/jobs/{job_id}/cancel").get_json()
+            self.assertEqual(job["status"], "cancelled")
+            self.assertEqual(app.metrics_jobs.get("cancelled", 0), before.get("cancelled", 0) + 1)
+            metrics = client.get("/metrics").get_data(as_text=True)
+            self.assertIn(f'project_merger_merge_jobs_total{{status="cancelled"}} {app.metrics_jobs["cancelled"]}',
+                          metrics)
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+        self.assertEqual(client.get(f"/jobs/{job_id}").get_json()["status"], "cancelled")
+        self.assertEqual(app.metrics_jobs["cancelled"], before.get("cancelled", 0) + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import importlib.util
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+HAS_FLASK = importlib.util.find_spec("flask") is not None
+
+
+@unittest.skipUnless(HAS_FLASK, "Flask not installed")
+class MetricsFlagTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import app
+
+        cls.app = app
+        cls.tmp = Path(tempfile.mkdtemp())
+        (cls.tmp / "src").mkdir()
+        (cls.tmp / "src" / "main.py").write_text("print('main')\n", encoding="utf-8")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def scan_and_read_metrics(self):
+        client = self.app.app.test_client()
+        self.assertEqual(client.post("/scan", json={"path": str(self.tmp)}).status_code, 200)
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True)
+
+    def test_stats_are_off_by_default(self):
+        # Без флага скан не заводит MergeStats, а /metrics отдаёт только счётчики задач
+        with mock.patch.dict(self.app.app.config, {"METRICS": False}), \
+                mock.patch.object(self.app, "MergeStats", side_effect=AssertionError("stats collected")):
+            metrics = self.scan_and_read_metrics()
+        self.assertIn("project_merger_merge_jobs_total", metrics)
+        self.assertIn("project_merger_merge_jobs_running", metrics)
+        self.assertNotIn("project_merger_stage_", metrics)
+        self.assertNotIn("_duration_seconds", metrics)
+
+    def test_stats_with_flag(self):
+        with mock.patch.dict(self.app.app.config, {"METRICS": True}):
+            metrics = self.scan_and_read_metrics()
+        self.assertIn('project_merger_stage_items_total{stage="walk"}', metrics)
+        self.assertIn("project_merger_scan_duration_seconds_count", metrics)
+
+
+if __name__ == "__main__":
+    unittest.main()
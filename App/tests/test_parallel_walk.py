@@ -0,0 +1,81 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import build_file_tree, compile_exclusions, iter_file_listings, load_gitignore_rules  # noqa: E402
+
+
+def collect(tree):
+    # Пути в порядке дерева, вместе с папками: так сравнивается и состав, и порядок
+    paths = []
+    for node in tree:
+        paths.append(node["path"])
+        paths.extend(collect(node.get("children", ())))
+    return paths
+
+
+class ParallelWalkTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.root = cls.tmp / "project"
+        for top in range(4):
+            for sub in range(3):
+                folder = cls.root / f"pkg{top}" / f"mod{sub}" / "inner"
+                folder.mkdir(parents=True)
+                for index in range(3):
+                    (folder.parent / f"f{index}.py").write_text("x = 1\n", encoding="utf-8")
+                    (folder / f"g{index}.log").write_text("log\n", encoding="utf-8")
+                (folder / "keep.txt").write_text("keep\n", encoding="utf-8")
+        (cls.root / ".gitignore").write_text("*.log\n/pkg3/\n", encoding="utf-8")
+        (cls.root / "pkg1" / ".gitignore").write_text("mod2/\n!*.log\n", encoding="utf-8")
+        (cls.root / "node_modules" / "dep").mkdir(parents=True)
+        (cls.root / "node_modules" / "dep" / "index.js").write_text("", encoding="utf-8")
+        (cls.root / "empty" / "deeper").mkdir(parents=True)
+        cls.has_symlinks = True
+        try:
+            # Цикл: ссылка на предка и ссылка на корень проекта
+            os.symlink(cls.root / "pkg0", cls.root / "pkg0" / "mod0" / "loop", target_is_directory=True)
+            os.symlink(cls.root, cls.root / "pkg2" / "up", target_is_directory=True)
+        except (OSError, NotImplementedError):
+            cls.has_symlinks = False
+        cls.matcher = compile_exclusions({"dirs": ["node_modules"], "exts": [".pyc"]})
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def walk(self, workers):
+        return build_file_tree(self.root, self.root, load_gitignore_rules(self.root), workers=workers,
+                               matcher=self.matcher)
+
+    def test_parallel_tree_matches_serial(self):
+        serial = collect(self.walk(1))
+        self.assertIn(os.path.join("pkg1", "mod0", "inner", "g0.log"), serial)
+        self.assertNotIn(os.path.join("pkg0", "mod0", "inner", "g0.log"), serial)
+        self.assertFalse(any(path.startswith(("pkg3", "node_modules", "empty")) for path in serial))
+        if self.has_symlinks:
+            # Ссылки на предков отбрасываются, а обход по ним не зацикливается
+            self.assertFalse(any(os.path.join("mod0", "loop") in path for path in serial))
+            self.assertFalse(any(path.startswith(os.path.join("pkg2", "up")) for path in serial))
+        for workers in (2, 8):
+            with self.subTest(workers=workers):
+                self.assertEqual(collect(self.walk(workers)), serial)
+
+    def test_parallel_listings_match_serial(self):
+        # Потоковые листинги приходят в порядке готовности, сравниваем содержимое каждой папки
+        def listings(workers):
+            return {rel_dir: files for rel_dir, files, _ in iter_file_listings(
+                self.root, self.root, load_gitignore_rules(self.root), workers=workers, matcher=self.matcher)}
+
+        serial = listings(1)
+        self.assertEqual(listings(4), serial)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import SNIFF_SIZE, perform_merge_logic  # noqa: E402
+
+# Файлы, которые копируются байтами, и те, что должны откатиться на декодирование
+FILES = {
+    "crlf.txt": b"one\r\ntwo\r\n\r\nthree\rfour\r",
+    "chunks.md": "строка € ünï\r\n".encode("utf-8") * 300,
+    "bom.md": b"\xef\xbb\xbf# Title\r\n\r\ntext\n",
+    "utf16.txt": "Привет\r\nмир\n".encode("utf-16"),
+    "cp1251.txt": "Привет, мир! Проверка кодировки.\r\n".encode("cp1251") * 20,
+    "late_invalid.txt": b"a" * (SNIFF_SIZE + 100) + b"\n\xff\xfe tail\n",
+    "empty.txt": b"",
+}
+# BOM UTF-8, как и при read_text(encoding="utf-8"), остаётся в тексте - копируется байтами вместе с ним
+COPIED = {"crlf.txt", "chunks.md", "bom.md"}
+
+
+class PassThroughTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.project = cls.tmp / "project"
+        cls.project.mkdir()
+        for name, data in FILES.items():
+            (cls.project / name).write_bytes(data)
+        cls.files = sorted(FILES)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def merge(self, export_format, pass_through):
+        output = self.tmp / f"out-{pass_through}.{export_format}"
+        copied = []
+        write = merger._write_pass_through
+
+        def write_pass_through(f, file_abs_path, header, footer):
+            if not pass_through:
+                return False
+            done = write(f, file_abs_path, header, footer)
+            if done:
+                copied.append(Path(file_abs_path).name)
+            return done
+
+        # Маленький блок копирования: \r\n и многобайтовые символы попадают на стыки блоков
+        with mock.patch.object(merger, "_write_pass_through", write_pass_through), \
+                mock.patch.object(merger, "MERGE_COPY_SIZE", 7):
+            perform_merge_logic(self.project, self.files, output, export_format, "en", False, False)
+        return output.read_bytes(), copied
+
+    def test_matches_decoding_path(self):
+        for export_format in ("txt", "md"):
+            with self.subTest(format=export_format):
+                expected, _ = self.merge(export_format, False)
+                merged, copied = self.merge(export_format, True)
+                self.assertEqual(merged, expected)
+                # empty.txt секции не даёт, остальные откатились на декодирование
+                self.assertEqual(set(copied) - {"empty.txt"}, COPIED)
+                self.assertNotIn(b"\r", merged)
+                self.assertIn("Привет, мир!".encode("utf-8"), merged)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import importlib.util
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import (FILE_CONTENT_TRANSLATIONS, _concat_pdf_sections, _iter_pdf_outline,  # noqa: E402
+                    _write_pdf_parallel, perform_merge_logic)
+
+HAS_PDF = all(importlib.util.find_spec(name) is not None for name in ("weasyprint", "pygments", "pypdf"))
+HAS_PYPDF = importlib.util.find_spec("pypdf") is not None
+HAS_PYGMENTS = importlib.util.find_spec("pygments") is not None
+
+_HEADING = re.compile(r"<h([123])>(.*?)</h\1>", re.S)
+
+
+def make_stub_pdf(pdf_path, headings, title=None):
+    # Заглушка вместо WeasyPrint: страница на заголовок, закладки вложены по уровням заголовков
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    stack = []
+    for page, (level, text) in enumerate(headings):
+        writer.add_blank_page(width=200, height=200)
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        item = writer.add_outline_item(text, page, parent=stack[-1][1] if stack else None)
+        stack.append((level, item))
+    if title:
+        writer.add_metadata({"/Title": title})
+    with open(pdf_path, "wb") as out:
+        writer.write(out)
+
+
+def render_stub(html_path, pdf_path):
+    html = Path(html_path).read_text(encoding="utf-8")
+    headings = [(int(level), re.sub(r"<[^>]+>", "", text)) for level, text in _HEADING.findall(html)]
+    make_stub_pdf(pdf_path, headings, title="stub")
+    return 0.0, 0.0
+
+
+def read_outline(pdf_path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(str(pdf_path))
+    outline = [(level, item.title, page) for level, item, page in _iter_pdf_outline(reader, reader.outline, 0)]
+    return reader, outline
+
+
+@unittest.skipUnless(HAS_PYPDF, "pypdf not installed")
+class ConcatPdfSectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def test_outline_is_nested_under_file_contents(self):
+        first, second, output = (str(self.tmp / name) for name in ("0.pdf", "1.pdf", "out.pdf"))
+        make_stub_pdf(first, [(1, "Project"), (2, "Structure"), (2, "Contents"), (3, "a/f0"), (3, "a/f1")],
+                      title="Project")
+        make_stub_pdf(second, [(3, "b/f0"), (3, "b/f1")], title="Other")
+        _concat_pdf_sections([first, second], output)
+        reader, outline = read_outline(output)
+        self.assertEqual(len(reader.pages), 7)
+        self.assertEqual(outline, [(0, "Project", 0), (1, "Structure", 1), (1, "Contents", 2), (2, "a/f0", 3),
+                                   (2, "a/f1", 4), (2, "b/f0", 5), (2, "b/f1", 6)])
+        self.assertEqual(reader.metadata.title, "Project")
+
+
+@unittest.skipUnless(HAS_PYPDF and HAS_PYGMENTS, "pypdf or Pygments not installed")
+class WritePdfParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.project = self.tmp / "project"
+        for folder in ("a", "b", "c"):
+            for index in range(4):
+                path = self.project / folder / f"f{index}.py"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(f"def f{index}():\n    return {index!r}\n", encoding="utf-8")
+        self.files = sorted(str(path.relative_to(self.project)) for path in self.project.rglob("*") if path.is_file())
+
+    def merge(self, **patches):
+        output = self.tmp / "out.pdf"
+        work_dir = self.tmp / "work"
+        work_dir.mkdir(exist_ok=True)
+        render = mock.Mock(side_effect=render_stub)
+        patches.setdefault("_spawn_pool", lambda jobs: ThreadPoolExecutor(jobs))
+        with mock.patch.multiple(merger, _render_pdf_section=render, **patches):
+            _write_pdf_parallel(self.project, self.files, "project", "tree", FILE_CONTENT_TRANSLATIONS["en"], (),
+                                False, 2, None, (), None, output, work_dir)
+        _, outline = read_outline(output)
+        headers = [title for level, title, _ in outline if level == 2]
+        self.assertEqual(headers, [f"--- File: {rel} ---" for rel in self.files])
+        return render
+
+    def test_small_project_renders_one_document(self):
+        render = self.merge(PDF_SECTION_FILES=3)
+        render.assert_called_once()
+        self.assertEqual(render.call_args.args[1], str(self.tmp / "out.pdf"))
+        self.assertFalse(list((self.tmp / "work").glob("*.pdf")))
+
+    def test_large_sections_are_cut_at_top_level_folders(self):
+        render = self.merge(PDF_SECTION_FILES=3, PDF_SECTION_MIN_BYTES=0)
+        self.assertEqual(render.call_count, 3)
+        sections = [Path(call.args[0]).read_text(encoding="utf-8") for call in render.call_args_list]
+        for folder, html in zip("abc", sections):
+            self.assertEqual({Path(rel).parts[0] for rel in re.findall(r"--- File: (\S+) ---", html)}, {folder})
+
+    def test_loading_and_rendering_share_one_pool(self):
+        # Чтение файлов и вёрстка секций идут в одном пуле: процессов всего jobs, а не вдвое больше
+        spawn = mock.Mock(side_effect=lambda jobs: ThreadPoolExecutor(jobs))
+        render = self.merge(PDF_SECTION_FILES=3, PDF_SECTION_MIN_BYTES=0, _spawn_pool=spawn)
+        self.assertEqual(render.call_count, 3)
+        spawn.assert_called_once_with(2)
+
+
+@unittest.skipUnless(HAS_PDF, "WeasyPrint, Pygments or pypdf not installed")
+class PdfSectionsTest(unittest.TestCase):
+    SECTION_FILES = 3
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.project = cls.tmp / "project"
+        # Три папки верхнего уровня по четыре файла: при SECTION_FILES = 3 выходит три секции
+        for folder in ("a", "b", "c"):
+            for index in range(4):
+                path = cls.project / folder / f"f{index}.py"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(f"def f{index}():\n    return {index!r}\n" * (index + 1), encoding="utf-8")
+        cls.files = sorted(str(path.relative_to(cls.project)) for path in cls.project.rglob("*") if path.is_file())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def merge(self, jobs):
+        from pypdf import PdfReader
+
+        output = self.tmp / f"out-{jobs}.pdf"
+        with mock.patch.multiple(merger, PDF_SECTION_FILES=self.SECTION_FILES, PDF_SECTION_MIN_BYTES=0):
+            perform_merge_logic(self.project, self.files, output, "pdf", "en", False, False, jobs=jobs)
+        reader = PdfReader(str(output))
+        outline = [(level, item.title, page) for level, item, page in _iter_pdf_outline(reader, reader.outline, 0)]
+        return len(reader.pages), outline
+
+    def test_sections_keep_order_and_outline(self):
+        serial_pages, serial = self.merge(1)
+        parallel_pages, parallel = self.merge(2)
+        self.assertEqual([(level, title) for level, title, _ in parallel],
+                         [(level, title) for level, title, _ in serial])
+        headers = [title for level, title, _ in parallel if level == 2]
+        self.assertEqual(headers, [f"--- File: {rel} ---" for rel in self.files])
+        pages = [page for _, _, page in parallel]
+        self.assertEqual(pages, sorted(pages))
+        # Каждая секция начинается с новой страницы, но больше лишней страницы на секцию не бывает
+        sections = 3
+        self.assertGreaterEqual(parallel_pages, serial_pages)
+        self.assertLessEqual(parallel_pages, serial_pages + sections - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import ScanIndex, build_file_tree, compile_exclusions, flatten_file_tree  # noqa: E402
+
+FILES = ["a.py", "src/b.py", "src/deep/c.py", "docs/d.md"]
+DIRS = 4
+
+
+class ScanIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        patcher = mock.patch.object(merger, "CACHE_DIR", self.tmp / "cache")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = self.tmp / "project"
+        for rel in FILES:
+            path = self.root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x = 1\n", encoding="utf-8")
+        self.matcher = compile_exclusions({})
+
+    def scan(self):
+        index = ScanIndex.open(self.root, None, self.matcher)
+        tree = build_file_tree(self.root, self.root, None, matcher=self.matcher, index=index)
+        return index, sorted(path.replace(os.sep, "/") for path in flatten_file_tree(tree))
+
+    def touch_dir(self, rel):
+        # mtime папки двигаем явно: на грубых файловых системах правка могла бы его не поменять
+        path = self.root / rel
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_unchanged_tree_is_served_from_index(self):
+        index, files = self.scan()
+        self.assertEqual((index.hits, index.misses), (0, DIRS))
+        self.assertTrue(index.path.is_file())
+        index, cached = self.scan()
+        self.assertEqual((index.hits, index.misses), (DIRS, 0))
+        self.assertEqual(cached, files)
+        self.assertEqual(files, sorted(FILES))
+
+    def test_changed_directories_are_rescanned(self):
+        self.scan()
+        (self.root / "src" / "new.py").write_text("y = 2\n", encoding="utf-8")
+        self.touch_dir("src")
+        index, files = self.scan()
+        self.assertEqual((index.hits, index.misses), (DIRS - 1, 1))
+        self.assertIn("src/new.py", files)
+
+        (self.root / "src" / "deep" / "c.py").unlink()
+        self.touch_dir("src/deep")
+        index, files = self.scan()
+        self.assertEqual(index.misses, 1)
+        self.assertNotIn("src/deep/c.py", files)
+
+        # Тот же состав, но другой mtime - листинг всё равно читается заново
+        self.touch_dir("docs")
+        index, files = self.scan()
+        self.assertEqual((index.hits, index.misses), (DIRS - 1, 1))
+
+    def test_removed_directory_is_dropped(self):
+        self.scan()
+        shutil.rmtree(self.root / "docs")
+        self.touch_dir("")
+        index, files = self.scan()
+        self.assertNotIn("docs/d.md", files)
+        self.assertNotIn("docs", json.loads(index.path.read_text(encoding="utf-8"))["dirs"])
+
+    def test_corrupt_or_foreign_index_is_ignored(self):
+        index, files = self.scan()
+        for content in ("{not json", "[]", json.dumps({"fingerprint": "other", "dirs": {"": "bogus"}})):
+            with self.subTest(content=content):
+                index.path.write_text(content, encoding="utf-8")
+                rebuilt, scanned = self.scan()
+                self.assertEqual((rebuilt.hits, rebuilt.misses), (0, DIRS))
+                self.assertEqual(scanned, files)
+                self.assertEqual(json.loads(index.path.read_text(encoding="utf-8"))["fingerprint"],
+                                 rebuilt.fingerprint)
+
+    def test_version_change_invalidates_index(self):
+        self.scan()
+        with mock.patch.object(ScanIndex, "VERSION", ScanIndex.VERSION + 1):
+            index, _ = self.scan()
+        self.assertEqual((index.hits, index.misses), (0, DIRS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from merger import (  # noqa: E402
+    MergeDelta,
+    SizeLimits,
+    perform_merge_logic,
+    plan_shards,
+    shard_paths,
+    shards_manifest_path,
+)
+
+SHARD = 8192
+
+
+class PlanShardsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.project = self.tmp / "project"
+        self.project.mkdir()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def write(self, rel, size):
+        path = self.project / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x = 1\n" * (size // 6), encoding="utf-8")
+        return os.path.join(*rel.split("/"))
+
+    def plan(self, files):
+        return plan_shards(self.project, files, SizeLimits(shard=SHARD))
+
+    def test_parts_fit_budget(self):
+        files = [self.write(f"src/m{index:02}.py", 900) for index in range(40)]
+        shards = self.plan(files)
+        self.assertGreater(len(shards), 1)
+        for shard in shards:
+            self.assertLessEqual(shard.size, SHARD)
+        self.assertEqual([rel for shard in shards for rel in shard.files], sorted(files))
+
+    def test_directories_are_not_split(self):
+        # Папка около 3.5 КБ: в часть на 8 КБ влезают две, ни одна не должна разрываться
+        groups = {name: [self.write(f"{name}/f{index}.py", 540) for index in range(5)]
+                  for name in ("a", "b", "c", "d", "e")}
+        shards = self.plan([rel for files in groups.values() for rel in files])
+        self.assertGreater(len(shards), 1)
+        for name, files in groups.items():
+            with self.subTest(directory=name):
+                holders = [index for index, shard in enumerate(shards) if set(files) & set(shard.files)]
+                self.assertEqual(len(holders), 1)
+
+    def test_oversized_file_gets_own_part(self):
+        files = [self.write("a/small1.py", 600), self.write("b/huge.py", 3 * SHARD), self.write("c/small2.py", 600)]
+        shards = self.plan(files)
+        huge = [shard for shard in shards if files[1] in shard.files]
+        self.assertEqual(len(huge), 1)
+        self.assertEqual(huge[0].files, [files[1]])
+        self.assertGreater(huge[0].size, SHARD)
+        for shard in shards:
+            if shard is not huge[0]:
+                self.assertLessEqual(shard.size, SHARD)
+
+
+class ShardedMergeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.project = self.tmp / "project"
+        self.project.mkdir()
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.files = []
+        for name in ("api", "core", "util"):
+            for index in range(6):
+                rel = Path(name) / f"mod{index}.py"
+                (self.project / name).mkdir(exist_ok=True)
+                (self.project / rel).write_text(f"value_{index} = {index}\n" * 60, encoding="utf-8")
+                self.files.append(str(rel))
+        self.output = self.tmp / "out" / "project.txt"
+        self.output.parent.mkdir()
+
+    def merge(self, files, delta=None):
+        return perform_merge_logic(self.project, files, self.output, "txt", "en", False, False, delta=delta,
+                                   limits=SizeLimits(shard=SHARD))
+
+    def test_manifest_lists_parts(self):
+        manifest = self.merge(self.files)
+        on_disk = json.loads(shards_manifest_path(self.output).read_text(encoding="utf-8"))
+        self.assertEqual(on_disk, manifest)
+        shards = manifest["shards"]
+        self.assertGreater(len(shards), 1)
+        self.assertEqual([shard["path"] for shard in shards], [path.name for path in shard_paths(self.output, len(shards))])
+        self.assertEqual(sorted(rel for shard in shards for rel in shard["files"]), sorted(self.files))
+        self.assertNotIn("deleted", manifest)
+        for shard in shards:
+            path = self.output.with_name(shard["path"])
+            text = path.read_text(encoding="utf-8")
+            self.assertEqual(shard["bytes"], path.stat().st_size)
+            self.assertEqual(text.count("--- File: "), len(shard["files"]))
+            for rel in shard["files"]:
+                self.assertIn(f"--- File: {rel} ---", text)
+
+    def test_delta_with_only_deletions(self):
+        # Дельта без новых и изменённых файлов всё равно пишет часть со списком удалённых
+        delta = MergeDelta([], [], ["api/gone.py"], "manifest m.json")
+        manifest = self.merge([], delta)
+        self.assertEqual(len(manifest["shards"]), 1)
+        self.assertEqual(manifest["shards"][0]["files"], [])
+        self.assertEqual(manifest["deleted"], ["api/gone.py"])
+        text = self.output.with_name(manifest["shards"][0]["path"]).read_text(encoding="utf-8")
+        self.assertIn("- api/gone.py", text)
+
+    def test_delta_deletions_go_to_first_part(self):
+        delta = MergeDelta(self.files, [], ["api/gone.py"], "manifest m.json")
+        manifest = self.merge(self.files, delta)
+        self.assertGreater(len(manifest["shards"]), 1)
+        self.assertEqual(manifest["deleted"], ["api/gone.py"])
+        texts = [self.output.with_name(shard["path"]).read_text(encoding="utf-8") for shard in manifest["shards"]]
+        self.assertIn("- api/gone.py", texts[0])
+        for text in texts[1:]:
+            self.assertNotIn("api/gone.py", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import SNIFF_SIZE, BinaryFileError, sniff_encoding, sniff_file, sniff_paths  # noqa: E402
+
+# (имя, байты, ожидаемая кодировка; None - двоичный файл)
+CASES = [
+    ("nul.bin", b"ELF\x02\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x03\x00>\x00" * 8, None),
+    ("image.png", b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x01\x00", None),
+    ("control.dat", bytes(range(1, 32)) * 4, None),
+    ("bom16.txt", "Привет, мир\n".encode("utf-16"), "utf-16"),
+    ("bom32.txt", "hello\n".encode("utf-32"), "utf-32"),
+    ("le16.txt", "plain ascii text in utf-16\n".encode("utf-16-le"), "utf-16-le"),
+    ("bom8.txt", b"\xef\xbb\xbfhello\n", "utf-8"),
+    ("cp1251.txt", "Съешь ещё этих мягких французских булок\n".encode("cp1251"), "cp1251"),
+    ("cp1252.txt", "Café déjà vu, naïve façade\n".encode("cp1252"), "cp1252"),
+    ("ascii.txt", b"print('hello')\n", "utf-8"),
+    # Префикс обрывает двухбайтовый символ посередине - это всё ещё UTF-8
+    ("cut.txt", b"a" + "ж".encode("utf-8") * SNIFF_SIZE, "utf-8"),
+    ("short.txt", b"x", "utf-8"),
+    ("short_utf8.txt", "я".encode("utf-8")[:1], "utf-8"),
+    ("empty.txt", b"", "utf-8"),
+]
+
+
+class SniffTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        for name, data, _ in CASES:
+            (cls.tmp / name).write_bytes(data)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def test_sniff_file(self):
+        for name, data, expected in CASES:
+            with self.subTest(name=name):
+                self.assertEqual(sniff_encoding(data[:SNIFF_SIZE]), expected)
+                self.assertEqual(sniff_file(str(self.tmp / name)), (expected, len(data)))
+
+    def test_missing_file(self):
+        # Ошибку чтения покажет склейка, а скан не падает
+        self.assertEqual(sniff_file(str(self.tmp / "missing.txt")), ("utf-8", None))
+
+    def test_file_kinds(self):
+        kinds = dict(zip((name for name, _, _ in CASES), sniff_paths(self.tmp, [name for name, _, _ in CASES])))
+        self.assertEqual(kinds["nul.bin"], ("binary", len(CASES[0][1])))
+        self.assertEqual(kinds["cp1251.txt"][0], "cp1251")
+        self.assertIsNone(kinds["ascii.txt"][0])
+        self.assertEqual(kinds["empty.txt"], (None, 0))
+
+    def test_read_source_decodes_with_sniffed_encoding(self):
+        for name in ("bom16.txt", "cp1251.txt", "cp1252.txt", "cut.txt"):
+            with self.subTest(name=name):
+                _, raw, expected = next(case for case in CASES if case[0] == name)
+                data, encoding = merger._read_source(str(self.tmp / name))
+                self.assertEqual((data, encoding), (raw, expected))
+                self.assertEqual(merger._decode_source(data, encoding), raw.decode(expected))
+        with self.assertRaises(BinaryFileError):
+            merger._read_source(str(self.tmp / "nul.bin"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import importlib.util
+import shutil
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import merger  # noqa: E402
+from merger import FILE_CONTENT_TRANSLATIONS, MergeStats, SizeLimits, perform_merge_logic  # noqa: E402
+
+HAS_PYGMENTS = importlib.util.find_spec("pygments") is not None
+
+
+class TotalLimitTest(unittest.TestCase):
+    FILES = 20
+    MAX_TOTAL = 2500
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = Path(tempfile.mkdtemp())
+        cls.project = cls.tmp / "project"
+        cls.project.mkdir()
+        for index in range(cls.FILES):
+            (cls.project / f"f{index:02}.py").write_text(f"x{index} = 1\n" * 160, encoding="utf-8")
+        cls.files = sorted(path.name for path in cls.project.iterdir())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def merge(self, jobs):
+        # Загрузчик читает файлы через _load_files - считаем прочитанные файлы по его вызовам
+        loaded = []
+
+        def load_files(batch, *args, **kwargs):
+            loaded.extend(Path(file_abs_path).name for file_abs_path, *_ in batch)
+            return load(batch, *args, **kwargs)
+
+        load = merger._load_files
+        output = self.tmp / f"out-{jobs}.txt"
+        with mock.patch.object(merger, "_load_files", load_files), \
+                mock.patch.object(merger, "_spawn_pool", ThreadPoolExecutor), \
+                mock.patch.object(merger, "MERGE_BATCH_SIZE", 1):
+            perform_merge_logic(self.project, self.files, output, "txt", "en", False, True, jobs=jobs,
+                                stats=MergeStats(), limits=SizeLimits(max_total=self.MAX_TOTAL))
+        text = output.read_text(encoding="utf-8")
+        written = [name for name in self.files if f"--- File: {name} ---" in text]
+        return loaded, written
+
+    def test_loader_stops_at_total_limit(self):
+        loaded, written = self.merge(1)
+        self.assertTrue(1 < len(written) < self.FILES)
+        self.assertEqual(loaded, written)
+
+    def test_parallel_loader_stops_at_total_limit(self):
+        # Наперёд читается не больше окна пачек в полёте (две на процесс), а не весь проект
+        jobs = 2
+        loaded, written = self.merge(jobs)
+        self.assertEqual(loaded[:len(written)], written)
+        self.assertLessEqual(len(loaded), len(written) + 2 * jobs)
+
+    @unittest.skipUnless(HAS_PYGMENTS, "Pygments not installed")
+    def test_pdf_loader_stops_at_total_limit(self):
+        calls = []
+        load = merger._load_files
+
+        def load_files(batch, *args, **kwargs):
+            calls.extend(batch)
+            return load(batch, *args, **kwargs)
+
+        T = FILE_CONTENT_TRANSLATIONS["en"]
+        with mock.patch.object(merger, "_load_files", load_files):
+            sections = list(merger._iter_pdf_file_html(self.project, self.files, T, (), True,
+                                                       limits=SizeLimits(max_total=self.MAX_TOTAL)))
+        self.assertIn(T["total_limit"], sections[-1][1])
+        self.assertEqual(len(calls), len(sections) - 1)
+
+
+class TruncatedFileTest(unittest.TestCase):
+    # Маркер обрезки считает пропущенное по тому, что осталось после подрезки начала и конца до целых строк
+    LIMITS = SizeLimits(max_file=1000, head=300, tail=300)
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def read(self, text, encoding, newline):
+        path = self.tmp / "big.txt"
+        raw = text.replace("\n", newline).encode(encoding)
+        path.write_bytes(raw)
+        data, _ = merger._read_source(str(path), limits=self.LIMITS)
+        return raw, data
+
+    def test_skipped_counts_dropped_bytes(self):
+        text = "".join(f"line {index:03} значение\n" for index in range(200))
+        for encoding, newline in (("utf-8", "\n"), ("utf-8", "\r\n"), ("cp1251", "\r\n"), ("utf-16", "\n")):
+            with self.subTest(encoding=encoding, newline=repr(newline)):
+                raw, data = self.read(text, encoding, newline)
+                self.assertIsInstance(data, merger._Truncated)
+                self.assertTrue(data.head.endswith("\n") and text.startswith(data.head))
+                self.assertTrue(data.tail.startswith("line ") and text.endswith(data.tail))
+                body = "utf-16-le" if encoding == "utf-16" else encoding
+                head = data.head.replace("\n", newline).encode(body)
+                tail = data.tail.replace("\n", newline).encode(body)
+                bom = len(raw) - len(text.replace("\n", newline).encode(body))
+                self.assertEqual(data.skipped, len(raw) - bom - len(head) - len(tail))
+                self.assertLess(len(head), self.LIMITS.head)
+                self.assertLess(len(tail), self.LIMITS.tail)
+
+    def test_marker_reports_skipped(self):
+        _, data = self.read("".join(f"row {index}\n" for index in range(500)), "utf-8", "\n")
+        T = FILE_CONTENT_TRANSLATIONS["en"]
+        text = merger._truncated_text(data, T)
+        self.assertIn(T["truncated"].format(size=merger.format_size(data.size),
+                                            skipped=merger.format_size(data.skipped)), text)
+        self.assertEqual(len(data.head) + len(data.tail), data.size - data.skipped)
+
+
+if __name__ == "__main__":
+    unittest.main()